@@ -3,21 +3,32 @@
 import logging
 import logging.handlers
 import os
-from flask import Flask, render_template, request, jsonify, send_file
+import threading
+import time
+from flask import Flask, render_template, request, jsonify, send_file, Response, g
 from datetime import datetime, timedelta
 import pandas as pd
-from io import BytesIO
+from urllib.parse import quote
 # 从 models 导入需要的函数和类
 from models import (
     init_db, add_user_activity, get_user_activities, get_operation_stats,
     get_all_servers, get_server_by_id, get_server_full_config, add_server, update_server, delete_server,
-    get_system_setting, update_system_setting, db, UserActivity
+    get_system_setting, update_system_setting, get_db_pool_stats, db, UserActivity, WRITER_MODES, COUNT_MODES,
+    get_risk_level_storage, get_sql_digest_summary, STORAGE_MODES, get_sql_text_storage_stats,
+    get_activity_partitions, get_activity_retention_days, clear_stats_cache, get_activity_breakdown
 )
-# 从 log_parser 导入需要的函数
-from log_parser import scan_logs_for_server, scan_all_servers
+# 从 scan_jobs 导入后台扫描任务管理器
+from scan_jobs import scan_job_manager
+# 从 partition_jobs 导入后台分区维护任务
+from partition_jobs import partition_maintainer
+# 从 risk_rules 导入风险规则匹配器的更新函数
+from risk_rules import set_risk_rules
 # 从 config 导入默认配置
 from config import APP_CONFIG, DB_CONFIG
 from reports import ReportGenerator
+from db_pool import sqlalchemy_engine_options
+# 从 metrics 导入请求耗时指标
+from metrics import HTTP_REQUEST_SECONDS, HTTP_DB_SECONDS, reset_db_time, get_db_time, render_metrics
 
 # --- 日志配置 ---
 # 移除文件日志配置
@@ -32,6 +43,8 @@ app = Flask(__name__)
 # 配置 SQLAlchemy
 app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# SQLAlchemy 从全局连接池取连接，与 models 共用连接数上限
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = sqlalchemy_engine_options()
 
 # 初始化 SQLAlchemy
 db.init_app(app)
@@ -68,6 +81,7 @@ def load_system_settings():
     else:
         # 如果数据库中没有，使用默认值
         CACHED_RISK_OPERATIONS = APP_CONFIG.get('RISK_OPERATIONS', {})
+    set_risk_rules(CACHED_RISK_OPERATIONS)
     
     # 加载写入风险级别
     write_risk_levels = get_system_setting('WRITE_RISK_LEVELS')
@@ -82,6 +96,54 @@ def load_system_settings():
 # 初始加载配置
 load_system_settings()
 
+# 启动后台分区维护 (预建未来分区、删除超过保留期的分区)
+partition_maintainer.start()
+
+def get_default_days() -> int:
+    """仪表盘默认显示的天数 (页面默认日期范围为包含今天在内的最近 default_days 天)"""
+    return max(1, int(APP_CONFIG.get('default_days', 7)))
+
+def dashboard_default_range():
+    """仪表盘首次打开时 /api/stats 请求的时间范围，日期解析方式与 get_stats 一致"""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - timedelta(days=get_default_days() - 1), today.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+def warm_stats_cache():
+    """
+    后台线程: 每隔 STATS_CACHE_TTL 的一半重新计算仪表盘默认范围 (全部服务器) 的统计并写入缓存。
+    该范围包含今天，缓存条目按 STATS_CACHE_TTL 过期，定期刷新使打开页面时总能命中缓存；跨过零点后自动换成新的范围。
+    """
+    interval = max(30, (APP_CONFIG.get('STATS_CACHE_TTL') or 300) / 2)
+    while True:
+        start_date, end_date = dashboard_default_range()
+        started = time.perf_counter()
+        try:
+            get_activity_breakdown(start_date=start_date, end_date=end_date, refresh=True)
+            logger.debug(f"统计缓存已刷新 ({start_date:%Y-%m-%d} ~ {end_date:%Y-%m-%d})，耗时 {time.perf_counter() - started:.2f} 秒")
+        except Exception as e:
+            logger.warning(f"刷新统计缓存失败: {e}")
+        time.sleep(interval)
+
+# 在后台线程中预热并定期刷新，不阻塞启动
+threading.Thread(target=warm_stats_cache, name='stats-cache-warmup', daemon=True).start()
+
+# --- 请求指标 ---
+@app.before_request
+def start_request_timer():
+    """记录请求开始时间，并清零当前线程累计的 SQL 执行耗时"""
+    g.request_started = time.perf_counter()
+    reset_db_time()
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由规则 (而不是实际 URL，避免标签过多) 记录请求耗时和其中的 SQL 执行耗时"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint, method=request.method, status=response.status_code)
+        HTTP_DB_SECONDS.observe(get_db_time(), endpoint=endpoint, method=request.method)
+    return response
+
 # --- 路由定义 ---
 
 @app.route('/')
@@ -101,11 +163,11 @@ def index():
         else:
             logger.warning("数据库中未找到服务器配置。")
         # 渲染模板，传入服务器选项
-        return render_template('index.html', servers=server_options)
+        return render_template('index.html', servers=server_options, default_days=get_default_days())
     except Exception as e:
         logger.exception(f"渲染主页时出错: {e}")
         # 出错时也渲染页面，但下拉列表将为空
-        return render_template('index.html', servers=[])
+        return render_template('index.html', servers=[], default_days=get_default_days())
 
 @app.route('/api/activities', methods=['GET'])
 def get_activities():
@@ -118,9 +180,15 @@ def get_activities():
         operation_type = request.args.get('operation_type')
         risk_level = request.args.get('risk_level')
         user_name = request.args.get('user_name')
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
-        offset = (page - 1) * limit
+        limit = max(1, min(request.args.get('limit', 50, type=int), 1000))
+        # 游标分页: cursor 为上次返回的 next_cursor / prev_cursor，direction 为 next (更早) 或 prev (更新)
+        cursor = request.args.get('cursor') or None
+        direction = request.args.get('direction', 'next')
+        count_mode = request.args.get('count', 'exact')
+        if direction not in ('next', 'prev'):
+            return jsonify({'error': f'无效的 direction: {direction}'}), 400
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f'无效的 count: {count_mode}，可选值: {", ".join(COUNT_MODES)}'}), 400
 
         # 解析日期 (包含对 "Invalid date" 的处理)
         start_date = None
@@ -137,22 +205,28 @@ def get_activities():
         # logger.info(f"接收到的活动请求参数: ...") # 日志可选
 
         # 调用 models 获取数据
-        activities, total = get_user_activities(
-            server_id=server_id if server_id else None, start_date=start_date, end_date=end_date,
-            operation_type=operation_type if operation_type else None, risk_level=risk_level if risk_level else None,
-            user_name=user_name if user_name else None, limit=limit, offset=offset
-        )
+        try:
+            page = get_user_activities(
+                server_id=server_id if server_id else None, start_date=start_date, end_date=end_date,
+                operation_type=operation_type if operation_type else None, risk_level=risk_level if risk_level else None,
+                user_name=user_name if user_name else None, limit=limit, cursor=cursor, direction=direction, count_mode=count_mode
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         # logger.info(f"筛选后的活动数据条数: ...") # 日志可选
 
         # 格式化结果
         activities_list = []
-        for act in activities:
+        for act in page['activities']:
              if isinstance(act, dict):
                  if isinstance(act.get('activity_time'), datetime):
                      act['activity_time'] = act['activity_time'].strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
                  activities_list.append(act)
 
-        return jsonify({'activities': activities_list, 'total': total})
+        return jsonify({
+            'activities': activities_list, 'total': page['total'], 'total_approximate': page['total_approximate'],
+            'next_cursor': page['next_cursor'], 'prev_cursor': page['prev_cursor']
+        })
 
     except Exception as e:
         logger.exception(f"获取活动数据失败: {e}")
@@ -193,48 +267,83 @@ def get_stats():
         logger.exception(f"获取统计数据失败: {e}")
         return jsonify({'error': f'获取统计数据失败: 服务器内部错误'}), 500
 
+@app.route('/api/stats/cache', methods=['DELETE'])
+def api_clear_stats_cache():
+    """清空统计缓存 (回填等其他进程写入历史数据后使用；本进程的写入会自动使相关缓存失效)"""
+    return jsonify({'status': 'success', 'cleared': clear_stats_cache()})
+
 @app.route('/api/scan', methods=['POST'])
 def api_scan():
-    """触发日志扫描 API"""
-    scan_message = "扫描任务已提交" # 默认成功消息
-    status_code = 200
-    response_data = {}
+    """触发日志扫描 API：提交后台扫描任务并立即返回任务 ID"""
     try:
         server_id_to_scan = request.json.get('server_id') if request.is_json else None
-        logger.info(f"收到扫描请求: server_id_to_scan={server_id_to_scan}")
+        # 可选：本次扫描的批量写入方式 (executemany / multi_values / load_data)
+        writer_mode = request.json.get('writer_mode') if request.is_json else None
+        if writer_mode and writer_mode not in WRITER_MODES:
+            return jsonify({'status': 'error', 'error': f'无效的写入方式: {writer_mode}，可选值: {", ".join(WRITER_MODES)}'}), 400
+        logger.info(f"收到扫描请求: server_id_to_scan={server_id_to_scan}, writer_mode={writer_mode}")
         
         # 从数据库获取服务器配置
         if server_id_to_scan is not None:
             # 扫描指定服务器
             server_config_to_scan = get_server_full_config(server_id_to_scan)
-            if server_config_to_scan:
-                display_name = server_config_to_scan.get('name', server_config_to_scan.get('host', server_id_to_scan))
-                logger.info(f"开始扫描特定服务器 (来自数据库): Name={display_name}, ID={server_id_to_scan}")
-                # 注意：这里的扫描是同步执行的，会阻塞请求直到完成
-                scan_logs_for_server(server_config_to_scan)
-                scan_message = f"服务器 {display_name} 扫描完成"
-                response_data = {'status': 'success', 'message': scan_message} # 返回成功状态
-            else:
+            if not server_config_to_scan:
                 logger.error(f"扫描失败：在数据库中未找到 ID 为 {server_id_to_scan} 的服务器配置。")
-                response_data = {'status': 'error', 'error': f'未在配置中找到ID为 {server_id_to_scan} 的服务器'}
-                status_code = 404
+                return jsonify({'status': 'error', 'error': f'未在配置中找到ID为 {server_id_to_scan} 的服务器'}), 404
+            display_name = server_config_to_scan.get('name', server_config_to_scan.get('host', server_id_to_scan))
+            logger.info(f"提交特定服务器扫描任务 (来自数据库): Name={display_name}, ID={server_id_to_scan}")
+            job, created = scan_job_manager.submit(server_id_to_scan, server_config_to_scan, writer_mode)
+            scan_message = f"服务器 {display_name} 扫描任务已提交" if created else "已有扫描任务正在运行"
         else:
             # 扫描所有服务器
-            logger.info("开始扫描所有服务器 (来自数据库)...")
-            # 注意：这里的扫描是同步执行的
-            scan_all_servers()
-            scan_message = "所有服务器扫描完成"
-            response_data = {'status': 'success', 'message': scan_message} # 返回成功状态
+            logger.info("提交所有服务器扫描任务 (来自数据库)...")
+            job, created = scan_job_manager.submit(writer_mode=writer_mode)
+            scan_message = "所有服务器扫描任务已提交" if created else "已有扫描任务正在运行"
 
-        # 返回 JSON 响应和状态码
-        return jsonify(response_data), status_code
+        # 返回任务 ID，前端通过 /api/scan/jobs/<job_id> 查询进度
+        return jsonify({'status': 'success', 'message': scan_message, 'job_id': job.job_id, 'created': created}), 202
 
     except Exception as e:
-        # 捕获扫描过程中的任何未预料错误
+        # 捕获提交过程中的任何未预料错误
         logger.exception(f"扫描日志 API 处理失败: {e}")
         # 返回统一的错误格式
         return jsonify({'status': 'error', 'error': f'扫描日志失败: 服务器内部错误'}), 500
 
+@app.route('/api/scan/jobs', methods=['GET'])
+def api_scan_jobs():
+    """获取最近的扫描任务列表"""
+    try:
+        return jsonify({'status': 'success', 'jobs': scan_job_manager.list_jobs()})
+    except Exception as e:
+        logger.exception(f"获取扫描任务列表失败: {e}")
+        return jsonify({'status': 'error', 'error': f'获取扫描任务列表失败: {str(e)}'}), 500
+
+@app.route('/api/scan/jobs/<job_id>', methods=['GET'])
+def api_scan_job(job_id):
+    """获取扫描任务状态和进度：文件数、已读字节、已解析行数、已写入行数及预计剩余时间"""
+    try:
+        job = scan_job_manager.get(job_id)
+        if not job:
+            return jsonify({'status': 'error', 'error': f'未找到扫描任务 {job_id}'}), 404
+        return jsonify({'status': 'success', 'job': job.to_dict()})
+    except Exception as e:
+        logger.exception(f"获取扫描任务状态失败: {e}")
+        return jsonify({'status': 'error', 'error': f'获取扫描任务状态失败: {str(e)}'}), 500
+
+@app.route('/api/db_pool', methods=['GET'])
+def api_db_pool():
+    """获取数据库连接池状态：连接数、空闲/使用中数量及等待次数、等待时间"""
+    try:
+        return jsonify({'status': 'success', 'pool': get_db_pool_stats()})
+    except Exception as e:
+        logger.exception(f"获取连接池状态失败: {e}")
+        return jsonify({'status': 'error', 'error': f'获取连接池状态失败: {str(e)}'}), 500
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus 指标：扫描读取/解析/过滤、批量写入、扫描耗时、API 请求耗时和 SQL 执行耗时"""
+    return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # --- 服务器配置管理相关路由 ---
 @app.route('/api/servers', methods=['GET'])
 def get_servers():
@@ -370,10 +479,12 @@ def update_risk_rules():
                     return jsonify({'status': 'error', 'error': f'规则必须包含 type 或 keyword 字段'}), 400
         
         # 更新数据库和内存缓存中的风险规则
-        success = update_system_setting('RISK_OPERATIONS', risk_rules, '风险操作规则配置')
+        success = update_system_setting('RISK_OPERATIONS', risk_rules)
         if success:
             global CACHED_RISK_OPERATIONS
             CACHED_RISK_OPERATIONS = risk_rules
+            # 重新编译扫描使用的风险规则匹配器
+            set_risk_rules(risk_rules)
             return jsonify({
                 'status': 'success', 
                 'message': '风险规则已更新'
@@ -426,12 +537,121 @@ def update_write_risk_levels():
         logger.exception(f"更新写入风险级别失败: {e}")
         return jsonify({'status': 'error', 'error': f'更新写入风险级别失败: {str(e)}'}), 500
 
+@app.route('/api/risk_level_storage', methods=['GET'])
+def get_risk_level_storage_api():
+    """获取各风险等级的存储方式 (full / aggregate)"""
+    try:
+        return jsonify({'status': 'success', 'risk_level_storage': get_risk_level_storage(), 'modes': list(STORAGE_MODES)})
+    except Exception as e:
+        logger.exception(f"获取存储方式失败: {e}")
+        return jsonify({'status': 'error', 'error': f'获取存储方式失败: {str(e)}'}), 500
+
+@app.route('/api/risk_level_storage', methods=['PUT'])
+def update_risk_level_storage():
+    """更新各风险等级的存储方式，例如 {"risk_level_storage": {"Low": "aggregate"}}；下次扫描开始时生效"""
+    try:
+        if not request.is_json:
+            return jsonify({'status': 'error', 'error': '请求必须是JSON格式'}), 400
+
+        risk_level_storage = request.json.get('risk_level_storage')
+        if not risk_level_storage or not isinstance(risk_level_storage, dict):
+            return jsonify({'status': 'error', 'error': '存储方式格式无效'}), 400
+        for level, mode in risk_level_storage.items():
+            if level not in ['High', 'Medium', 'Low']:
+                return jsonify({'status': 'error', 'error': f'无效的风险等级: {level}'}), 400
+            if mode not in STORAGE_MODES:
+                return jsonify({'status': 'error', 'error': f'无效的存储方式: {mode}，可选值: {", ".join(STORAGE_MODES)}'}), 400
+
+        # 与当前设置合并，未指定的等级保持不变
+        storage = get_risk_level_storage()
+        storage.update(risk_level_storage)
+        if update_system_setting('RISK_LEVEL_STORAGE', storage):
+            return jsonify({'status': 'success', 'message': '存储方式已更新', 'risk_level_storage': storage})
+        return jsonify({'status': 'error', 'error': '更新存储方式失败'}), 500
+    except Exception as e:
+        logger.exception(f"更新存储方式失败: {e}")
+        return jsonify({'status': 'error', 'error': f'更新存储方式失败: {str(e)}'}), 500
+
+@app.route('/api/sql_digests', methods=['GET'])
+def get_sql_digests():
+    """按 SQL 指纹汇总的语句 (存储方式为 aggregate 的风险等级)，按执行次数倒序"""
+    try:
+        server_id = request.args.get('server_id', type=int)
+        start_date_str = request.args.get('start_date')
+        end_date_str = request.args.get('end_date')
+        limit = max(1, min(request.args.get('limit', 50, type=int), 1000))
+        start_date = None
+        end_date = None
+        try:
+            if start_date_str: start_date = datetime.strptime(start_date_str, '%Y-%m-%d')
+            if end_date_str: end_date = datetime.strptime(end_date_str, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
+        except ValueError:
+            return jsonify({'error': '日期格式应为 YYYY-MM-DD'}), 400
+        digests = get_sql_digest_summary(
+            server_id=server_id if server_id else None, start_date=start_date, end_date=end_date,
+            user_name=request.args.get('user_name') or None, risk_level=request.args.get('risk_level') or None, limit=limit
+        )
+        return jsonify({'digests': digests})
+    except Exception as e:
+        logger.exception(f"获取 SQL 指纹汇总失败: {e}")
+        return jsonify({'error': '获取 SQL 指纹汇总失败: 服务器内部错误'}), 500
+
+@app.route('/api/storage/sql_texts', methods=['GET'])
+def get_sql_text_storage():
+    """SQL 语句去重存储 (sql_texts) 节省的空间"""
+    try:
+        return jsonify(get_sql_text_storage_stats())
+    except Exception as e:
+        logger.exception(f"获取语句去重存储统计失败: {e}")
+        return jsonify({'error': '获取语句去重存储统计失败: 服务器内部错误'}), 500
+
+@app.route('/api/partitions', methods=['GET'])
+def get_partitions():
+    """user_activities 的分区、保留天数和最近一次后台维护的结果"""
+    try:
+        return jsonify({'status': 'success', 'interval': APP_CONFIG.get('ACTIVITY_PARTITION_INTERVAL'),
+                        'retention_days': get_activity_retention_days(), 'partitions': get_activity_partitions(),
+                        'maintenance': partition_maintainer.status()})
+    except Exception as e:
+        logger.exception(f"获取分区信息失败: {e}")
+        return jsonify({'status': 'error', 'error': f'获取分区信息失败: {str(e)}'}), 500
+
+@app.route('/api/activity_retention', methods=['PUT'])
+def update_activity_retention():
+    """更新操作记录保留天数，例如 {"retention_days": 90}，0 或 null 表示不删除；立即执行一次分区维护"""
+    try:
+        if not request.is_json:
+            return jsonify({'status': 'error', 'error': '请求必须是JSON格式'}), 400
+        retention_days = request.json.get('retention_days')
+        if retention_days is not None and (not isinstance(retention_days, int) or isinstance(retention_days, bool) or retention_days < 0):
+            return jsonify({'status': 'error', 'error': '保留天数必须是非负整数'}), 400
+        if not update_system_setting('ACTIVITY_RETENTION_DAYS', retention_days or 0):
+            return jsonify({'status': 'error', 'error': '更新保留天数失败'}), 500
+        result = partition_maintainer.run_once()
+        return jsonify({'status': 'success', 'message': '保留天数已更新', 'retention_days': retention_days or None, 'maintenance': result})
+    except Exception as e:
+        logger.exception(f"更新保留天数失败: {e}")
+        return jsonify({'status': 'error', 'error': f'更新保留天数失败: {str(e)}'}), 500
+
+def _report_day():
+    """报表的 date 参数 (YYYY-MM-DD): 指定时返回该日期所在的自然日/周/月的报表，已结束的周期读取快照"""
+    date_str = request.args.get('date')
+    if not date_str:
+        return None
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError('date 格式应为 YYYY-MM-DD')
+
 @app.route('/api/reports/daily', methods=['GET'])
 def get_daily_report():
     """获取日报"""
     try:
-        report = ReportGenerator.generate_daily_report()
+        day = _report_day()
+        report = ReportGenerator.generate_daily_report(day)
         return jsonify(report)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -439,8 +659,11 @@ def get_daily_report():
 def get_weekly_report():
     """获取周报"""
     try:
-        report = ReportGenerator.generate_weekly_report()
+        day = _report_day()
+        report = ReportGenerator.generate_weekly_report(day)
         return jsonify(report)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -448,14 +671,17 @@ def get_weekly_report():
 def get_monthly_report():
     """获取月报"""
     try:
-        report = ReportGenerator.generate_monthly_report()
+        day = _report_day()
+        report = ReportGenerator.generate_monthly_report(day)
         return jsonify(report)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/export', methods=['GET'])
 def export_activities():
-    """导出操作记录"""
+    """导出操作记录 (format: csv 默认 / jsonl / excel)"""
     try:
         # 获取查询参数
         start_date = request.args.get('start_date')
@@ -469,36 +695,39 @@ def export_activities():
         start_date = datetime.strptime(start_date, '%Y-%m-%d') if start_date else datetime.now() - timedelta(days=7)
         end_date = datetime.strptime(end_date, '%Y-%m-%d') if end_date else datetime.now()
 
-        # 生成DataFrame
-        df = ReportGenerator.export_activities(
-            start_date, 
-            end_date,
-            risk_levels=risk_levels if risk_levels else None,
-            users=users if users else None,
-            operation_types=operation_types if operation_types else None
-        )
-
-        # 创建内存文件对象
-        buffer = BytesIO()
-
-        if export_format.lower() == 'excel':
-            # 导出为Excel
-            df.to_excel(buffer, index=False, engine='openpyxl')
-            mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            filename = f'操作记录_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.xlsx'
+        filters = {
+            'risk_levels': risk_levels if risk_levels else None,
+            'users': users if users else None,
+            'operation_types': operation_types if operation_types else None
+        }
+        filename_base = f'操作记录_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}'
+        export_format = export_format.lower()
+
+        if export_format == 'excel':
+            # 导出为Excel: 逐行写入，超过 EXPORT_EXCEL_MAX_ROWS 的部分被截断
+            buffer, row_count, truncated = ReportGenerator.export_excel(start_date, end_date, **filters)
+            if truncated:
+                logger.warning(f"Excel 导出已截断为 {row_count} 行，完整数据请使用 CSV 或 JSONL 格式导出")
+            response = send_file(
+                buffer,
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                as_attachment=True,
+                download_name=f'{filename_base}.xlsx'
+            )
+            response.headers['X-Export-Rows'] = str(row_count)
+            response.headers['X-Export-Truncated'] = 'true' if truncated else 'false'
+            return response
+
+        # CSV / JSONL: 从服务器端游标分块读取并流式发送，内存占用与导出行数无关
+        if export_format == 'jsonl':
+            chunks = ReportGenerator.iter_export_jsonl(start_date, end_date, **filters)
+            mimetype, filename = 'application/x-ndjson', f'{filename_base}.jsonl'
         else:
-            # 导出为CSV
-            df.to_csv(buffer, index=False, encoding='utf-8-sig')
-            mimetype = 'text/csv'
-            filename = f'操作记录_{start_date.strftime("%Y%m%d")}_{end_date.strftime("%Y%m%d")}.csv'
-
-        buffer.seek(0)
-        return send_file(
-            buffer,
-            mimetype=mimetype,
-            as_attachment=True,
-            download_name=filename
-        )
+            chunks = ReportGenerator.iter_export_csv(start_date, end_date, **filters)
+            mimetype, filename = 'text/csv', f'{filename_base}.csv'
+        response = Response((chunk.encode('utf-8') for chunk in chunks), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f"attachment; filename*=UTF-8''{quote(filename)}"
+        return response
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+离线回填: 将本地磁盘上归档的 general log 导入指定服务器的操作记录
+支持单个文件或目录 (目录下的 .log / .log.gz / .log.zst 文件，按修改时间从旧到新处理)。
+未压缩的文件按行边界切分为多个区间，压缩文件整个作为一个区间，由多个进程并行解析 (见 parallel_parser)，
+分类规则与在线扫描相同 (使用数据库中保存的风险规则和写入风险等级)，记录通过批量写入方式写入数据库。
+
+回填不读取也不更新在线扫描的检查点和线程会话；同一批文件重复回填会重复写入记录。
+
+用法 (在项目根目录执行):
+    python backfill.py --server-id 3 /data/archive/db01/
+    python backfill.py --server-id 3 --workers 8 --writer-mode load_data general.log.1.gz general.log
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import List, Tuple, Optional
+
+from config import APP_CONFIG
+from compressed_logs import is_log_file, log_file_compression
+from log_parser import BATCH_INSERT_SIZE
+from models import add_user_activities_batch, get_server_full_config, get_system_setting, get_risk_level_storage, WRITER_MODES
+from parallel_parser import build_segments, parse_segments_parallel, DEFAULT_RANGE_SIZE
+from risk_rules import refresh_risk_rules
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+def collect_log_files(paths: List[str], recursive: bool = False) -> List[str]:
+    """展开命令行给出的文件和目录：目录下的日志文件按修改时间 (相同时按文件名) 从旧到新排序，单独给出的文件保持原顺序"""
+    files = []
+    for path in paths:
+        if os.path.isfile(path):
+            files.append(path)
+            continue
+        if not os.path.isdir(path):
+            logger.warning(f"路径不存在，已跳过: {path}")
+            continue
+        found = []
+        for root, dirs, names in os.walk(path):
+            found.extend(os.path.join(root, name) for name in names if is_log_file(name))
+            if not recursive: break
+        found.sort(key=lambda name: (os.path.getmtime(name), name))
+        files.extend(found)
+    return files
+
+
+def _allowed_risk_levels(levels: Optional[List[str]]):
+    """命令行指定的风险等级优先，其次为通过 /api/write_risk_levels 保存的设置，最后为 APP_CONFIG 默认值"""
+    levels = [level.strip() for level in levels or [] if level.strip()]
+    if not levels:
+        levels = get_system_setting('WRITE_RISK_LEVELS')
+        if not isinstance(levels, list) or not levels: levels = APP_CONFIG.get('WRITE_RISK_LEVELS', ['High', 'Medium', 'Low'])
+    return {level.capitalize() for level in levels}
+
+
+def backfill(server_id: int, files: List[str], workers: Optional[int] = None, range_size: int = DEFAULT_RANGE_SIZE,
+             writer_mode: Optional[str] = None, allowed_levels=None, min_timestamp: Optional[datetime] = None,
+             dry_run: bool = False) -> dict:
+    """
+    并行解析 files 并将符合写入风险等级的记录批量写入数据库，所有文件共用一个线程会话表 (按给定顺序衔接)。
+    dry_run 为 True 时只解析不写入。返回统计信息 (行数、写入行数、耗时、lines/s、rows/s)。
+    """
+    segments: List[Tuple] = []
+    bytes_total = 0
+    for path in files:
+        compression = log_file_compression(os.path.basename(path))
+        segments.extend(build_segments(path, compression, range_size))
+        bytes_total += os.path.getsize(path)
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"回填服务器 {server_id}: {len(files)} 个文件 ({bytes_total / 1024 / 1024:.1f} MB)，{len(segments)} 个区间，"
+                f"{workers} 个解析进程，写入风险等级 {sorted(allowed_levels) if allowed_levels is not None else '全部'}")
+
+    stats = {'files': len(files), 'bytes': bytes_total, 'lines': 0, 'rows_parsed': 0, 'rows_written': 0, 'failed_batches': 0}
+    storage_modes = get_risk_level_storage() if not dry_run else None
+    started = time.monotonic()
+    batch = []
+
+    def flush():
+        if not batch: return
+        if dry_run or add_user_activities_batch(batch, writer_mode, storage_modes):
+            stats['rows_written'] += len(batch)
+        else:
+            stats['failed_batches'] += 1
+            logger.error(f"写入 {len(batch)} 条记录失败")
+        batch.clear()
+
+    current_path = None
+    for segment, activities, segment_stats in parse_segments_parallel(segments, server_id, workers, {}, allowed_levels, min_timestamp):
+        if segment[0] != current_path:
+            current_path = segment[0]
+            logger.info(f"处理文件 {current_path}")
+        stats['lines'] += segment_stats['lines']
+        stats['rows_parsed'] += len(activities)
+        for activity in activities:
+            batch.append(activity)
+            if len(batch) >= BATCH_INSERT_SIZE: flush()
+    flush()
+
+    elapsed = time.monotonic() - started
+    stats['duration_seconds'] = round(elapsed, 3)
+    stats['lines_per_second'] = round(stats['lines'] / elapsed, 1) if elapsed > 0 else 0.0
+    stats['rows_per_second'] = round(stats['rows_written'] / elapsed, 1) if elapsed > 0 else 0.0
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='将本地归档的 general log 回填到指定服务器的操作记录')
+    parser.add_argument('paths', nargs='+', help='日志文件或目录 (支持 .log / .log.gz / .log.zst)')
+    parser.add_argument('--server-id', type=int, required=True, help='记录所属的服务器 ID (server_configs.server_id)')
+    parser.add_argument('--workers', type=int, default=None, help='解析进程数，默认为 CPU 核数')
+    parser.add_argument('--range-size-mb', type=int, default=DEFAULT_RANGE_SIZE // 1024 // 1024, help='未压缩文件每个解析区间的大小 (MB)')
+    parser.add_argument('--writer-mode', choices=WRITER_MODES, default=None, help='批量写入方式，默认使用 APP_CONFIG["WRITER_MODE"]')
+    parser.add_argument('--levels', default=None, help='写入的风险等级，逗号分隔 (例如 High,Medium)，默认使用系统设置的写入风险等级')
+    parser.add_argument('--since', default=None, help='只导入晚于该时间 (UTC，ISO 格式) 的操作，例如 2024-01-01T00:00:00')
+    parser.add_argument('--recursive', action='store_true', help='递归处理子目录')
+    parser.add_argument('--dry-run', action='store_true', help='只解析并统计，不写入数据库')
+    parser.add_argument('--verbose', action='store_true', help='输出解析过程的详细日志')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if not args.verbose: logging.getLogger('log_parser').setLevel(logging.WARNING)  # 解析器逐行的 Connect/Quit 日志
+
+    if not args.dry_run and not get_server_full_config(args.server_id):
+        sys.exit(f"服务器 ID {args.server_id} 不存在")
+    min_timestamp = None
+    if args.since:
+        try: min_timestamp = datetime.fromisoformat(args.since)
+        except ValueError: sys.exit(f"无效的时间: {args.since}")
+        if min_timestamp.tzinfo is None: min_timestamp = min_timestamp.replace(tzinfo=timezone.utc)
+
+    files = collect_log_files(args.paths, args.recursive)
+    if not files:
+        sys.exit("没有找到需要处理的日志文件")
+
+    # 使用通过 /api/risk_rules 保存的规则，与在线扫描一致
+    try: refresh_risk_rules()
+    except Exception as e: logger.warning(f"刷新风险规则失败，使用默认规则: {e}")
+
+    stats = backfill(args.server_id, files, args.workers, args.range_size_mb * 1024 * 1024, args.writer_mode,
+                     _allowed_risk_levels(args.levels.split(',') if args.levels else None), min_timestamp, args.dry_run)
+    print(f"文件 {stats['files']} 个，{stats['bytes'] / 1024 / 1024:.1f} MB，耗时 {stats['duration_seconds']:.2f} 秒")
+    print(f"解析 {stats['lines']} 行 ({stats['lines_per_second']:.0f} lines/s)，"
+          f"{'解析出' if args.dry_run else '写入'} {stats['rows_written']} 条记录 ({stats['rows_per_second']:.0f} rows/s)"
+          + (f"，{stats['failed_batches']} 个批次写入失败" if stats['failed_batches'] else ""))
+    if stats['rows_written'] and not args.dry_run:
+        # Web 进程只在自身写入时使统计缓存立即失效，已结束时间范围的缓存最多保留 STATS_CACHE_CLOSED_TTL 秒
+        print(f"Web 服务中已缓存的统计最多在 {APP_CONFIG.get('STATS_CACHE_CLOSED_TTL', 3600)} 秒后包含回填的数据，"
+              "如需立即生效请调用 DELETE /api/stats/cache")
+    if stats['failed_batches']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+解析与分类热路径的基准测试
+在内存中生成合成日志 (见 synthetic_log)，不含文件读取，只测量 parse_general_log_stream 本身:
+  - lines_per_second:   每秒处理的行数 (多次运行取最快)
+  - traced_peak_kb:     流式消费活动记录时 tracemalloc 记录的内存分配峰值
+  - bytes_per_activity: 全部活动记录保留在列表中时，平均每条记录占用的内存
+  - peak_rss_mb:        解析结束后进程的峰值 RSS；rss_growth_mb 为解析期间峰值 RSS 的增长
+另有 pattern_new、determine_operation_type、determine_risk_level、create_activity_entry 的单项调用速度 (ops_per_second)。
+每个场景在单独的子进程中运行，RSS 互不影响。
+
+结果可保存为基线 (benchmarks/baselines.json)，之后的运行与基线对比；吞吐量下降或内存增长超过 --threshold 时标记为回退，
+指定 --check 时以非零状态退出。基线与机器相关，更换机器后应重新保存。
+
+用法 (在项目根目录执行):
+    python benchmarks/bench_parser.py                     # 运行全部场景并与基线对比
+    python benchmarks/bench_parser.py --save-baseline     # 保存为新的基线
+    python benchmarks/bench_parser.py --cases default long_statements --lines 500000 --check
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_parser import pattern_new, parse_general_log_stream, determine_operation_type, determine_risk_level, create_activity_entry
+from synthetic_log import generate_log
+
+# 基准场景: 场景名 -> generate_lines 的参数
+CASES = {
+    'default': {},
+    'read_heavy': {'query_mix': 'read_heavy'},
+    'write_heavy': {'query_mix': 'write_heavy'},
+    'high_churn': {'churn': 0.2},
+    'many_threads': {'threads': 20000},
+    'long_statements': {'statement_length': 2000},
+}
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# 越大越好的指标；其余指标越小越好
+_HIGHER_IS_BETTER = {'lines_per_second', 'ops_per_second'}
+# 参与对比的内存指标，以及判定为回退所需的最小绝对增长 (数值很小时百分比没有意义)
+_MEMORY_METRICS = {'traced_peak_kb': 64, 'bytes_per_activity': 16, 'rss_growth_mb': 1}
+
+
+def _peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _best_time(func, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter(); func(); elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_parse_case(options: dict, line_count: int, repeat: int) -> dict:
+    """在当前进程中运行一个解析场景 (由子进程调用)"""
+    logging.disable(logging.WARNING)  # 解析时的逐行日志会影响计时
+    lines = generate_log(line_count, **options)
+
+    def consume():
+        for _ in parse_general_log_stream(iter(lines), 1): pass
+
+    rss_before = _peak_rss_mb()
+    elapsed = _best_time(consume, repeat)
+    peak_rss = _peak_rss_mb()
+
+    tracemalloc.start()
+    consume()
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.reset_peak()
+    baseline_size = tracemalloc.get_traced_memory()[0]
+    activities = list(parse_general_log_stream(iter(lines), 1))
+    retained = tracemalloc.get_traced_memory()[0] - baseline_size
+    tracemalloc.stop()
+
+    return {'lines_per_second': round(line_count / elapsed, 1),
+            'mb_per_second': round(sum(map(len, lines)) / elapsed / 1024 / 1024, 2),
+            'activities': len(activities),
+            'traced_peak_kb': round(traced_peak / 1024, 1),
+            'bytes_per_activity': round(retained / len(activities), 1) if activities else 0.0,
+            'peak_rss_mb': round(peak_rss, 1), 'rss_growth_mb': round(peak_rss - rss_before, 1)}
+
+
+def run_micro_benchmarks(line_count: int, repeat: int) -> dict:
+    """热路径各函数的单项调用速度"""
+    logging.disable(logging.WARNING)
+    lines = generate_log(line_count)
+    matches = [match.groups() for match in map(pattern_new.match, lines) if match]
+    queries = [(ts.decode('ascii'), int(tid), cmd.decode('ascii'), arg.decode('utf-8', errors='ignore').strip())
+               for ts, tid, cmd, arg in matches if cmd == b'Query']
+    typed = [(determine_operation_type(sql), sql) for _, _, _, sql in queries]
+
+    def pattern_match():
+        match = pattern_new.match
+        for line in lines: match(line)
+
+    def operation_type():
+        for _, _, _, sql in queries: determine_operation_type(sql)
+
+    def risk_level():
+        for operation_type, sql in typed: determine_risk_level(operation_type, sql)
+
+    def activity_entry():
+        for ts, thread_id, command, sql in queries: create_activity_entry(1, ts, 'user', 'host', 'db', thread_id, command, sql)
+
+    results = {}
+    for name, func, count in (('pattern_new.match', pattern_match, len(lines)), ('determine_operation_type', operation_type, len(queries)),
+                              ('determine_risk_level', risk_level, len(typed)), ('create_activity_entry', activity_entry, len(queries))):
+        results[f'micro.{name}'] = {'ops_per_second': round(count / _best_time(func, repeat), 1)}
+    return results
+
+
+def _run_isolated(func, *args):
+    """在新的子进程中运行，峰值 RSS 只反映该场景"""
+    with multiprocessing.get_context().Pool(1) as pool:
+        return pool.apply(func, args)
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    """打印与基线的对比，返回回退的 (场景, 指标) 列表"""
+    regressions = []
+    for case, metrics in results.items():
+        base_metrics = baseline.get(case, {})
+        for metric, value in metrics.items():
+            base = base_metrics.get(metric)
+            if metric not in _HIGHER_IS_BETTER and metric not in _MEMORY_METRICS:
+                continue
+            if not base:
+                print(f"  {case:<34}{metric:<22}{value:>14}   (无基线)")
+                continue
+            change = (value - base) / base * 100
+            worse = -change if metric in _HIGHER_IS_BETTER else change
+            flag = '  <-- 回退' if worse > threshold and abs(value - base) >= _MEMORY_METRICS.get(metric, 0) else ''
+            if flag: regressions.append((case, metric))
+            print(f"  {case:<34}{metric:<22}{value:>14}{base:>14}{change:>+9.1f}%{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='解析与分类热路径的基准测试')
+    parser.add_argument('--lines', type=int, default=100000, help='每个场景的合成日志行数')
+    parser.add_argument('--repeat', type=int, default=3, help='计时的重复次数 (取最快一次)')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='运行的场景')
+    parser.add_argument('--no-micro', action='store_true', help='不运行单项函数的基准')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='将本次结果保存为基线')
+    parser.add_argument('--threshold', type=float, default=10.0, help='判定为回退的变化百分比')
+    parser.add_argument('--check', action='store_true', help='存在回退时以非零状态退出')
+    args = parser.parse_args()
+
+    results = {}
+    for case in args.cases:
+        print(f"运行场景 {case} ({args.lines} 行)...", flush=True)
+        results[case] = _run_isolated(run_parse_case, CASES[case], args.lines, args.repeat)
+    if not args.no_micro:
+        print("运行单项函数基准...", flush=True)
+        results.update(_run_isolated(run_micro_benchmarks, args.lines, args.repeat))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f).get('results', {})
+    print(f"\n  {'场景':<32}{'指标':<20}{'本次':>14}{'基线':>14}{'变化':>9}")
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        meta = {'created_at': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+                'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'lines': args.lines, 'repeat': args.repeat}
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} 项指标回退超过 {args.threshold}%")
+        if args.check: sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
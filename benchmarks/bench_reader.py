@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+日志读取与解析吞吐量 (MB/秒)
+在合成的 general log 上对比:
+  - line_iter:    逐行迭代文件对象 (原先的读取方式)
+  - block_split:  按块读取并在字节层面分行 (block_reader)
+  - decode_match: 先解码、strip 每一行再用字符串正则匹配行头 (原先的匹配方式)
+  - bytes_match:  直接在字节行上匹配行头
+  - parse:        按块读取 + 完整解析 (parse_general_log_stream)
+指定 --sftp-host 等参数时，另外对比远程文件逐行迭代与按块 readv 读取的速度。
+
+用法 (在项目根目录执行):
+    python benchmarks/bench_reader.py --size-mb 200
+    python benchmarks/bench_reader.py --sftp-host 10.0.0.5 --sftp-user root --sftp-key ~/.ssh/id_rsa --sftp-path /var/log/mysql/general.log
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_reader import iter_blocks, iter_lines, DEFAULT_BLOCK_SIZE
+from log_parser import pattern_new, parse_general_log_stream, connect_ssh
+from synthetic_log import write_synthetic_log
+
+# 原先在解码后的字符串上使用的行头正则
+_STR_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z)\t *(\d+)\s+(Query|Connect|Init DB|Quit|Prepare|Execute|Close stmt|Change user|Field List)\t(.*)')
+
+
+def measure(name: str, size: int, func):
+    started = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - started
+    print(f"{name:<14}{elapsed:>10.2f}{size / elapsed / 1024 / 1024:>12.1f}   {result}")
+
+
+def bench_local(path: str, block_size: int):
+    size = os.path.getsize(path)
+    print(f"文件大小 {size / 1024 / 1024:.1f} MB, 块大小 {block_size // 1024} KB")
+    print(f"{'方式':<14}{'耗时(秒)':>10}{'MB/秒':>12}   结果")
+
+    def line_iter():
+        with open(path, 'rb') as f: return sum(1 for _ in f)
+
+    def block_split():
+        with open(path, 'rb') as f: return sum(1 for _ in iter_lines(iter_blocks(f, 0, None, block_size)))
+
+    def decode_match():
+        count = 0
+        with open(path, 'rb') as f:
+            for line_bytes in iter_lines(iter_blocks(f, 0, None, block_size)):
+                line = line_bytes.decode('utf-8', errors='ignore').strip()
+                if line and _STR_PATTERN.match(line): count += 1
+        return count
+
+    def bytes_match():
+        match = pattern_new.match
+        with open(path, 'rb') as f: return sum(1 for line_bytes in iter_lines(iter_blocks(f, 0, None, block_size)) if match(line_bytes))
+
+    def parse():
+        with open(path, 'rb') as f: return sum(1 for _ in parse_general_log_stream(iter_lines(iter_blocks(f, 0, None, block_size)), 1))
+
+    for name, func in (('line_iter', line_iter), ('block_split', block_split), ('decode_match', decode_match), ('bytes_match', bytes_match), ('parse', parse)):
+        measure(name, size, func)
+
+
+def bench_sftp(args):
+    ssh_client = connect_ssh(args.sftp_host, args.sftp_port, args.sftp_user, args.sftp_password, args.sftp_key)
+    if not ssh_client: sys.exit("SSH 连接失败")
+    try:
+        sftp = ssh_client.open_sftp()
+        size = min(sftp.stat(args.sftp_path).st_size, args.size_mb * 1024 * 1024)
+        print(f"远程文件 {args.sftp_path}，读取 {size / 1024 / 1024:.1f} MB")
+
+        def sftp_line_iter():
+            count = 0; read = 0
+            with sftp.open(args.sftp_path, 'rb') as f:
+                for line in f:
+                    count += 1; read += len(line)
+                    if read >= size: break
+            return count
+
+        def sftp_blocks():
+            with sftp.open(args.sftp_path, 'rb') as f: return sum(1 for _ in iter_lines(iter_blocks(f, 0, size, args.block_size)))
+
+        print(f"{'方式':<14}{'耗时(秒)':>10}{'MB/秒':>12}   结果")
+        measure('sftp_line', size, sftp_line_iter)
+        measure('sftp_block', size, sftp_blocks)
+    finally:
+        ssh_client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='日志读取与解析吞吐量')
+    parser.add_argument('--size-mb', type=int, default=100, help='合成日志大小 (MB)；SFTP 模式下为最多读取的大小')
+    parser.add_argument('--block-size', type=int, default=DEFAULT_BLOCK_SIZE, help='按块读取的块大小 (字节)')
+    parser.add_argument('--file', help='使用已有的日志文件而不是生成合成日志')
+    parser.add_argument('--sftp-host'); parser.add_argument('--sftp-port', type=int, default=22)
+    parser.add_argument('--sftp-user'); parser.add_argument('--sftp-password'); parser.add_argument('--sftp-key')
+    parser.add_argument('--sftp-path', help='远程日志文件路径')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)  # 解析时的逐行日志会影响计时
+
+    if args.sftp_host:
+        bench_sftp(args)
+        return
+    if args.file:
+        bench_local(args.file, args.block_size)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'general.log')
+        write_synthetic_log(path, args.size_mb * 1024 * 1024)
+        bench_local(path, args.block_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+批量写入方式吞吐量对比
+用合成的活动记录分别以 executemany、multi_values、load_data 方式写入 DB_CONFIG 指定的数据库，
+输出每种方式的写入速度 (行/秒)。测试数据使用专用的 server_id 写入 user_activities，每轮结束后删除。
+
+用法 (在项目根目录执行):
+    python benchmarks/bench_writers.py --rows 200000 --batch-size 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import APP_CONFIG
+from models import WRITER_MODES, add_user_activities_batch, get_db_connection
+
+
+def make_activities(count: int, server_id: int, seed: int = 42):
+    """生成确定性的合成活动记录"""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    users = [f'user{i}' for i in range(20)]
+    templates = [
+        ('SELECT', 'Low', "SELECT * FROM orders WHERE id = {n} AND status = 'paid'"),
+        ('UPDATE', 'Medium', "UPDATE accounts SET balance = balance - {n} WHERE id = {m}"),
+        ('DELETE', 'High', "DELETE FROM sessions WHERE expires_at < '2024-01-01' AND id = {n}"),
+        ('INSERT', 'Low', "INSERT INTO logs (msg) VALUES ('line\\twith\\ttabs {n}\\nand newline')"),
+    ]
+    activities = []
+    for i in range(count):
+        operation_type, risk_level, template = templates[rng.randrange(len(templates))]
+        activities.append({
+            'server_id': server_id, 'timestamp': start + timedelta(microseconds=i * 1500),
+            'user_name': rng.choice(users), 'client_host': f'10.0.{rng.randrange(8)}.{rng.randrange(255)}',
+            'db_name': 'bench', 'thread_id': rng.randrange(1, 5000), 'command_type': 'Query',
+            'operation_type': operation_type, 'argument': template.format(n=rng.randrange(10 ** 6), m=i), 'risk_level': risk_level
+        })
+    return activities
+
+
+def cleanup(server_id: int):
+    conn = get_db_connection()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("DELETE FROM user_activities WHERE server_id = %s", (server_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比批量写入方式的吞吐量')
+    parser.add_argument('--rows', type=int, default=100000, help='每种方式写入的行数')
+    parser.add_argument('--batch-size', type=int, default=500, help='每批写入的行数')
+    parser.add_argument('--modes', nargs='+', default=list(WRITER_MODES), choices=WRITER_MODES, help='参与对比的写入方式')
+    parser.add_argument('--server-id', type=int, default=999999, help='测试数据使用的 server_id (结束后删除)')
+    args = parser.parse_args()
+
+    if 'load_data' in args.modes and not APP_CONFIG.get('DB_LOCAL_INFILE'):
+        print("未开启 DB_LOCAL_INFILE，跳过 load_data")
+        args.modes = [mode for mode in args.modes if mode != 'load_data']
+
+    activities = make_activities(args.rows, args.server_id)
+    batches = [activities[i:i + args.batch_size] for i in range(0, len(activities), args.batch_size)]
+    print(f"{'写入方式':<14}{'行数':>10}{'耗时(秒)':>12}{'行/秒':>12}")
+    for mode in args.modes:
+        cleanup(args.server_id)
+        started = time.perf_counter()
+        for batch in batches:
+            if not add_user_activities_batch(batch, mode):
+                print(f"{mode}: 写入失败，终止")
+                break
+        else:
+            elapsed = time.perf_counter() - started
+            print(f"{mode:<14}{args.rows:>10}{elapsed:>12.2f}{args.rows / elapsed:>12.0f}")
+    cleanup(args.server_id)
+
+
+if __name__ == '__main__':
+    main()
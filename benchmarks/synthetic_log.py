@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+确定性的合成 general log 生成器 (供各基准测试使用)
+相同的参数和 seed 总是生成完全相同的内容。可配置:
+  - query_mix:        各类语句的权重 (键为 STATEMENT_TEMPLATES 中的类型)，或 QUERY_MIXES 中的预设名
+  - threads:          同时在线的线程数
+  - churn:            每行日志发生一次断开重连 (Quit + 新线程 Connect) 的概率
+  - statement_length: SQL 语句的目标平均长度 (字符)，通过追加 IN 列表条件补足
+  - multiline_ratio:  多行 SQL 后续行 (不匹配行头，解析器忽略) 的比例
+"""
+import random
+from typing import Dict, Iterator, List, Optional, Union
+
+# 各类语句的模板，{n} {m} 为随机整数
+STATEMENT_TEMPLATES: Dict[str, List[str]] = {
+    'select': ["SELECT * FROM orders WHERE id = {n}", "select o.id, c.name from orders o join customers c on c.id = o.customer_id where o.id = {n}"],
+    'insert': ["INSERT INTO logs (msg, created_at) VALUES ('event {n}', NOW())"],
+    'update': ["UPDATE accounts SET balance = balance - {m} WHERE id = {n}"],
+    'delete': ["DELETE FROM sessions WHERE id = {n}"],
+    'ddl': ["ALTER TABLE orders ADD INDEX idx_{n} (customer_id)", "CREATE TABLE tmp_{n} (id INT PRIMARY KEY)", "DROP TABLE IF EXISTS tmp_{n}"],
+    'dcl': ["GRANT SELECT ON shop.* TO 'report{n}'@'%'"],
+    'show': ["show tables", "SHOW VARIABLES LIKE 'max_connections'"],
+    'other': ["SET autocommit = 1", "COMMIT", "/* ping */ SELECT 1"],
+}
+
+# 预设的语句比例
+QUERY_MIXES: Dict[str, Dict[str, float]] = {
+    'default': {'select': 60, 'insert': 15, 'update': 10, 'delete': 3, 'ddl': 1, 'dcl': 0.5, 'show': 3, 'other': 7.5},
+    'read_heavy': {'select': 90, 'show': 5, 'other': 5},
+    'write_heavy': {'select': 20, 'insert': 40, 'update': 25, 'delete': 10, 'ddl': 2, 'other': 3},
+}
+
+
+def generate_lines(line_count: Optional[int] = None, seed: int = 42, query_mix: Union[str, Dict[str, float]] = 'default',
+                   threads: int = 200, churn: float = 0.02, statement_length: int = 0, multiline_ratio: float = 0.01,
+                   session_commands: float = 0.01) -> Iterator[bytes]:
+    """
+    逐行产出合成日志 (bytes，带换行符)，line_count 为 None 时无限产出。
+    开头为全部初始线程的 Connect 行 (计入 line_count)；session_commands 为 Init DB / Change user 行的比例。
+    """
+    rng = random.Random(seed)
+    mix = QUERY_MIXES[query_mix] if isinstance(query_mix, str) else query_mix
+    kinds = [kind for kind in mix if mix[kind] > 0]
+    weights = [mix[kind] for kind in kinds]
+    next_thread = 1
+    active: List[int] = []
+    i = 0
+
+    def timestamp() -> str:
+        # 每行间隔 1 毫秒，保证时间戳单调递增
+        return f"2024-01-{1 + i // 86400000 % 28:02d}T{i // 3600000 % 24:02d}:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000 * 1000:06d}Z"
+
+    def connect(thread_id: int) -> bytes:
+        return f"{timestamp()}\t{thread_id:>6} Connect\tuser{thread_id % 50}@10.0.{thread_id % 8}.{thread_id % 250} on shop using TCP/IP\n".encode('utf-8')
+
+    def statement() -> str:
+        sql = rng.choice(STATEMENT_TEMPLATES[rng.choices(kinds, weights)[0]]).format(n=rng.randrange(10 ** 6), m=rng.randrange(1000))
+        if len(sql) < statement_length:
+            values = []
+            budget = statement_length - len(sql) - 16
+            while budget > 0:
+                value = str(rng.randrange(10 ** 6)); values.append(value); budget -= len(value) + 2
+            sql += f" AND ref_id IN ({', '.join(values)})"
+        return sql
+
+    while line_count is None or i < line_count:
+        if len(active) < threads:
+            thread_id = next_thread; next_thread += 1; active.append(thread_id)
+            line = connect(thread_id)
+        elif rng.random() < churn:
+            # 断开一个线程，下一行由新线程 Connect 补足
+            thread_id = active.pop(rng.randrange(len(active)))
+            line = f"{timestamp()}\t{thread_id:>6} Quit\t\n".encode('utf-8')
+        else:
+            thread_id = rng.choice(active)
+            roll = rng.random()
+            if roll < multiline_ratio:
+                line = f"\t\tAND continued = {i}\n".encode('utf-8')
+            elif roll < multiline_ratio + session_commands / 2:
+                line = f"{timestamp()}\t{thread_id:>6} Init DB\tshop_{rng.randrange(4)}\n".encode('utf-8')
+            elif roll < multiline_ratio + session_commands:
+                line = f"{timestamp()}\t{thread_id:>6} Change user\tadmin@10.0.0.{rng.randrange(250)} on shop\n".encode('utf-8')
+            else:
+                line = f"{timestamp()}\t{thread_id:>6} Query\t{statement()}\n".encode('utf-8')
+        i += 1
+        yield line
+
+
+def generate_log(line_count: int, **options) -> List[bytes]:
+    """在内存中生成 line_count 行合成日志，参数见 generate_lines"""
+    return list(generate_lines(line_count, **options))
+
+
+def write_synthetic_log(path: str, size_bytes: int, seed: int = 42, **options):
+    """生成约 size_bytes 字节的合成日志文件，参数见 generate_lines"""
+    written = 0
+    with open(path, 'wb') as f:
+        for line in generate_lines(None, seed, **options):
+            f.write(line); written += len(line)
+            if written >= size_bytes: break
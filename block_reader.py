@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+按块读取日志文件
+SFTP 文件逐行迭代时每次只请求一小段数据，高延迟链路上大部分时间都在等待往返。
+这里按大块读取：SFTP 文件使用 readv，一个块拆分为多个并发的读请求 (流水线)，
+再在字节层面按换行符切分为行，不做任何解码。
+"""
+import io
+from typing import Iterator, Optional
+
+# 默认块大小
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def iter_blocks(file_obj, start: int = 0, end: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    读取文件 [start, end) 区间 (end 为 None 时读到文件末尾)，逐块产出。
+    paramiko 的 SFTPFile 使用 readv 预取整个块；普通文件对象按块 read。
+    """
+    readv = getattr(file_obj, 'readv', None)
+    if readv is None: file_obj.seek(start)
+    offset = start
+    while end is None or offset < end:
+        size = block_size if end is None else min(block_size, end - offset)
+        data = b''.join(readv([(offset, size)])) if readv is not None else file_obj.read(size)
+        if not data: break
+        offset += len(data)
+        yield data
+
+
+def iter_lines(blocks: Iterator[bytes]) -> Iterator[bytes]:
+    """将数据块切分为行 (保留换行符)；末尾不完整的行原样产出，由调用方决定是否处理"""
+    pending = b''
+    for block in blocks:
+        if pending: block = pending + block
+        cut = block.rfind(b'\n') + 1
+        if cut: yield from io.BytesIO(block[:cut])
+        pending = block[cut:]
+    if pending: yield pending
+
+
+class BlockStream(io.RawIOBase):
+    """将数据块迭代器包装为只读的二进制流 (供 gzip 等解压模块读取)"""
+
+    def __init__(self, blocks: Iterator[bytes]):
+        self._blocks = blocks
+        self._buffer = memoryview(b'')
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._buffer:
+            block = next(self._blocks, None)
+            if block is None: return 0
+            self._buffer = memoryview(block)
+        size = min(len(buffer), len(self._buffer))
+        buffer[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
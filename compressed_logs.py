@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+压缩日志读取
+轮转后压缩的 general log (.gz / .zst) 直接在 SFTP 文件流上边读边解压，网络传输量与压缩后的大小相当。
+压缩文件的检查点: byte_offset 为压缩文件中已处理的字节数 (处理完成时等于文件大小，否则为 0)，
+decompressed_offset 为解压后数据流中已写入部分的位置，中断后重新读取时跳过这部分内容。
+"""
+import gzip
+import io
+import logging
+import re
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:  # 未安装 zstandard 时跳过 .zst 文件
+    zstandard = None
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 轮转后压缩的日志文件名，例如 general.log.1.gz、general.log-20240101.zst
+_COMPRESSED_LOG_NAME = re.compile(r'\.log(?:[.-][^/]*)?\.(gz|zst)$', re.IGNORECASE)
+
+
+def log_file_compression(filename: str) -> Optional[str]:
+    """返回压缩日志文件的压缩格式 ('gz' 或 'zst')，不是压缩日志时返回 None"""
+    match = _COMPRESSED_LOG_NAME.search(filename)
+    return match.group(1).lower() if match else None
+
+
+def is_log_file(filename: str) -> bool:
+    """是否为需要扫描的日志文件: .log 或可读取的压缩日志"""
+    if filename.lower().endswith('.log'):
+        return True
+    compression = log_file_compression(filename)
+    if compression == 'zst' and zstandard is None:
+        logger.warning(f"未安装 zstandard，跳过 {filename}")
+        return False
+    return compression is not None
+
+
+class CountingReader(io.RawIOBase):
+    """包装压缩文件流，统计读取的压缩字节数 (用于扫描进度)"""
+
+    def __init__(self, raw, progress=None):
+        self.raw = raw
+        self.progress = progress
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        buffer[:len(data)] = data
+        self.bytes_read += len(data)
+        if data and self.progress is not None: self.progress.add_bytes(len(data))
+        return len(data)
+
+
+def open_decompressed(raw, compression: str, buffer_size: int = 256 * 1024):
+    """在压缩文件流上打开解压后的二进制流，可按行迭代"""
+    if compression == 'gz':
+        return gzip.GzipFile(fileobj=io.BufferedReader(raw, buffer_size), mode='rb')
+    if compression == 'zst':
+        if zstandard is None: raise RuntimeError("读取 .zst 文件需要安装 zstandard")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_size=buffer_size, read_across_frames=True)
+        return io.BufferedReader(reader, buffer_size)
+    raise ValueError(f"不支持的压缩格式: {compression}")
+
+
+def skip_bytes(stream, count: int, chunk_size: int = 1024 * 1024) -> int:
+    """从流中读取并丢弃 count 字节，返回实际跳过的字节数 (流提前结束时小于 count)"""
+    skipped = 0
+    while skipped < count:
+        data = stream.read(min(chunk_size, count - skipped))
+        if not data: break
+        skipped += len(data)
+    return skipped
@@ -14,7 +14,7 @@ DB_CONFIG = {
 
 # 应用配置（作为默认值和参考）
 APP_CONFIG = {
-    'default_days': 3,  # 默认显示最近3天的数据
+    'default_days': 7,  # 仪表盘默认显示最近7天的数据 (同时是启动后定期预热统计缓存的范围)
     
     # 默认风险操作定义
     'RISK_OPERATIONS': {
@@ -34,5 +34,77 @@ APP_CONFIG = {
     },
     
     # 默认写入风险级别
-    'WRITE_RISK_LEVELS': ['High', 'Medium']
+    'WRITE_RISK_LEVELS': ['High', 'Medium'],
+    # 各风险等级的存储方式 (仅对写入风险级别中的等级生效): full 逐条写入 user_activities，
+    # aggregate 只按 SQL 指纹、用户、小时汇总到 sql_digest_summary (次数、样例语句、首次/最后出现时间)；
+    # 默认全部逐条写入，需要时通过 PUT /api/risk_level_storage 为某个等级开启 aggregate
+    'RISK_LEVEL_STORAGE': {'High': 'full', 'Medium': 'full', 'Low': 'full'},
+
+    # 扫描全部服务器时是否并行执行，以及并行线程池大小
+    'SCAN_PARALLEL': True,
+    'SCAN_MAX_WORKERS': 4,
+    # SFTP 读操作超时 (秒)，防止单台主机卡住时扫描无限期阻塞
+    'SFTP_IO_TIMEOUT': 120,
+    # SFTP 按块读取的块大小，每块拆分为多个并发读请求
+    'SFTP_READ_BLOCK_SIZE': 4 * 1024 * 1024,
+
+    # 后台扫描任务: 同时执行的任务数，以及内存中保留的任务记录数
+    'SCAN_JOB_WORKERS': 2,
+    'SCAN_JOB_HISTORY': 50,
+
+    # 导入流水线: 阶段间队列长度 (块/批次数)，以及读取阶段每块的行数
+    'PIPELINE_QUEUE_SIZE': 8,
+    'PIPELINE_CHUNK_LINES': 1000,
+    # 线程会话 (线程与用户的对应关系) 在多次扫描之间保存的最长时间 (秒)，超过该时间未出现且未记录 Quit 的会话被丢弃
+    'SESSION_STATE_TTL': 7 * 24 * 3600,
+    # 远程预过滤: 在日志主机上用 awk 丢弃不可能被写入的 Query 行后再传输 (见 remote_filter)
+    'REMOTE_FILTER_ENABLED': False,
+
+    # 批量写入方式: executemany / multi_values / load_data，可在每次扫描时单独指定
+    'WRITER_MODE': 'executemany',
+    # SQL 语句去重: 长度不小于 SQL_TEXT_DEDUP_MIN_LENGTH 的语句只在 sql_texts 中存储一份，user_activities 中保存其哈希；
+    # SQL_TEXT_CACHE_SIZE 为进程内记录最近写入过的语句哈希的数量 (命中时直接引用，不访问 sql_texts)；
+    # SQL_TEXT_CACHE_TTL 为其过期秒数，执行保留期清理的进程会立即清空，其他写入进程 (如 backfill) 的缓存最迟在此之后失效
+    'SQL_TEXT_DEDUP_ENABLED': True,
+    'SQL_TEXT_DEDUP_MIN_LENGTH': 64,
+    'SQL_TEXT_CACHE_SIZE': 100000,
+    'SQL_TEXT_CACHE_TTL': 3600,
+    # 维度表: 明细中的用户名、客户端主机、数据库名以 dim_users / dim_hosts / dim_databases 中的整数 ID 保存，
+    # DIMENSION_CACHE_SIZE 为进程内每个维度缓存的名称数
+    'DIMENSION_KEYS_ENABLED': True,
+    'DIMENSION_CACHE_SIZE': 100000,
+    # multi_values 方式单条 INSERT 语句的最大字节数 (同时受服务器 max_allowed_packet 限制)
+    'MULTI_VALUES_MAX_BYTES': 16 * 1024 * 1024,
+    # 是否允许 LOAD DATA LOCAL INFILE (load_data 方式需要，服务器也需开启 local_infile)
+    'DB_LOCAL_INFILE': False,
+
+    # user_activities 按 timestamp 分区: None (不分区)、'day' 或 'month'。开启后 init_db 将未分区的表转换为分区表 (需要重建整张表)，
+    # 后台任务每 ACTIVITY_PARTITION_CHECK_INTERVAL 秒预建 ACTIVITY_PARTITION_AHEAD 个未来分区，并删除超过保留期的分区
+    'ACTIVITY_PARTITION_INTERVAL': None,
+    'ACTIVITY_PARTITION_AHEAD': 3,
+    'ACTIVITY_PARTITION_CHECK_INTERVAL': 3600,
+    # 操作记录保留天数 (None 表示不删除，仅对分区表生效)；系统设置 ACTIVITY_RETENTION_DAYS 优先
+    'ACTIVITY_RETENTION_DAYS': None,
+
+    # 统计和报表的整点小时部分是否从 activity_rollup_hourly 预聚合表读取
+    'USE_ACTIVITY_ROLLUP': True,
+
+    # 统计结果 (/api/stats 和报表) 按 (服务器, 开始时间, 结束时间) 缓存的条目数，以及包含今天的范围、已结束的范围的缓存时间 (秒)；
+    # 本进程写入记录时按服务器和时间范围立即失效，其他进程 (其他 Web 进程、backfill.py) 的写入在缓存过期后生效
+    'STATS_CACHE_SIZE': 256,
+    'STATS_CACHE_TTL': 300,
+    'STATS_CACHE_CLOSED_TTL': 3600,
+
+    # 操作记录列表的精确总数按筛选条件缓存的时间 (秒)
+    'ACTIVITY_COUNT_CACHE_TTL': 60,
+
+    # 导出: CSV/JSONL 流式导出每块的行数，Excel 导出的最大行数
+    'EXPORT_CHUNK_ROWS': 1000,
+    'EXPORT_EXCEL_MAX_ROWS': 100000,
+
+    # 数据库连接池 (models 与 SQLAlchemy 共用)
+    'DB_POOL_MAX_SIZE': 10,              # 最大连接数
+    'DB_POOL_TIMEOUT': 30,               # 连接用尽时的最长等待时间 (秒)
+    'DB_POOL_MAX_IDLE_TIME': 300,        # 空闲超过该时间的连接被关闭 (秒)
+    'DB_POOL_HEALTH_CHECK_INTERVAL': 30  # 连接空闲超过该时间后，取出前先 ping (秒)
 }
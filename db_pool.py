@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+数据库连接池
+models.py 中的函数和 reports.py 使用的 SQLAlchemy 引擎共用同一个连接池，
+连接总数受 DB_POOL_MAX_SIZE 限制。连接在归还时回滚未提交的事务，
+空闲超过一定时间后在取出前做健康检查 (ping)，空闲过久的连接会被关闭。
+"""
+import logging
+import os
+import threading
+import time
+from typing import Dict, Any, Optional, Callable
+import pymysql
+from config import DB_CONFIG, APP_CONFIG
+from metrics import record_db_query
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """在等待时间内没有可用的连接"""
+
+
+class PooledConnection:
+    """
+    连接池中连接的代理对象，其余属性和方法直接转发给底层 pymysql 连接。
+    close() 不会真正关闭连接，而是将其归还连接池；cursor() 默认使用取出连接时指定的游标类型。
+    """
+    __slots__ = ('_pool', '_conn', '_cursorclass')
+
+    def __init__(self, pool: 'ConnectionPool', conn, cursorclass):
+        self._pool = pool
+        self._conn = conn
+        self._cursorclass = cursorclass
+
+    def cursor(self, cursor=None):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError("连接已归还连接池")
+        return self._conn.cursor(cursor or self._cursorclass)
+
+    def close(self):
+        """归还连接，重复调用无副作用"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._release(conn)
+
+    def discard(self):
+        """直接关闭底层连接而不归还 (例如未读完的流式查询被中断时，避免读完剩余结果)"""
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool._discard(conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise pymysql.err.InterfaceError("连接已归还连接池")
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __del__(self):
+        # 调用方忘记 close() 时，避免连接名额永久丢失
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    线程安全的连接池。
+    - max_size: 同时存在 (使用中 + 空闲) 的最大连接数，连接用尽时调用方最多等待 timeout 秒
+    - max_idle_time: 空闲连接超过该时间即被关闭
+    - health_check_interval: 连接空闲超过该时间后，取出前先 ping 确认可用
+    空闲连接按后进先出复用，使不常用的连接自然老化并被回收。
+    """
+
+    def __init__(self, connect: Callable[[], Any], max_size: int = 10, timeout: float = 30.0,
+                 max_idle_time: float = 300.0, health_check_interval: float = 30.0):
+        self._connect = connect
+        self.max_size = max(1, int(max_size))
+        self.timeout = timeout
+        self.max_idle_time = max_idle_time
+        self.health_check_interval = health_check_interval
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = []  # [(conn, 归还时间)]，末尾为最近归还的连接
+        self._size = 0  # 已创建且未关闭的连接数
+        self._pid = os.getpid()
+        # 统计信息
+        self._acquired = 0
+        self._created = 0
+        self._closed = 0
+        self._evicted = 0
+        self._health_check_failures = 0
+        self._waits = 0
+        self._wait_time_total = 0.0
+        self._wait_time_max = 0.0
+        self._timeouts = 0
+
+    def _check_pid(self):
+        """fork 出的子进程不能复用父进程的连接，丢弃继承来的连接记录"""
+        if self._pid != os.getpid():
+            self._cond = threading.Condition(threading.Lock())
+            self._idle = []
+            self._size = 0
+            self._pid = os.getpid()
+
+    def _close_raw(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle_locked(self, now: float):
+        """关闭空闲过久的连接 (调用方需持有锁)，返回需要关闭的连接列表"""
+        expired = []
+        if self.max_idle_time and self._idle:
+            while self._idle and now - self._idle[0][1] > self.max_idle_time:
+                expired.append(self._idle.pop(0)[0])
+        if expired:
+            self._size -= len(expired)
+            self._evicted += len(expired)
+            self._closed += len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def acquire(self, timeout: Optional[float] = None, cursorclass=pymysql.cursors.DictCursor) -> PooledConnection:
+        """取出一个连接；连接池已满时等待其他线程归还，超时抛出 PoolTimeout"""
+        self._check_pid()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        waited_from = None
+        while True:
+            conn = None
+            create = False
+            with self._cond:
+                now = time.monotonic()
+                expired = self._evict_idle_locked(now)
+                while not self._idle and self._size >= self.max_size:
+                    if waited_from is None:
+                        waited_from = now
+                        self._waits += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        self._record_wait_locked(waited_from)
+                        raise PoolTimeout(f"等待数据库连接超时 ({timeout} 秒)，连接池大小 {self.max_size}")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                else:
+                    self._size += 1
+                    create = True
+                if waited_from is not None:
+                    self._record_wait_locked(waited_from)
+                    waited_from = None
+            for expired_conn in expired:
+                self._close_raw(expired_conn)
+
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    self._discard(conn=None)
+                    raise
+                with self._cond:
+                    self._created += 1
+            elif self.health_check_interval is not None and time.monotonic() - idle_since > self.health_check_interval:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception as e:
+                    logger.warning(f"连接池中的连接健康检查失败，将重新获取: {e}")
+                    with self._cond:
+                        self._health_check_failures += 1
+                    self._discard(conn)
+                    continue
+            with self._cond:
+                self._acquired += 1
+            return PooledConnection(self, conn, cursorclass)
+
+    def _record_wait_locked(self, waited_from: float):
+        waited = time.monotonic() - waited_from
+        self._wait_time_total += waited
+        self._wait_time_max = max(self._wait_time_max, waited)
+
+    def _discard(self, conn):
+        """关闭连接并释放其名额"""
+        if conn is not None:
+            self._close_raw(conn)
+        with self._cond:
+            self._size -= 1
+            if conn is not None:
+                self._closed += 1
+            self._cond.notify()
+
+    def _release(self, conn):
+        """归还连接：回滚未提交的事务，失败则直接关闭"""
+        if self._pid != os.getpid():
+            return  # 父进程的连接，不放回子进程的连接池
+        try:
+            if not conn.open:
+                raise pymysql.err.InterfaceError("连接已关闭")
+            conn.rollback()
+        except Exception as e:
+            logger.debug(f"归还连接时回滚失败，关闭该连接: {e}")
+            self._discard(conn)
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def dispose(self):
+        """关闭全部空闲连接 (使用中的连接归还后仍会放回连接池)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._closed += len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_raw(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回连接池状态和等待统计"""
+        with self._cond:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'acquired_total': self._acquired,
+                'created_total': self._created,
+                'closed_total': self._closed,
+                'evicted_total': self._evicted,
+                'health_check_failures': self._health_check_failures,
+                'waits_total': self._waits,
+                'wait_timeouts': self._timeouts,
+                'wait_seconds_total': round(self._wait_time_total, 3),
+                'wait_seconds_max': round(self._wait_time_max, 3)
+            }
+
+
+class _TimedConnection(pymysql.connections.Connection):
+    """记录每条语句的执行耗时 (见 metrics)；流式查询 (unbuffered) 只计入发送语句和读取结果头的时间"""
+
+    def query(self, sql, unbuffered=False):
+        started = time.perf_counter()
+        try:
+            return super().query(sql, unbuffered)
+        finally:
+            record_db_query(time.perf_counter() - started)
+
+
+def _connect_mysql():
+    """创建一个新的 pymysql 连接 (游标类型由取出连接时决定)"""
+    return _TimedConnection(
+        host=DB_CONFIG['host'],
+        port=DB_CONFIG['port'],
+        user=DB_CONFIG['user'],
+        password=DB_CONFIG['password'],
+        database=DB_CONFIG['database'],
+        charset='utf8mb4',
+        local_infile=APP_CONFIG.get('DB_LOCAL_INFILE', False)  # load_data 写入方式需要
+    )
+
+
+# 全局连接池
+db_pool = ConnectionPool(
+    _connect_mysql,
+    max_size=APP_CONFIG.get('DB_POOL_MAX_SIZE', 10),
+    timeout=APP_CONFIG.get('DB_POOL_TIMEOUT', 30),
+    max_idle_time=APP_CONFIG.get('DB_POOL_MAX_IDLE_TIME', 300),
+    health_check_interval=APP_CONFIG.get('DB_POOL_HEALTH_CHECK_INTERVAL', 30)
+)
+
+
+def sqlalchemy_engine_options() -> Dict[str, Any]:
+    """
+    SQLAlchemy 引擎参数：通过 creator 从全局连接池取连接，并使用 NullPool，
+    SQLAlchemy 自身不再缓存连接，会话结束时连接直接归还全局连接池，两者共用同一个连接数上限。
+    """
+    from sqlalchemy.pool import NullPool
+    return {
+        'creator': lambda: db_pool.acquire(cursorclass=pymysql.cursors.Cursor),
+        'poolclass': NullPool
+    }
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+日志导入流水线
+将单个日志文件的导入拆分为三个并发阶段，阶段之间通过有界队列连接：
+  读取 (独立线程): 从文件对象按行读取，成块放入行队列
+  解析 (调用线程): 解析、分类并过滤记录，攒满一批后放入批次队列
+  写入 (独立线程): 将批次写入数据库
+队列满时上游阶段阻塞等待 (背压)，内存占用有上限。任一阶段出错时，已解析的记录仍会写完，
+并报告已成功写入部分对应的文件偏移，调用方据此保存检查点 (解析阶段出错时同样如此)。
+"""
+import logging
+import queue
+import threading
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 队列结束标记
+_DONE = object()
+
+
+class PipelineError(Exception):
+    """
+    流水线某个阶段失败。
+    committed_offset/committed_timestamp 为已成功写入部分对应的文件位置，added 为失败前已写入的记录数。
+    """
+
+    def __init__(self, message: str, committed_offset: int, committed_timestamp: Optional[str] = None, added: int = 0):
+        super().__init__(message)
+        self.committed_offset = committed_offset
+        self.committed_timestamp = committed_timestamp
+        self.added = added
+
+
+class IngestPipeline:
+    """
+    读取 -> 解析 -> 写入 三阶段流水线。
+    - parse(lines, read_state): 解析行迭代器并产出记录的生成器，需在 read_state 中维护 'offset' 和 'last_timestamp'
+    - accept(record): 返回记录是否需要写入
+    - write_batch(records): 写入一批记录，返回是否成功
+    """
+
+    def __init__(self, parse: Callable[[Iterable[bytes], Dict[str, Any]], Iterator[Dict[str, Any]]],
+                 accept: Callable[[Dict[str, Any]], bool], write_batch: Callable[[List[Dict[str, Any]]], bool],
+                 batch_size: int = 500, queue_size: int = 8, chunk_lines: int = 1000, progress=None, name: str = ''):
+        self.parse = parse
+        self.accept = accept
+        self.write_batch = write_batch
+        self.batch_size = max(1, batch_size)
+        self.queue_size = max(1, queue_size)
+        self.chunk_lines = max(1, chunk_lines)
+        self.progress = progress
+        self.name = name
+
+    @staticmethod
+    def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+        """放入队列，队列满时等待；流水线已停止则放弃并返回 False"""
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self, file_obj: Iterable[bytes], start_offset: int = 0) -> Dict[str, Any]:
+        """
+        导入一个已定位到 start_offset 的文件对象，返回统计信息:
+        offset (解析完成的位置)、last_timestamp、processed (解析出的记录数)、added (写入的记录数)。
+        任一阶段 (包括调用线程中的解析、accept) 失败时抛出 PipelineError。
+        """
+        stop = threading.Event()
+        line_queue = queue.Queue(maxsize=self.queue_size)
+        batch_queue = queue.Queue(maxsize=self.queue_size)
+        state = {'reader_error': None, 'parse_error': None, 'writer_error': None, 'added': 0,
+                 'committed_offset': start_offset, 'committed_timestamp': None}
+
+        def reader():
+            chunk = []
+            try:
+                for line in file_obj:
+                    chunk.append(line)
+                    if len(chunk) >= self.chunk_lines:
+                        if not self._put(line_queue, chunk, stop): return
+                        chunk = []
+            except Exception as e:
+                logger.error(f"{self.name} 读取阶段出错: {e}")
+                state['reader_error'] = e
+            finally:
+                # 出错前已读到的行仍交给解析阶段处理
+                if not chunk or self._put(line_queue, chunk, stop):
+                    self._put(line_queue, _DONE, stop)
+
+        def writer():
+            while True:
+                item = batch_queue.get()
+                if item is _DONE: return
+                batch, offset, last_timestamp = item
+                if state['writer_error'] is not None: continue  # 写入已失败，只消费队列，避免解析阶段阻塞
+                try:
+                    if batch and not self.write_batch(batch): raise RuntimeError(f"写入 {len(batch)} 条记录失败")
+                except Exception as e:
+                    logger.error(f"{self.name} 写入阶段出错: {e}")
+                    state['writer_error'] = e
+                    stop.set()  # 通知读取和解析阶段停止
+                    continue
+                state['added'] += len(batch)
+                state['committed_offset'] = offset
+                if last_timestamp: state['committed_timestamp'] = last_timestamp
+                if batch and self.progress is not None: self.progress.add_rows(len(batch))
+
+        def lines() -> Iterator[bytes]:
+            while not stop.is_set():
+                try:
+                    chunk = line_queue.get(timeout=0.5)
+                except queue.Empty:
+                    continue  # 读取阶段可能已因流水线停止而放弃放入结束标记，需重新检查 stop
+                if chunk is _DONE: return
+                yield from chunk
+
+        reader_thread = threading.Thread(target=reader, name=f'ingest-reader-{self.name}', daemon=True)
+        writer_thread = threading.Thread(target=writer, name=f'ingest-writer-{self.name}', daemon=True)
+        reader_thread.start(); writer_thread.start()
+
+        read_state = {'offset': start_offset, 'last_timestamp': None}
+        processed = 0
+        batch = []
+        try:
+            for record in self.parse(lines(), read_state):
+                processed += 1
+                if not self.accept(record): continue
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    if not self._put(batch_queue, (batch, read_state['offset'], read_state['last_timestamp']), stop): break
+                    batch = []
+            else:
+                # 最后一批 (可能为空，仍用于推进已提交的偏移)
+                self._put(batch_queue, (batch, read_state['offset'], read_state['last_timestamp']), stop)
+        except Exception as e:
+            # 尚未放入队列的记录不写入，已放入的批次照常写完，已提交的偏移停在最后写入的批次
+            logger.error(f"{self.name} 解析阶段出错: {e}")
+            state['parse_error'] = e
+            stop.set()
+        finally:
+            batch_queue.put(_DONE)  # 写入线程始终在消费，不会永久阻塞
+            writer_thread.join()
+            stop.set()
+            # 清空行队列，让可能阻塞在 put 上的读取线程退出
+            while reader_thread.is_alive():
+                try: line_queue.get(timeout=0.1)
+                except queue.Empty: pass
+            reader_thread.join()
+
+        error = state['reader_error'] or state['parse_error'] or state['writer_error']
+        if error is not None:
+            stage = '读取' if state['reader_error'] is not None else '解析' if state['parse_error'] is not None else '写入'
+            raise PipelineError(f"{stage}阶段失败: {error}", state['committed_offset'], state['committed_timestamp'], state['added'])
+        return {'offset': read_state['offset'], 'last_timestamp': read_state['last_timestamp'],
+                'processed': processed, 'added': state['added']}
@@ -7,11 +7,29 @@ import logging
 from datetime import datetime, timezone, timedelta # 引入 timedelta
 import pytz # 确保 pytz 用于时区处理
 import posixpath # 用于处理远程路径
-from typing import List, Dict, Any, Optional, Generator
+import shlex # 用于拼接远程命令参数
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed # 用于并发扫描多台服务器
+from typing import List, Dict, Any, Optional, Generator, Iterable
 # 从 config 导入APP_CONFIG
 from config import APP_CONFIG
 # 从 models 导入需要的函数
-from models import add_user_activities_batch, get_last_scan_time, update_last_scan_time, get_all_servers, get_server_full_config, get_system_setting
+from models import (
+    add_user_activities_batch, get_last_scan_time, update_last_scan_time, get_all_servers, get_server_full_config, get_system_setting,
+    get_file_checkpoints, update_file_checkpoint, delete_stale_file_checkpoints, get_thread_sessions, save_thread_sessions, get_risk_level_storage
+)
+# 从 ingest_pipeline 导入读取/解析/写入流水线
+from ingest_pipeline import IngestPipeline, PipelineError
+# 从 risk_rules 导入编译后的风险规则匹配器
+from risk_rules import get_risk_matcher, refresh_risk_rules, get_risk_rules
+# 从 block_reader 导入按块读取和字节级分行
+from block_reader import iter_blocks, iter_lines, BlockStream
+# 从 compressed_logs 导入压缩日志的读取函数
+from compressed_logs import is_log_file, log_file_compression, open_decompressed, skip_bytes, CountingReader
+# 从 remote_filter 导入远程预过滤
+from remote_filter import build_filter_program, build_remote_command, remote_filter_available, RemoteFilteredSource
+# 从 metrics 导入扫描相关的指标
+from metrics import SFTP_BYTES_READ, REMOTE_FILTER_BYTES, LINES_PARSED, LINES_MATCHED, ROWS_FILTERED, SCAN_DURATION
 
 # 配置日志记录器
 logger = logging.getLogger(__name__)
@@ -20,138 +38,266 @@ logger = logging.getLogger(__name__)
 BATCH_INSERT_SIZE = 500 # 定义批量插入的大小
 
 # --- 正则表达式模式 ---
-pattern_new = re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z)\t *(\d+)\s+(Query|Connect|Init DB|Quit|Prepare|Execute|Close stmt|Change user|Field List)\t(.*)')
+# 直接匹配原始字节行 (行首空白由 \s* 跳过)，只有匹配成功的行才解码参数部分
+pattern_new = re.compile(rb'\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z)\t *(\d+)\s+(Query|Connect|Init DB|Quit|Prepare|Execute|Close stmt|Change user|Field List)\t(.*)')
 connect_pattern = re.compile(r'([^@]+)@([^ ]+)(?: on (\S*))?')
 
+# Query 语句的操作类型及其 SQL 前缀，按顺序匹配 (远程预过滤也据此生成过滤条件，见 remote_filter)
+OPERATION_TYPE_PREFIXES = (
+    ('SELECT', ('SELECT', 'SHOW', 'DESC', 'EXPLAIN')),
+    ('INSERT', ('INSERT', 'REPLACE')),
+    ('UPDATE', ('UPDATE',)),
+    ('DELETE', ('DELETE',)),
+    ('DDL', ('CREATE', 'ALTER', 'DROP', 'TRUNCATE')),
+    ('DCL', ('GRANT', 'REVOKE', 'SET PASSWORD')),
+    ('TCL', ('COMMIT', 'ROLLBACK', 'START TRANSACTION', 'SAVEPOINT')),
+    ('USE_DB', ('USE ',)),
+)
+
 # --- 辅助函数 ---
 def determine_operation_type(sql):
     """根据 SQL 语句判断操作类型"""
     sql_upper = sql.strip().upper()
-    if sql_upper.startswith(('SELECT', 'SHOW', 'DESC', 'EXPLAIN')): return 'SELECT'
-    elif sql_upper.startswith(('INSERT', 'REPLACE')): return 'INSERT'
-    elif sql_upper.startswith('UPDATE'): return 'UPDATE'
-    elif sql_upper.startswith('DELETE'): return 'DELETE'
-    elif sql_upper.startswith(('CREATE', 'ALTER', 'DROP', 'TRUNCATE')): return 'DDL'
-    elif sql_upper.startswith(('GRANT', 'REVOKE', 'SET PASSWORD')): return 'DCL'
-    elif sql_upper.startswith(('COMMIT', 'ROLLBACK', 'START TRANSACTION', 'SAVEPOINT')): return 'TCL'
-    elif sql_upper.startswith('USE '): return 'USE_DB'
+    for operation_type, prefixes in OPERATION_TYPE_PREFIXES:
+        if sql_upper.startswith(prefixes): return operation_type
     return 'OTHER'
 
 def determine_risk_level(operation_type, argument):
-    """根据配置 (结构化 RISK_OPERATIONS) 判断操作的风险等级"""
-    risk_definitions = APP_CONFIG.get('RISK_OPERATIONS', {})
-    argument_lower = argument.lower()
-    # 优先检查 High risk
-    for rule in risk_definitions.get('High', []):
-        rule_type = rule.get('type', '').upper()
-        rule_keyword = rule.get('keyword', '').lower()
-        type_match = (not rule_type or operation_type.upper() == rule_type)
-        keyword_match = (not rule_keyword or rule_keyword in argument_lower)
-        if type_match and keyword_match: return 'High'
-    # 检查 Medium risk
-    for rule in risk_definitions.get('Medium', []):
-        rule_type = rule.get('type', '').upper()
-        rule_keyword = rule.get('keyword', '').lower()
-        type_match = (not rule_type or operation_type.upper() == rule_type)
-        keyword_match = (not rule_keyword or rule_keyword in argument_lower)
-        if type_match and keyword_match: return 'Medium'
-    # 检查 Low risk
-    for rule in risk_definitions.get('Low', []):
-        rule_type = rule.get('type', '').upper()
-        rule_keyword = rule.get('keyword', '').lower()
-        type_match = (not rule_type or operation_type.upper() == rule_type)
-        keyword_match = (not rule_keyword or rule_keyword in argument_lower)
-        if type_match and keyword_match: return 'Low'
-    # 默认 Low
-    return 'Low'
+    """根据当前生效的风险规则 (编译后的 RISK_OPERATIONS，见 risk_rules) 判断操作的风险等级"""
+    return get_risk_matcher().classify(operation_type, argument)
+
+# 最近一次解析的秒级前缀及其 datetime；相邻日志行几乎总在同一秒内，只需替换微秒
+_timestamp_cache = ('', None)
+
+def parse_log_timestamp_fast(timestamp_str: str) -> datetime:
+    """
+    解析 general log 的时间戳 (YYYY-MM-DDTHH:MM:SS.ffffffZ，格式已由 pattern_new 保证) 为带 UTC 时区的 datetime，
+    结果与 strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S.%fZ') 相同，格式或日期无效时抛出 ValueError。
+    """
+    global _timestamp_cache
+    prefix = timestamp_str[:19]
+    cached_prefix, base = _timestamp_cache
+    if prefix != cached_prefix:
+        base = datetime(int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]), int(prefix[11:13]), int(prefix[14:16]), int(prefix[17:19]), tzinfo=timezone.utc)
+        _timestamp_cache = (prefix, base)  # 整体替换元组，多线程并发解析时不会读到不一致的前缀和值
+    fraction = timestamp_str[20:-1]
+    if not 0 < len(fraction) <= 6: raise ValueError(f"无效的微秒部分: {timestamp_str}")
+    return base.replace(microsecond=int(fraction) * 10 ** (6 - len(fraction)))
+
+def format_log_timestamp(dt: datetime) -> str:
+    """将 datetime 转换为 general log 的时间戳格式 (UTC，6 位微秒)，用于与日志中的时间戳字符串直接比较"""
+    if dt.tzinfo is not None: dt = dt.astimezone(timezone.utc)
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
 
 def create_activity_entry(server_id, timestamp_str, user_name, client_host, db_name, thread_id, command, argument):
     """创建一个代表用户活动日志条目的字典"""
     try:
-        timestamp_dt = datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+        timestamp_dt = parse_log_timestamp_fast(timestamp_str)
         operation_type = determine_operation_type(argument) if command == 'Query' else command.upper()
         risk_level = determine_risk_level(operation_type, argument)
         return {'server_id': server_id, 'timestamp': timestamp_dt, 'user_name': user_name, 'client_host': client_host, 'db_name': db_name, 'thread_id': thread_id, 'command_type': command, 'operation_type': operation_type, 'argument': argument, 'risk_level': risk_level }
     except ValueError as e: logger.error(f"解析时间戳错误 '{timestamp_str}': {e}"); return None
     except Exception as e: logger.error(f"为线程 {thread_id} 创建活动条目时出错: {e}"); return None
 
+def _parse_log_timestamp(timestamp_str: Optional[str]) -> Optional[datetime]:
+    """将日志中的时间戳字符串转换为带 UTC 时区的 datetime，无法解析时返回 None"""
+    if not timestamp_str: return None
+    try: return parse_log_timestamp_fast(timestamp_str)
+    except ValueError: return None
+
 # --- 核心解析逻辑 ---
-def parse_general_log_stream(sftp_file: paramiko.SFTPFile, server_id: int) -> Generator[Dict[str, Any], None, None]:
-    """ 流式解析打开的 SFTP general log 文件。 """
-    thread_user_map = {}
+def parse_general_log_stream(line_source: Iterable[bytes], server_id: int, read_state: Optional[Dict[str, Any]] = None, progress=None,
+                             min_timestamp: Optional[datetime] = None, thread_user_map: Optional[Dict[int, Dict[str, Any]]] = None) -> Generator[Dict[str, Any], None, None]:
+    """
+    流式解析 general log 的行 (bytes，保留换行符；通常由 block_reader.iter_lines 按块读取后切分)。
+    行头直接在字节上匹配，只有匹配成功的行才解码参数部分。
+    行迭代器中的整数表示远程预过滤丢弃的字节数 (见 remote_filter)，只计入偏移。
+    如果传入 read_state，则在其中维护 'offset' (已完整读取的字节偏移，从调用方给定的初始值累加)
+    和 'last_timestamp' (最后一条匹配行的时间戳字符串)，供调用方保存文件检查点；结束时在 'lines' 中累加本次处理的行数。
+    文件末尾没有换行符的行可能仍在写入中，不会被解析，也不计入偏移。
+    处理过程中出错时记录日志后重新抛出异常 (由导入流水线报告为解析阶段失败，按已写入的位置保存检查点)。
+    如果传入 progress (见 scan_jobs.ScanProgress)，则定期上报已读取的字节数和行数。
+    如果传入 min_timestamp，时间戳不晚于它的操作不产出活动记录：直接比较时间戳字符串，不构造 datetime
+    (Connect、Init DB 等行仍会更新线程与用户、数据库的对应关系)。
+    如果传入 thread_user_map (线程 ID -> {'user', 'host', 'db', 'last_seen'}，例如上次扫描保存的会话)，则在其基础上解析并原地更新，
+    从文件中间续读时仍能确定 Connect 行在此之前的线程所属用户。
+    """
+    if thread_user_map is None: thread_user_map = {}
     line_count = 0
     parsed_count = 0
+    # 日志时间戳为定长格式 (6 位微秒)，字符串顺序与时间顺序一致
+    min_timestamp_str = format_log_timestamp(min_timestamp) if min_timestamp is not None else None; stale_count = 0
+    bytes_count = 0; reported_lines = 0; reported_bytes = 0
+    # 指标按 10000 行批量累加，不在每行更新
+    matched_count = 0; metric_lines = 0; metric_matched = 0; server_label = str(server_id)
+    if read_state is not None: read_state.setdefault('offset', 0); read_state.setdefault('last_timestamp', None)
     try:
-        for line_bytes in sftp_file:
-            line_count += 1
-            try: line = line_bytes.decode('utf-8', errors='ignore').strip()
-            except UnicodeDecodeError: logger.warning(f"解码第 {line_count} 行时出错，已跳过。"); continue
-            if not line: continue
-            match = pattern_new.match(line)
+        for line_bytes in line_source:
+            if line_bytes.__class__ is int:
+                bytes_count += line_bytes
+                if read_state is not None: read_state['offset'] += line_bytes
+                continue
+            if not line_bytes.endswith(b'\n'): logger.info(f"跳过文件末尾未完整写入的行 ({len(line_bytes)} 字节)，下次扫描时重新读取。"); break
+            line_count += 1; bytes_count += len(line_bytes)
+            if read_state is not None: read_state['offset'] += len(line_bytes)
+            match = pattern_new.match(line_bytes)
             if not match: continue
-            timestamp_str, thread_id_str, command, argument = match.groups()
-            thread_id = int(thread_id_str); argument = argument.strip(); activity = None
+            matched_count += 1
+            timestamp_bytes, thread_id_bytes, command_bytes, argument_bytes = match.groups()
+            timestamp_str = timestamp_bytes.decode('ascii'); command = command_bytes.decode('ascii')
+            thread_id = int(thread_id_bytes); argument = argument_bytes.decode('utf-8', errors='ignore').strip(); activity = None
+            if read_state is not None: read_state['last_timestamp'] = timestamp_str
             # --- 处理命令类型 ---
             if command == 'Connect':
                 user = 'unknown'; host = 'unknown'; db_name = None
                 connect_match = connect_pattern.match(argument)
                 if connect_match: user = connect_match.group(1).strip(); host = connect_match.group(2).strip(); db_name = connect_match.group(3).strip() if connect_match.group(3) else None
-                thread_user_map[thread_id] = {'user': user, 'host': host, 'db': db_name}; logger.info(f"L{line_count}: Connect: Thread {thread_id} -> User={user}, Host={host}")
+                thread_user_map[thread_id] = {'user': user, 'host': host, 'db': db_name, 'last_seen': timestamp_str}; logger.info(f"L{line_count}: Connect: Thread {thread_id} -> User={user}, Host={host}")
             elif command == 'Quit':
                 if thread_id in thread_user_map: logger.info(f"L{line_count}: Quit: Removing Thread {thread_id} ({thread_user_map[thread_id].get('user','?')})"); del thread_user_map[thread_id]
                 else: logger.warning(f"L{line_count}: Quit: Thread {thread_id} not in map.")
             elif command == 'Change user':
-                 user = 'unknown'; host = 'unknown'; db_name = None; connect_match = connect_pattern.match(argument);
+                 user = 'unknown'; host = 'unknown'; db_name = None; connect_match = connect_pattern.match(argument)
                  if connect_match: user = connect_match.group(1).strip(); host = connect_match.group(2).strip(); db_name = connect_match.group(3).strip() if connect_match.group(3) else None
-                 else: parts = argument.split(' as ');
-                 if len(parts) > 0: user_host_part = parts[0].strip(); fallback_match = connect_pattern.match(user_host_part);
-                 if fallback_match: user = fallback_match.group(1).strip(); host = fallback_match.group(2).strip()
+                 else:
+                     # 形如 "user@host as anotheruser" 时取 as 之前的部分
+                     fallback_match = connect_pattern.match(argument.split(' as ')[0].strip())
+                     if fallback_match: user = fallback_match.group(1).strip(); host = fallback_match.group(2).strip()
                  if thread_id in thread_user_map: logger.info(f"L{line_count}: Change User: Update Thread {thread_id} to {user}@{host}")
                  else: logger.info(f"L{line_count}: Change User: Set Thread {thread_id} to {user}@{host}")
-                 thread_user_map[thread_id] = {'user': user, 'host': host, 'db': db_name}
+                 thread_user_map[thread_id] = {'user': user, 'host': host, 'db': db_name, 'last_seen': timestamp_str}
             elif command in ['Query', 'Init DB', 'Prepare', 'Execute', 'Close stmt', 'Field List']:
                 user_info = thread_user_map.get(thread_id); user_name = 'unknown'; client_host = 'unknown'; db_name = None
                 if user_info: user_name = user_info.get('user', 'unknown'); client_host = user_info.get('host', 'unknown'); db_name = user_info.get('db');
                 if command == 'Init DB': db_name = argument;
-                if isinstance(user_info, dict): user_info['db'] = db_name
+                if isinstance(user_info, dict): user_info['db'] = db_name; user_info['last_seen'] = timestamp_str
                 else:
                     if command == 'Query': logger.warning(f"L{line_count}: User info not found for Thread {thread_id}. Cmd: {command}, Arg: {argument[:100]}...")
-                activity = create_activity_entry(server_id, timestamp_str, user_name, client_host, db_name, thread_id, command, argument)
+                if min_timestamp_str is not None and len(timestamp_str) == 27 and timestamp_str <= min_timestamp_str: stale_count += 1
+                else: activity = create_activity_entry(server_id, timestamp_str, user_name, client_host, db_name, thread_id, command, argument)
             # --- 产出结果 ---
             if activity: parsed_count += 1; yield activity
-            if line_count % 10000 == 0: logger.info(f"已处理 {line_count} 行日志...")
-    except Exception as e: logger.exception(f"处理日志流时发生错误 (约在第 {line_count} 行): {e}")
-    finally: logger.info(f"日志流处理完成，共处理 {line_count} 行，解析出 {parsed_count} 个潜在活动记录。")
+            if line_count % 10000 == 0:
+                logger.info(f"已处理 {line_count} 行日志...")
+                if progress is not None: progress.add_lines(line_count - reported_lines); progress.add_bytes(bytes_count - reported_bytes); reported_lines = line_count; reported_bytes = bytes_count
+                LINES_PARSED.inc(line_count - metric_lines, server_id=server_label); LINES_MATCHED.inc(matched_count - metric_matched, server_id=server_label); metric_lines = line_count; metric_matched = matched_count
+    except Exception as e:
+        # 不能当作正常结束: 调用方会按 read_state 中的偏移把文件记为已处理完成
+        logger.exception(f"处理日志流时发生错误 (约在第 {line_count} 行): {e}"); raise
+    finally:
+        if read_state is not None: read_state['lines'] = read_state.get('lines', 0) + line_count
+        LINES_PARSED.inc(line_count - metric_lines, server_id=server_label); LINES_MATCHED.inc(matched_count - metric_matched, server_id=server_label)
+        if stale_count: ROWS_FILTERED.inc(stale_count, server_id=server_label, reason='timestamp')
+        if progress is not None: progress.add_lines(line_count - reported_lines); progress.add_bytes(bytes_count - reported_bytes)
+        logger.info(f"日志流处理完成，共处理 {line_count} 行，解析出 {parsed_count} 个潜在活动记录" + (f"，跳过 {stale_count} 条不晚于 {min_timestamp_str} 的操作。" if stale_count else "。"))
 
 # --- SSH 和文件读取 ---
-def connect_ssh(hostname, port, username, password=None, pkey_path=None):
-    """建立 SSH 连接"""
+def connect_ssh(hostname, port, username, password=None, pkey_path=None, compress=False):
+    """建立 SSH 连接；compress 为 True 时启用 SSH 传输层压缩 (适合带宽较低的链路)"""
     client = paramiko.SSHClient(); client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     try:
-        if pkey_path: pkey = paramiko.RSAKey.from_private_key_file(pkey_path); client.connect(hostname, port=port, username=username, pkey=pkey, timeout=10); logger.info(f"SSH 已使用私钥连接到 {username}@{hostname}:{port}。")
-        elif password: client.connect(hostname, port=port, username=username, password=password, timeout=10); logger.info(f"SSH 已使用密码连接到 {username}@{hostname}:{port}。")
+        if pkey_path: pkey = paramiko.RSAKey.from_private_key_file(pkey_path); client.connect(hostname, port=port, username=username, pkey=pkey, timeout=10, compress=compress); logger.info(f"SSH 已使用私钥连接到 {username}@{hostname}:{port} (压缩: {compress})。")
+        elif password: client.connect(hostname, port=port, username=username, password=password, timeout=10, compress=compress); logger.info(f"SSH 已使用密码连接到 {username}@{hostname}:{port} (压缩: {compress})。")
         else: logger.error("SSH 连接失败：未提供密码或私钥。"); return None
         return client
     except paramiko.AuthenticationException: logger.error(f"SSH 认证失败: {username}@{hostname}:{port}。"); return None
     except Exception as e: logger.error(f"SSH 连接到 {hostname}:{port} 失败: {e}"); return None
 
+def get_remote_inodes(ssh_client, file_paths: List[str]) -> Dict[str, int]:
+    """通过远程 stat 命令获取文件 inode (SFTP 协议不提供 inode)，失败时返回空字典"""
+    if not file_paths: return {}
+    command = "stat -c '%i %n' -- " + " ".join(shlex.quote(path) for path in file_paths)
+    inodes = {}
+    try:
+        stdin, stdout, stderr = ssh_client.exec_command(command, timeout=30)
+        output = stdout.read().decode('utf-8', errors='ignore')
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status != 0: logger.warning(f"获取远程文件 inode 失败 (退出码 {exit_status}): {stderr.read().decode('utf-8', errors='ignore').strip()}")
+        for line in output.splitlines():
+            inode_str, _, path = line.partition(' ')
+            if inode_str.isdigit() and path: inodes[path] = int(inode_str)
+    except Exception as e:
+        logger.warning(f"执行远程 stat 命令获取 inode 失败，将仅根据文件大小判断轮转: {e}")
+    return inodes
+
+def resolve_start_offset(checkpoint: Optional[Dict[str, Any]], inode: Optional[int], file_size: int):
+    """根据文件检查点、当前 inode 和文件大小确定本次读取的起始字节偏移，返回 (offset, 原因)"""
+    if not checkpoint: return 0, "无检查点"
+    offset = checkpoint.get('byte_offset') or 0
+    old_inode = checkpoint.get('inode')
+    if inode is not None and old_inode is not None and inode != old_inode: return 0, f"inode 已变化 ({old_inode} -> {inode})，文件已轮转"
+    if file_size < offset: return 0, f"文件大小 {file_size} 小于检查点偏移 {offset}，文件已被截断"
+    return offset, "从检查点继续"
+
+def resolve_compressed_start(checkpoint: Optional[Dict[str, Any]], inode: Optional[int], file_size: int):
+    """
+    压缩日志只能从头解压，返回 (offset, decompressed_offset, 原因)：
+    offset 等于文件大小表示已处理完成；否则从头读取，并跳过解压后数据中已写入的 decompressed_offset 字节。
+    """
+    if not checkpoint: return 0, 0, "无检查点"
+    old_inode = checkpoint.get('inode')
+    if inode is not None and old_inode is not None and inode != old_inode: return 0, 0, f"inode 已变化 ({old_inode} -> {inode})"
+    if (checkpoint.get('byte_offset') or 0) >= file_size and checkpoint.get('file_size') == file_size: return file_size, 0, "已处理完成"
+    decompressed_offset = checkpoint.get('decompressed_offset') or 0
+    return 0, decompressed_offset, f"从解压后偏移 {decompressed_offset} 继续"
+
+def _count_sftp_bytes(blocks, server_id):
+    """逐块累加 SFTP 读取的字节数 (指标)"""
+    server_label = str(server_id)
+    for block in blocks:
+        SFTP_BYTES_READ.inc(len(block), server_id=server_label)
+        yield block
+
+class _LineOnlyProgress:
+    """压缩日志的解析进度只上报行数，字节数按读取的压缩数据统计 (见 compressed_logs.CountingReader)"""
+    def __init__(self, progress): self.progress = progress
+    def add_lines(self, count): self.progress.add_lines(count)
+    def add_bytes(self, count): pass
+
 # --- 主要扫描函数 ---
+def new_scan_result(server_config) -> Dict[str, Any]:
+    """创建单台服务器的扫描结果摘要 (status: success / failed / skipped)"""
+    config = server_config if isinstance(server_config, dict) else {}
+    return {'server_id': config.get('server_id'), 'name': config.get('name', config.get('host')), 'host': config.get('host'),
+            'status': 'failed', 'error': None, 'files_processed': 0, 'rows_added': 0, 'duration_seconds': 0.0}
+
+def _finish_scan_result(result: Dict[str, Any], status: str, error: Optional[str] = None, started: Optional[float] = None) -> Dict[str, Any]:
+    """设置扫描结果的状态、错误信息和耗时并返回结果"""
+    result['status'] = status
+    if error: result['error'] = error
+    if started is not None:
+        result['duration_seconds'] = round(time.monotonic() - started, 3)
+        SCAN_DURATION.observe(result['duration_seconds'], server_id=str(result.get('server_id')), status=status)
+    return result
 
 # !! 实现增量扫描逻辑 !!
-def scan_logs_for_server(server_config: dict):
+def scan_logs_for_server(server_config: dict, progress=None, writer_mode: Optional[str] = None) -> Dict[str, Any]:
     """
-    扫描单个服务器的日志目录，查找并处理自上次扫描以来修改过的 .log 文件，
-    根据时间戳和风险等级过滤，并批量插入数据库。
+    扫描单个服务器的日志目录，查找并处理自上次扫描以来有新增内容的 .log 文件。
+    每个文件按检查点记录的字节偏移续读，只读取追加的部分；通过 inode/文件大小的变化识别轮转或截断，
+    此时从文件头重新读取并按上次扫描时间过滤。记录再按风险等级过滤后批量插入数据库。
+    progress 为可选的进度计数器 (见 scan_jobs.ScanProgress)；writer_mode 为本次扫描的批量写入方式 (见 models.WRITER_MODES)，
+    未指定时使用 APP_CONFIG['WRITER_MODE']。返回扫描结果摘要 (见 new_scan_result)。
     """
+    started = time.monotonic(); result = new_scan_result(server_config)
     logger.debug(f"Entering scan_logs_for_server for server_config: {server_config}")
-    if not isinstance(server_config, dict): logger.error(f"无效配置类型: {type(server_config)}"); return
+    if not isinstance(server_config, dict): logger.error(f"无效配置类型: {type(server_config)}"); return _finish_scan_result(result, 'failed', f"无效配置类型: {type(server_config)}", started)
 
     server_id = server_config.get('server_id'); hostname = server_config.get('host'); server_name = server_config.get('name', hostname); port = server_config.get('port', 22); username = server_config.get('user'); password = server_config.get('password'); pkey_path = server_config.get('ssh_key_path'); enable_general = server_config.get('enable_general_log', False); log_dir = server_config.get('general_log_path') if enable_general else None; log_type = 'general' if enable_general else None
-    allowed_risk_levels = APP_CONFIG.get('WRITE_RISK_LEVELS', ['High', 'Medium', 'Low']); allowed_risk_levels_set = {level.capitalize() for level in allowed_risk_levels}; logger.info(f"将只写入风险等级为 {allowed_risk_levels_set} 的记录。")
+    # 优先使用通过 /api/write_risk_levels 保存的设置
+    allowed_risk_levels = get_system_setting('WRITE_RISK_LEVELS')
+    if not isinstance(allowed_risk_levels, list) or not allowed_risk_levels: allowed_risk_levels = APP_CONFIG.get('WRITE_RISK_LEVELS', ['High', 'Medium', 'Low'])
+    allowed_risk_levels_set = {level.capitalize() for level in allowed_risk_levels}; logger.info(f"将只写入风险等级为 {allowed_risk_levels_set} 的记录。")
+    # 各风险等级的存储方式 (逐条写入或只按 SQL 指纹汇总)，本次扫描内保持不变
+    storage_modes = get_risk_level_storage(); logger.info(f"各风险等级的存储方式: {storage_modes}")
+
+    # 使用通过 /api/risk_rules 保存的规则，规则未变化时复用已编译的匹配器
+    try: refresh_risk_rules()
+    except Exception as e: logger.warning(f"刷新风险规则失败，沿用当前规则: {e}")
 
-    if not server_id or not hostname or not username: logger.error(f"配置信息不完整: ID={server_id}, Host={hostname}, User={username}"); return
-    if enable_general and not log_dir: logger.error(f"服务器 {server_name} ({hostname}) 缺少 general_log_path (目录) 配置"); return
-    if not enable_general: logger.warning(f"服务器 {server_name} ({hostname}) 未启用 general_log 扫描"); return
+    if not server_id or not hostname or not username: logger.error(f"配置信息不完整: ID={server_id}, Host={hostname}, User={username}"); return _finish_scan_result(result, 'failed', "服务器配置信息不完整", started)
+    if enable_general and not log_dir: logger.error(f"服务器 {server_name} ({hostname}) 缺少 general_log_path (目录) 配置"); return _finish_scan_result(result, 'failed', "缺少 general_log_path 配置", started)
+    if not enable_general: logger.warning(f"服务器 {server_name} ({hostname}) 未启用 general_log 扫描"); return _finish_scan_result(result, 'skipped', "未启用 general_log 扫描", started)
 
     logger.info(f"开始增量扫描服务器日志目录: Name={server_name}, Host={hostname}, ID(Config)={server_id}, LogDir={log_dir}")
 
@@ -167,139 +313,254 @@ def scan_logs_for_server(server_config: dict):
          last_scan_time = last_scan_time.astimezone(timezone.utc)
          logger.info(f"上次扫描完成时间: {last_scan_time} (UTC). 将处理此时间之后修改的文件和记录。")
 
-    ssh_client = connect_ssh(hostname, port, username, password, pkey_path)
-    if not ssh_client: logger.error(f"连接服务器 {hostname} 失败"); return
+    # 获取各文件的读取检查点
+    checkpoints = get_file_checkpoints(server_id)
+    # 恢复上次扫描结束时仍在连接中的线程会话，本次扫描的所有文件共用 (线程可能在轮转前的文件中 Connect)
+    session_ttl = APP_CONFIG.get('SESSION_STATE_TTL', 7 * 24 * 3600)
+    thread_sessions = get_thread_sessions(server_id, session_ttl)
+
+    ssh_client = connect_ssh(hostname, port, username, password, pkey_path, compress=bool(server_config.get('ssh_compression', False)))
+    if not ssh_client: logger.error(f"连接服务器 {hostname} 失败"); return _finish_scan_result(result, 'failed', f"SSH 连接 {hostname}:{port} 失败", started)
 
     sftp = None; total_added_count = 0; scan_successful = True; current_scan_start_time = datetime.now(timezone.utc)
     try:
         sftp = ssh_client.open_sftp(); logger.info(f"SFTP 连接已建立，准备列出目录: {log_dir}")
+        # 为 SFTP 通道设置读超时，避免单台主机卡住时无限期阻塞
+        sftp.get_channel().settimeout(APP_CONFIG.get('SFTP_IO_TIMEOUT', 120))
         files_to_process = []
 
-        # 查找修改过的 .log 文件
+        # 远程预过滤: 只传输可能被写入的行；规则无法安全过滤或远程缺少所需命令时使用 SFTP 读取全部内容
+        filter_program = None
+        if APP_CONFIG.get('REMOTE_FILTER_ENABLED', False):
+            filter_program = build_filter_program(get_risk_rules(), allowed_risk_levels_set)
+            if filter_program is None: logger.info(f"当前风险规则和写入等级 {allowed_risk_levels_set} 无法在远程安全过滤，使用 SFTP 读取。")
+            elif not remote_filter_available(ssh_client): logger.warning(f"服务器 {hostname} 缺少 awk/tail/head，使用 SFTP 读取。"); filter_program = None
+            else: logger.info(f"服务器 {hostname} 启用远程预过滤。")
+
+        # 查找有新增内容的 .log 文件
         try:
             dir_entries = sftp.listdir_attr(log_dir); logger.debug(f"目录 {log_dir} 下找到 {len(dir_entries)} 个条目。")
+            existing_paths = []
             for entry in dir_entries:
                 is_file = (entry.st_mode & 0o170000) == 0o100000
+                if not is_file or not is_log_file(entry.filename): continue
+                full_log_path = posixpath.join(log_dir, entry.filename)
+                existing_paths.append(full_log_path)
                 # 将 st_mtime (float, Unix timestamp) 转换为带 UTC 时区的 datetime 对象
                 mtime_dt = datetime.fromtimestamp(entry.st_mtime, tz=timezone.utc)
-                # 选择修改时间晚于上次扫描时间的文件
-                if is_file and entry.filename.lower().endswith('.log') and mtime_dt > last_scan_time:
-                    files_to_process.append({'name': entry.filename, 'mtime': mtime_dt})
-                    logger.debug(f"找到待处理文件: {entry.filename}, 修改时间: {mtime_dt}")
+                file_size = entry.st_size or 0
+                checkpoint = checkpoints.get(full_log_path)
+                # 选择修改时间晚于上次扫描时间的文件，或大小与检查点偏移不一致 (追加/截断) 的文件
+                if mtime_dt > last_scan_time or (checkpoint and file_size != checkpoint.get('byte_offset')):
+                    files_to_process.append({'name': entry.filename, 'path': full_log_path, 'mtime': mtime_dt, 'size': file_size, 'compression': log_file_compression(entry.filename)})
+                    logger.debug(f"找到待处理文件: {entry.filename}, 修改时间: {mtime_dt}, 大小: {file_size}")
+
+            # 清理已不存在的文件的检查点
+            stale_paths = set(checkpoints) - set(existing_paths)
+            if stale_paths:
+                logger.info(f"以下文件已不存在，将删除其检查点: {sorted(stale_paths)}")
+                delete_stale_file_checkpoints(server_id, existing_paths)
 
             if not files_to_process:
-                logger.info(f"目录 {log_dir} 中没有找到自 {last_scan_time} 以来修改过的 .log 文件。")
+                logger.info(f"目录 {log_dir} 中没有找到自 {last_scan_time} 以来有新增内容的 .log 文件。")
                 update_last_scan_time(server_id, current_scan_start_time) # 仍然更新扫描时间
-                return
+                return _finish_scan_result(result, 'success', started=started)
 
             # 按修改时间排序，确保按顺序处理日志
             files_to_process.sort(key=lambda x: x['mtime'])
             logger.info(f"将按顺序处理 {len(files_to_process)} 个修改过的日志文件: {[f['name'] for f in files_to_process]}")
 
+            # 获取 inode，用于识别文件轮转
+            inodes = get_remote_inodes(ssh_client, [f['path'] for f in files_to_process])
+            for file_info in files_to_process:
+                file_info['inode'] = inodes.get(file_info['path'])
+                file_info['decompressed_offset'] = 0
+                if file_info['compression']:
+                    file_info['offset'], file_info['decompressed_offset'], reason = resolve_compressed_start(checkpoints.get(file_info['path']), file_info['inode'], file_info['size'])
+                else:
+                    file_info['offset'], reason = resolve_start_offset(checkpoints.get(file_info['path']), file_info['inode'], file_info['size'])
+                logger.info(f"文件 {file_info['name']}: 起始偏移 {file_info['offset']} / 大小 {file_info['size']} ({reason})")
+            if progress is not None: progress.add_files(len(files_to_process), sum(max(0, f['size'] - f['offset']) for f in files_to_process))
+
         except Exception as e:
             logger.exception(f"在目录 {log_dir} 中查找日志文件时发生错误: {e}")
             scan_successful = False
-            return # 查找文件出错，直接退出
+            return _finish_scan_result(result, 'failed', f"查找日志文件失败: {e}", started) # 查找文件出错，直接退出
 
         # 遍历处理筛选出的文件
         for file_info in files_to_process:
             filename = file_info['name']
-            full_log_path = posixpath.join(log_dir, filename)
-            sftp_file = None
+            full_log_path = file_info['path']
+            start_offset = file_info['offset']
+            if start_offset >= file_info['size']:
+                logger.info(f"文件 {filename} 自上次检查点以来没有新增内容，跳过。")
+                if progress is not None: progress.file_done()
+                continue
+            # 从检查点续读时读到的都是新追加的行，无需再按时间过滤；从文件头读取时才按上次扫描时间过滤
+            apply_time_filter = start_offset == 0
+            compression = file_info['compression']
+            # 流水线中的偏移: 普通文件为文件偏移，压缩文件为解压后数据流中的偏移
+            read_offset = file_info['decompressed_offset'] if compression else start_offset
+            log_file = None; raw_file = None; parse_progress = progress; filtered = {'timestamp': 0, 'risk': 0}
+            block_size = APP_CONFIG.get('SFTP_READ_BLOCK_SIZE', 4 * 1024 * 1024)
             try:
-                logger.info(f"正在打开日志文件流: {full_log_path}")
-                sftp_file = sftp.open(full_log_path, 'rb') # 以二进制模式打开
-
-                activities_batch = []
-                processed_count_in_file = 0
-                added_count_in_file = 0
+                if compression:
+                    # 边传输边解压，网络上传输的是压缩后的数据
+                    logger.info(f"正在打开压缩日志文件流: {full_log_path} ({compression}，跳过解压后的前 {read_offset} 字节)")
+                    raw_file = sftp.open(full_log_path, 'rb')
+                    log_file = open_decompressed(CountingReader(BlockStream(_count_sftp_bytes(iter_blocks(raw_file, 0, file_info['size'], block_size), server_id)), progress), compression)
+                    skipped = skip_bytes(log_file, read_offset)
+                    if skipped < read_offset: logger.warning(f"压缩文件 {filename} 解压后只有 {skipped} 字节，小于检查点偏移 {read_offset}。"); read_offset = skipped
+                    if progress is not None: parse_progress = _LineOnlyProgress(progress)
+                    line_source = log_file
+                elif filter_program is not None:
+                    # 只读取到列出目录时的文件大小，之后追加的内容留给下次扫描
+                    logger.info(f"正在远程过滤日志文件: {full_log_path} (偏移 {start_offset} - {file_info['size']})")
+                    log_file = RemoteFilteredSource(ssh_client, build_remote_command(full_log_path, start_offset, file_info['size'] - start_offset, filter_program),
+                                                     timeout=APP_CONFIG.get('SFTP_IO_TIMEOUT', 120))
+                    line_source = log_file
+                else:
+                    # 按块流水线读取到列出目录时的文件大小，在字节层面分行
+                    logger.info(f"正在打开日志文件流: {full_log_path} (偏移 {start_offset} - {file_info['size']})")
+                    log_file = sftp.open(full_log_path, 'rb') # 以二进制模式打开
+                    line_source = iter_lines(_count_sftp_bytes(iter_blocks(log_file, start_offset, file_info['size'], block_size), server_id))
 
-                # 流式解析
-                for activity in parse_general_log_stream(sftp_file, server_id):
-                    processed_count_in_file += 1
+                # 按时间戳 (只处理比上次扫描时间新的记录) 和风险等级过滤，被过滤的记录数在文件处理结束后计入指标
+                def accept(activity, apply_time_filter=apply_time_filter, filtered=filtered):
                     activity_time = activity.get('timestamp') # 已经是带时区的 datetime 对象
-
-                    # 按时间戳过滤 (只处理比上次扫描时间新的记录)
-                    if activity_time and activity_time > last_scan_time:
-                        # 按风险等级过滤
-                        risk_level = activity.get('risk_level', 'Low').capitalize()
-                        if risk_level in allowed_risk_levels_set:
-                            activities_batch.append(activity)
-                            # 批量插入
-                            if len(activities_batch) >= BATCH_INSERT_SIZE:
-                                logger.info(f"文件 {filename}: 达到批次大小 {BATCH_INSERT_SIZE}，执行批量插入...")
-                                add_user_activities_batch(activities_batch)
-                                added_count_in_file += len(activities_batch)
-                                activities_batch = [] # 清空批次
-                        # else: logger.debug(f"过滤掉风险等级为 {risk_level} 的活动")
-                    # else: logger.debug(f"过滤掉时间戳过旧的活动: {activity_time}")
-
-                # 处理文件末尾的最后一批
-                if activities_batch:
-                    logger.info(f"文件 {filename}: 处理最后一批 {len(activities_batch)} 条记录...")
-                    add_user_activities_batch(activities_batch)
-                    added_count_in_file += len(activities_batch)
-
-                total_added_count += added_count_in_file
-                logger.info(f"文件 {filename} 处理完成: 处理 {processed_count_in_file} 条潜在活动, 添加 {added_count_in_file} 条新记录。")
+                    if not activity_time or (apply_time_filter and activity_time <= last_scan_time): filtered['timestamp'] += 1; return False
+                    if activity.get('risk_level', 'Low').capitalize() in allowed_risk_levels_set: return True
+                    filtered['risk'] += 1; return False
+
+                # 读取、解析、写入三个阶段并发执行
+                pipeline = IngestPipeline(
+                    parse=lambda lines, read_state: parse_general_log_stream(lines, server_id, read_state, parse_progress, last_scan_time if apply_time_filter else None, thread_sessions),
+                    accept=accept, write_batch=lambda batch: add_user_activities_batch(batch, writer_mode, storage_modes), batch_size=BATCH_INSERT_SIZE,
+                    queue_size=APP_CONFIG.get('PIPELINE_QUEUE_SIZE', 8), chunk_lines=APP_CONFIG.get('PIPELINE_CHUNK_LINES', 1000),
+                    progress=progress, name=f'{server_id}:{filename}')
+                def save_checkpoint(offset, last_timestamp, finished, file_info=file_info, full_log_path=full_log_path):
+                    if file_info['compression']:
+                        # 压缩文件处理完成时 byte_offset 记为文件大小，否则记录解压后已写入的位置
+                        update_file_checkpoint(server_id, full_log_path, file_info['inode'], file_info['size'], file_info['size'] if finished else 0,
+                                               _parse_log_timestamp(last_timestamp), decompressed_offset=offset)
+                    else:
+                        update_file_checkpoint(server_id, full_log_path, file_info['inode'], max(file_info['size'], offset), offset, _parse_log_timestamp(last_timestamp))
+                try:
+                    stats = pipeline.run(line_source, read_offset)
+                except PipelineError as e:
+                    # 已写入部分仍保存检查点，下次从该位置继续，避免重复写入
+                    total_added_count += e.added; result['rows_added'] = total_added_count
+                    save_checkpoint(e.committed_offset, e.committed_timestamp, False)
+                    raise
+
+                # 记录检查点: 下次从本次完整读取到的位置继续
+                save_checkpoint(stats['offset'], stats['last_timestamp'], True)
+
+                total_added_count += stats['added']
+                result['files_processed'] += 1; result['rows_added'] = total_added_count
+                if filter_program is not None: logger.info(f"文件 {filename} 远程过滤后传输 {log_file.bytes_transferred} / {stats['offset'] - start_offset} 字节。")
+                if compression: logger.info(f"文件 {filename} 传输 {file_info['size']} 字节压缩数据，解压后 {stats['offset']} 字节。")
+                logger.info(f"文件 {filename} 处理完成: 读取 {stats['offset'] - read_offset} 字节, 处理 {stats['processed']} 条潜在活动, 添加 {stats['added']} 条新记录。")
 
             except Exception as e:
                 logger.exception(f"处理文件 {full_log_path} 时发生错误: {e}")
                 scan_successful = False # 标记扫描中遇到错误
+                if not result['error']: result['error'] = f"处理文件 {filename} 失败: {e}"
                 # 这里可以选择 continue 来尝试处理下一个文件，或者 break/return 中断本次扫描
                 # break # 如果一个文件失败就中断整个服务器的扫描
             finally:
-                if sftp_file:
-                    sftp_file.close()
-                    logger.info(f"SFTP 文件流已关闭 ({full_log_path})。")
+                if log_file:
+                    log_file.close()
+                    logger.info(f"文件流已关闭 ({full_log_path})。")
+                if raw_file: raw_file.close()
+                if progress is not None: progress.file_done()
+                for reason, count in filtered.items():
+                    if count: ROWS_FILTERED.inc(count, server_id=str(server_id), reason=reason)
+                if isinstance(log_file, RemoteFilteredSource): REMOTE_FILTER_BYTES.inc(log_file.bytes_transferred, server_id=str(server_id))
 
         # --- 所有文件处理完毕 ---
+        save_thread_sessions(server_id, thread_sessions, session_ttl)
         if scan_successful:
             logger.info(f"服务器 {server_name} ({hostname}) 所有修改过的日志文件处理完毕。总共添加 {total_added_count} 条新记录。")
             # 只有在所有文件都成功处理后才更新时间
             update_last_scan_time(server_id, current_scan_start_time)
+            _finish_scan_result(result, 'success')
         else:
             logger.error(f"服务器 {server_name} ({hostname}) 扫描过程中发生错误，未更新上次扫描时间。")
+            _finish_scan_result(result, 'failed')
 
     except Exception as e:
         logger.exception(f"扫描服务器 {server_name} ({hostname}) 日志时发生错误: {e}")
+        _finish_scan_result(result, 'failed', f"扫描失败: {e}")
     finally:
         # 清理资源
         if sftp: sftp.close(); logger.info(f"SFTP 连接已关闭 ({hostname})。")
         if ssh_client: ssh_client.close(); logger.info(f"SSH 连接已关闭 ({hostname})。")
+    return _finish_scan_result(result, result['status'], started=started)
 
 # !! 保持 scan_all_servers 的正确格式 !!
-def scan_all_servers():
-    """扫描全部服务器日志"""
+def _scan_server_isolated(server: Dict[str, Any], progress=None, writer_mode: Optional[str] = None) -> Dict[str, Any]:
+    """在隔离环境中扫描单台服务器：任何异常都只影响本服务器的结果"""
+    server_id = server.get('server_id')
+    try:
+        # 获取完整配置（包含密码/密钥）
+        full_config = get_server_full_config(server_id)
+        if not full_config:
+            logger.warning(f"未能获取服务器 ID {server_id} 的完整配置")
+            return _finish_scan_result(new_scan_result(server), 'failed', "未能获取服务器完整配置")
+        # 执行日志扫描
+        return scan_logs_for_server(full_config, progress, writer_mode)
+    except Exception as e:
+        logger.exception(f"扫描服务器 ID {server_id} 时发生未处理的错误: {e}")
+        return _finish_scan_result(new_scan_result(server), 'failed', f"扫描失败: {e}")
+
+def summarize_scan_results(results: List[Dict[str, Any]], started: float) -> Dict[str, Any]:
+    """汇总多台服务器的扫描结果"""
+    results = sorted(results, key=lambda r: (r.get('server_id') is None, r.get('server_id') or 0))
+    return {
+        'total': len(results),
+        'success': sum(1 for r in results if r.get('status') == 'success'),
+        'failed': sum(1 for r in results if r.get('status') == 'failed'),
+        'skipped': sum(1 for r in results if r.get('status') == 'skipped'),
+        'rows_added': sum(r.get('rows_added', 0) for r in results),
+        'duration_seconds': round(time.monotonic() - started, 3),
+        'servers': results
+    }
+
+def scan_all_servers(parallel: Optional[bool] = None, max_workers: Optional[int] = None, progress=None, writer_mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    扫描全部服务器日志。
+    并行模式下使用有界线程池同时扫描多台服务器 (池大小由 SCAN_MAX_WORKERS 配置)，
+    每台服务器独立处理异常，一台主机缓慢或失败不会阻塞其他主机。
+    progress 为可选的进度计数器，由所有服务器共享；writer_mode 为本次扫描的批量写入方式。返回汇总结果，其中 'servers' 为每台服务器的扫描结果摘要。
+    """
+    started = time.monotonic()
+    parallel = APP_CONFIG.get('SCAN_PARALLEL', True) if parallel is None else parallel
+    max_workers = max_workers or APP_CONFIG.get('SCAN_MAX_WORKERS', 4)
+    results = []
     try:
         # 从数据库获取所有服务器配置
         servers = get_all_servers()
         logger.info(f"从数据库获取到 {len(servers)} 个服务器配置")
-        
-        success_count = 0
-        fail_count = 0
-        
-        for server in servers:
-            server_id = server.get('server_id')
-            # 获取完整配置（包含密码/密钥）
-            full_config = get_server_full_config(server_id)
-            if full_config:
-                # 执行日志扫描
-                result = scan_logs_for_server(full_config)
-                if result:
-                    success_count += 1
-                else:
-                    fail_count += 1
-            else:
-                logger.warning(f"未能获取服务器 ID {server_id} 的完整配置")
-                fail_count += 1
-        
-        logger.info(f"扫描完成: {success_count} 个成功, {fail_count} 个失败")
-        return success_count > 0  # 至少有一个成功就返回 True
-    
+
+        if parallel and len(servers) > 1:
+            pool_size = max(1, min(max_workers, len(servers)))
+            logger.info(f"以并行模式扫描 {len(servers)} 台服务器，线程池大小 {pool_size}")
+            with ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='log-scan') as executor:
+                futures = {executor.submit(_scan_server_isolated, server, progress, writer_mode): server for server in servers}
+                for future in as_completed(futures):
+                    results.append(future.result())
+        else:
+            for server in servers:
+                results.append(_scan_server_isolated(server, progress, writer_mode))
     except Exception as e:
         logger.exception(f"扫描所有服务器日志时出错: {e}")
-        return False
+
+    summary = summarize_scan_results(results, started)
+    logger.info(f"扫描完成: {summary['success']} 个成功, {summary['failed']} 个失败, {summary['skipped']} 个跳过, 共添加 {summary['rows_added']} 条记录, 耗时 {summary['duration_seconds']} 秒")
+    for r in summary['servers']:
+        if r.get('status') != 'success': logger.warning(f"服务器 {r.get('name')} (ID {r.get('server_id')}) 扫描{'跳过' if r.get('status') == 'skipped' else '失败'}: {r.get('error')}")
+    return summary
 
 # !! 保持 parse_binlog 的正确格式 !!
 def parse_binlog(ssh_client, binlog_path, server_id, last_scan_time=None):
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+进程内指标 (Prometheus 文本格式)
+轻量的计数器和直方图，由扫描、写入和 Web 请求等路径直接更新，通过 /metrics 输出。
+指标只保存在当前进程内存中，进程重启后清零；多进程解析 (parallel_parser) 的工作进程中的计数不会汇总到主进程。
+"""
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# 默认的耗时直方图分桶 (秒)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra: pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'): return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    """指标基类: 按标签值分别保存数据"""
+    type_name = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional['Registry'] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+    type_name = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        if amount < 0: raise ValueError("计数器不能减少")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """直方图: 各分桶的计数、观测值总和与观测次数"""
+    type_name = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS,
+                 registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # [分桶计数 (含 +Inf), 总和, 次数]
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def _render_samples(self, items) -> List[str]:
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if any(existing.name == metric.name for existing in self._metrics):
+                raise ValueError(f"指标 {metric.name} 已注册")
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        """输出 Prometheus 文本格式"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表
+REGISTRY = Registry()
+
+# --- 扫描 ---
+SFTP_BYTES_READ = Counter('mysql_log_sftp_bytes_read_total', 'SFTP 读取的日志字节数 (压缩文件为压缩后的字节数)', ['server_id'])
+REMOTE_FILTER_BYTES = Counter('mysql_log_remote_filter_bytes_total', '远程预过滤后传输的日志字节数', ['server_id'])
+LINES_PARSED = Counter('mysql_log_lines_parsed_total', '解析器处理的日志行数', ['server_id'])
+LINES_MATCHED = Counter('mysql_log_lines_matched_total', '匹配日志行头格式的行数', ['server_id'])
+ROWS_FILTERED = Counter('mysql_log_rows_filtered_total', '未写入数据库的操作记录数 (reason: timestamp 不晚于上次扫描时间 / risk 风险等级不在写入范围)', ['server_id', 'reason'])
+SCAN_DURATION = Histogram('mysql_log_scan_duration_seconds', '单台服务器的扫描耗时', ['server_id', 'status'],
+                          buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600))
+
+# --- 数据库写入 ---
+BATCH_INSERT_SECONDS = Histogram('mysql_log_batch_insert_seconds', '批量写入一批操作记录的耗时', ['writer_mode', 'status'])
+BATCH_INSERT_ROWS = Histogram('mysql_log_batch_insert_rows', '每批写入的操作记录数', ['writer_mode'],
+                              buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000))
+SQL_TEXT_BYTES = Counter('mysql_log_sql_text_bytes_total', '去重存储的语句字节数 (kind: referenced 以引用代替的语句 / stored 新写入 sql_texts 的语句)', ['kind'])
+DB_QUERY_SECONDS = Histogram('mysql_log_db_query_seconds', '单条 SQL 语句的执行耗时 (连接池中的所有连接)')
+
+# --- Web 请求 ---
+HTTP_REQUEST_SECONDS = Histogram('mysql_log_http_request_seconds', 'API 请求耗时 (不含流式响应的传输)', ['endpoint', 'method', 'status'])
+HTTP_DB_SECONDS = Histogram('mysql_log_http_db_seconds', '单个 API 请求中执行 SQL 语句的累计耗时', ['endpoint', 'method'])
+
+# 当前线程 (Web 请求) 累计的 SQL 执行耗时
+_db_time = threading.local()
+
+
+def record_db_query(seconds: float):
+    """记录一条 SQL 语句的执行耗时，并计入当前线程的累计耗时"""
+    DB_QUERY_SECONDS.observe(seconds)
+    _db_time.total = getattr(_db_time, 'total', 0.0) + seconds
+
+
+def reset_db_time():
+    _db_time.total = 0.0
+
+
+def get_db_time() -> float:
+    return getattr(_db_time, 'total', 0.0)
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
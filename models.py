@@ -2,13 +2,21 @@
 # 导入所需库
 import pymysql
 import logging
-from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
-from config import DB_CONFIG
+from datetime import datetime, timezone, timedelta
+from typing import List, Dict, Any, Optional, Generator
 import json
 import time
+import threading
 import copy
+import os
+import tempfile
+import base64
+import hashlib
 from config import APP_CONFIG
+from db_pool import db_pool
+from query_cache import TTLCache, RangeCache, MISSING
+from metrics import BATCH_INSERT_SECONDS, BATCH_INSERT_ROWS, SQL_TEXT_BYTES
+from sql_digest import sql_digest
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import create_engine, Column, Integer, String, DateTime, Enum, Text, BigInteger, Boolean, ForeignKey
 from sqlalchemy.ext.declarative import declarative_base
@@ -33,8 +41,40 @@ class UserActivity(db.Model):
     command_type = Column(String(50))
     operation_type = Column(String(50))
     argument = Column(Text)
+    argument_hash = Column(String(32))
     risk_level = Column(Enum('Low', 'Medium', 'High'), default='Low')
     created_at = Column(DateTime, default=datetime.utcnow)
+    user_id = Column(Integer)
+    host_id = Column(Integer)
+    db_id = Column(Integer)
+
+# 定义维度表模型 (用户名、客户端主机、数据库名 -> 整数 ID)，名称区分大小写
+class DimUser(db.Model):
+    __tablename__ = 'dim_users'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100, collation='utf8mb4_bin'), nullable=False, unique=True)
+
+class DimHost(db.Model):
+    __tablename__ = 'dim_hosts'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(255, collation='utf8mb4_bin'), nullable=False, unique=True)
+
+class DimDatabase(db.Model):
+    __tablename__ = 'dim_databases'
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(100, collation='utf8mb4_bin'), nullable=False, unique=True)
+
+# 定义SqlText模型
+class SqlText(db.Model):
+    __tablename__ = 'sql_texts'
+    
+    text_hash = Column(String(32), primary_key=True)
+    sql_text = Column(Text(16777215), nullable=False)
+    text_length = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 # 定义ServerConfig模型
 class ServerConfig(db.Model):
@@ -51,6 +91,7 @@ class ServerConfig(db.Model):
     binlog_path = Column(String(255))
     enable_general_log = Column(Boolean, default=True)
     enable_binlog = Column(Boolean, default=False)
+    ssh_compression = Column(Boolean, default=False)
 
 # 定义SystemSetting模型
 class SystemSetting(db.Model):
@@ -67,29 +108,197 @@ class ServerScanRecord(db.Model):
     server_id = Column(Integer, primary_key=True)
     last_scan_time = Column(DateTime(6), nullable=False)
 
+# 定义LogFileCheckpoint模型
+class LogFileCheckpoint(db.Model):
+    __tablename__ = 'log_file_checkpoints'
+    
+    server_id = Column(Integer, primary_key=True)
+    file_path = Column(String(255), primary_key=True)
+    inode = Column(BigInteger)
+    file_size = Column(BigInteger, nullable=False, default=0)
+    byte_offset = Column(BigInteger, nullable=False, default=0)
+    decompressed_offset = Column(BigInteger)
+    last_timestamp = Column(DateTime(6))
+    updated_at = Column(DateTime(6), nullable=False)
+
+# 定义ActivityRollupHourly模型
+class ActivityRollupHourly(db.Model):
+    __tablename__ = 'activity_rollup_hourly'
+    
+    server_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    user_id = Column(Integer, primary_key=True, default=0)
+    user_name = Column(String(100), primary_key=True, default='')
+    operation_type = Column(String(50), primary_key=True, default='')
+    risk_level = Column(Enum('Low', 'Medium', 'High'), primary_key=True, default='Low')
+    count = Column(BigInteger, nullable=False, default=0)
+
+# 定义ThreadSession模型
+class ThreadSession(db.Model):
+    __tablename__ = 'thread_sessions'
+    
+    server_id = Column(Integer, primary_key=True)
+    thread_id = Column(BigInteger, primary_key=True)
+    user_name = Column(String(100))
+    client_host = Column(String(255))
+    db_name = Column(String(100))
+    last_seen = Column(DateTime(6), nullable=False)
+
+# 定义SqlDigestSummary模型
+class SqlDigestSummary(db.Model):
+    __tablename__ = 'sql_digest_summary'
+    
+    server_id = Column(Integer, primary_key=True)
+    hour = Column(DateTime, primary_key=True)
+    user_id = Column(Integer, primary_key=True, default=0)
+    user_name = Column(String(100), primary_key=True, default='')
+    digest = Column(String(32), primary_key=True)
+    operation_type = Column(String(50))
+    risk_level = Column(Enum('Low', 'Medium', 'High'), default='Low')
+    sample_text = Column(Text)
+    count = Column(BigInteger, nullable=False, default=0)
+    first_seen = Column(DateTime(6), nullable=False)
+    last_seen = Column(DateTime(6), nullable=False)
+
+# 定义ReportSnapshot模型
+class ReportSnapshot(db.Model):
+    __tablename__ = 'report_snapshots'
+    
+    report_type = Column(String(10), primary_key=True)
+    period_start = Column(DateTime, primary_key=True)
+    period_end = Column(DateTime, nullable=False)
+    data = Column(Text(16777215), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
 # --- 数据库连接 ---
 def get_db_connection():
-    """获取数据库连接"""
-    try:
-        # 使用pymysql连接MySQL数据库
-        conn = pymysql.connect(
-            host=DB_CONFIG['host'],
-            port=DB_CONFIG['port'],
-            user=DB_CONFIG['user'],
-            password=DB_CONFIG['password'],
-            database=DB_CONFIG['database'],
-            charset='utf8mb4',
-            cursorclass=pymysql.cursors.DictCursor
-        )
+    """从连接池获取数据库连接 (默认使用 DictCursor)，调用 close() 即归还连接池"""
+    try:
+        conn = db_pool.acquire()
         logger.debug("数据库连接成功。")
         return conn
     except Exception as e:
         logger.error(f"数据库连接失败: {e}")
         return None
 
+def get_db_pool_stats() -> Dict[str, Any]:
+    """获取数据库连接池状态和等待统计"""
+    return db_pool.stats()
+
 # --- 数据库初始化 ---
+def _ensure_index(cursor, table: str, index_name: str, columns_sql: str):
+    """索引不存在时创建 (用于升级旧版本创建的表)"""
+    if not _has_index(cursor, table, index_name):
+        logger.info(f"为表 {table} 创建索引 {index_name} ({columns_sql}) ...")
+        cursor.execute(f"ALTER TABLE {table} ADD INDEX {index_name} ({columns_sql})")
+
+def _has_index(cursor, table: str, index_name: str) -> bool:
+    cursor.execute(
+        "SELECT COUNT(*) AS cnt FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+        (table, index_name))
+    return bool(cursor.fetchone()['cnt'])
+
+def _ensure_primary_key(cursor, table: str, columns: List[str]):
+    """主键列与 columns 不一致时重建主键 (用于升级旧版本创建的表)"""
+    cursor.execute(
+        "SELECT column_name AS name FROM information_schema.key_column_usage WHERE table_schema = DATABASE() "
+        "AND table_name = %s AND constraint_name = 'PRIMARY' ORDER BY ordinal_position", (table,))
+    if [row['name'] for row in cursor.fetchall()] != columns:
+        columns_sql = ', '.join(f'`{column}`' for column in columns)
+        logger.info(f"重建表 {table} 的主键 ({columns_sql}) ...")
+        cursor.execute(f"ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY ({columns_sql})")
+
+def _ensure_column(cursor, table: str, column: str, definition_sql: str):
+    """列不存在时添加 (用于升级旧版本创建的表)"""
+    cursor.execute(
+        "SELECT COUNT(*) AS cnt FROM information_schema.columns WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s",
+        (table, column))
+    if not cursor.fetchone()['cnt']:
+        logger.info(f"为表 {table} 添加列 {column} ...")
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition_sql}")
+
+# --- user_activities 分区 ---
+# 分区粒度: day (按天) / month (按月)。分区按 RANGE COLUMNS(timestamp) 划分，分区名为 p + 分区起始日期，
+# pold 为转换时超出分区数上限的更早记录，pmax 接收超出已建分区范围的记录 (正常情况下为空，预建分区时从中拆分)
+ACTIVITY_PARTITION_INTERVALS = ('day', 'month')
+_MAX_INITIAL_PARTITIONS = 1024
+_PMAX_SQL = "PARTITION pmax VALUES LESS THAN (MAXVALUE)"
+
+def _partition_floor(value: datetime, interval: str) -> datetime:
+    """value 所在分区的起点"""
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    return value.replace(day=1) if interval == 'month' else value
+
+def _partition_next(value: datetime, interval: str) -> datetime:
+    """value 所在分区的下一个分区的起点"""
+    start = _partition_floor(value, interval)
+    if interval == 'month':
+        return start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+def _partition_horizon(now: datetime, interval: str) -> datetime:
+    """预建分区需要覆盖到的上界: 当前分区之后再预建 ACTIVITY_PARTITION_AHEAD 个分区"""
+    horizon = _partition_next(now, interval)
+    for _ in range(max(0, APP_CONFIG.get('ACTIVITY_PARTITION_AHEAD', 3))):
+        horizon = _partition_next(horizon, interval)
+    return horizon
+
+def _partition_ranges(lower: datetime, upper: datetime, interval: str) -> List[tuple]:
+    """覆盖 [lower, upper) 的分区列表 [(分区名, 上界)]，每个分区的上界为下一个分区的起点"""
+    ranges = []
+    while lower < upper:
+        bound = _partition_next(lower, interval)
+        ranges.append((f"p{lower.strftime('%Y%m%d')}", bound))
+        lower = bound
+    return ranges
+
+def _partition_sql(name: str, upper: datetime) -> str:
+    return f"PARTITION {name} VALUES LESS THAN ('{upper.strftime('%Y-%m-%d %H:%M:%S')}')"
+
+def _get_activity_partitions(cursor) -> List[tuple]:
+    """user_activities 的分区 [(分区名, 上界, 估算行数)]，按分区顺序排列，pmax 的上界为 None；未分区时返回空列表"""
+    cursor.execute(
+        "SELECT partition_name AS name, partition_description AS description, table_rows AS row_estimate "
+        "FROM information_schema.partitions WHERE table_schema = DATABASE() AND table_name = 'user_activities' "
+        "AND partition_name IS NOT NULL ORDER BY partition_ordinal_position")
+    partitions = []
+    for row in cursor.fetchall():
+        description = (row['description'] or '').strip("'")
+        upper = None if description.upper() == 'MAXVALUE' else datetime.fromisoformat(description)
+        partitions.append((row['name'], upper, int(row['row_estimate'] or 0)))
+    return partitions
+
+def _partition_user_activities(cursor, interval: str):
+    """
+    将未分区的 user_activities 转换为按 timestamp 分区的表。分区表不支持外键，且每个唯一键都必须包含分区列，
+    因此同时删除外键并将主键改为 (id, timestamp)。转换需要重建整张表，数据量大时耗时较长。
+    """
+    cursor.execute("SELECT MIN(`timestamp`) AS oldest FROM user_activities")
+    oldest = cursor.fetchone()['oldest']
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    horizon = _partition_horizon(now, interval)
+    ranges = _partition_ranges(_partition_floor(oldest or now, interval), horizon, interval)
+    definitions = [_partition_sql(name, upper) for name, upper in ranges[-_MAX_INITIAL_PARTITIONS:]]
+    if len(ranges) > _MAX_INITIAL_PARTITIONS:
+        # 更早的记录放入同一个分区，超过保留期后整体删除
+        definitions.insert(0, _partition_sql('pold', ranges[-_MAX_INITIAL_PARTITIONS - 1][1]))
+    definitions.append(_PMAX_SQL)
+
+    cursor.execute(
+        "SELECT constraint_name AS name FROM information_schema.referential_constraints "
+        "WHERE constraint_schema = DATABASE() AND table_name = 'user_activities'")
+    alters = [f"DROP FOREIGN KEY `{row['name']}`" for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT COUNT(*) AS cnt FROM information_schema.key_column_usage WHERE table_schema = DATABASE() "
+        "AND table_name = 'user_activities' AND constraint_name = 'PRIMARY' AND column_name = 'timestamp'")
+    if not cursor.fetchone()['cnt']:
+        alters.append("DROP PRIMARY KEY, ADD PRIMARY KEY (id, `timestamp`)")
+    logger.warning(f"正在将 user_activities 转换为按 {interval} 分区的表 ({len(definitions)} 个分区)，需要重建整张表 ...")
+    cursor.execute(f"ALTER TABLE user_activities {', '.join(alters)} PARTITION BY RANGE COLUMNS(`timestamp`) ({', '.join(definitions)})")
+    logger.info("user_activities 分区转换完成")
+
 def init_db():
-    """初始化数据库，创建 user_activities 和 server_scan_status 表"""
+    """初始化数据库，创建 user_activities、server_scan_records 等表"""
     logger.info("初始化数据库...")
     conn = get_db_connection()
     if not conn:
@@ -110,12 +319,58 @@ def init_db():
                 command_type VARCHAR(50),
                 operation_type VARCHAR(50),
                 argument TEXT,
+                argument_hash CHAR(32) NULL,
                 risk_level ENUM('Low','Medium','High') DEFAULT 'Low',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                user_id INT NULL,
+                host_id INT NULL,
+                db_id INT NULL,
                 INDEX idx_server_time(server_id, `timestamp`),
-                INDEX idx_user_time(user_name, `timestamp`)
+                INDEX idx_user_id_time(user_id, `timestamp`),
+                INDEX idx_time(`timestamp`),
+                INDEX idx_argument_hash(argument_hash)
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
             ''')
+            # 旧版本创建的表补充 (timestamp) 索引，供按 (timestamp, id) 游标分页使用 (InnoDB 二级索引隐含主键 id)
+            _ensure_index(cursor, 'user_activities', 'idx_time', '`timestamp`')
+            # 去重存储的 SQL 语句: argument 为 NULL 时语句文本在 sql_texts 中，按 argument_hash 关联
+            _ensure_column(cursor, 'user_activities', 'argument_hash', 'CHAR(32) NULL AFTER argument')
+            _ensure_index(cursor, 'user_activities', 'idx_argument_hash', 'argument_hash')  # 清理不再被引用的语句时使用
+            # 维度表: 新写入的记录中用户名、客户端主机、数据库名只保存整数 ID，名称列为 NULL (旧记录仍保存名称)
+            for dim_id_column in ('user_id', 'host_id', 'db_id'):
+                _ensure_column(cursor, 'user_activities', dim_id_column, 'INT NULL')
+            _ensure_index(cursor, 'user_activities', 'idx_user_id_time', 'user_id, `timestamp`')
+            # 旧版本按用户名的索引: 所有带用户名的记录都有 user_id 后删除 (按用户查询走 idx_user_id_time)；
+            # 关闭 DIMENSION_KEYS_ENABLED 时新记录只有用户名，仍需要该索引
+            if not APP_CONFIG.get('DIMENSION_KEYS_ENABLED', True):
+                _ensure_index(cursor, 'user_activities', 'idx_user_time', 'user_name, `timestamp`')
+            elif _has_index(cursor, 'user_activities', 'idx_user_time'):
+                cursor.execute("SELECT EXISTS(SELECT 1 FROM user_activities WHERE user_name IS NOT NULL AND user_id IS NULL) AS has_names")
+                if not cursor.fetchone()['has_names']:
+                    logger.info("user_activities 中的用户名均已有 user_id，删除索引 idx_user_time ...")
+                    cursor.execute("ALTER TABLE user_activities DROP INDEX idx_user_time")
+            for table, _, _, name_length in DIMENSIONS.values():
+                cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {table} (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    name VARCHAR({name_length}) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL,
+                    UNIQUE KEY uk_name(name)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+                ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sql_texts (
+                text_hash CHAR(32) NOT NULL PRIMARY KEY,
+                sql_text MEDIUMTEXT NOT NULL,
+                text_length INT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            # 按 timestamp 分区 (ACTIVITY_PARTITION_INTERVAL)；已分区的表由后台任务 (maintain_activity_partitions) 预建分区
+            partition_interval = APP_CONFIG.get('ACTIVITY_PARTITION_INTERVAL')
+            if partition_interval and partition_interval not in ACTIVITY_PARTITION_INTERVALS:
+                logger.error(f"无效的分区粒度 ACTIVITY_PARTITION_INTERVAL={partition_interval}，可选值: {', '.join(ACTIVITY_PARTITION_INTERVALS)}")
+            elif partition_interval and not _get_activity_partitions(cursor):
+                _partition_user_activities(cursor, partition_interval)
             
             # 创建服务器扫描记录表
             cursor.execute('''
@@ -125,6 +380,97 @@ def init_db():
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
             ''')
             
+            # 创建日志文件读取检查点表 (按服务器、文件记录已读取的字节偏移)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS log_file_checkpoints (
+                server_id INT NOT NULL,
+                file_path VARCHAR(255) NOT NULL,
+                inode BIGINT NULL,
+                file_size BIGINT NOT NULL DEFAULT 0,
+                byte_offset BIGINT NOT NULL DEFAULT 0,
+                decompressed_offset BIGINT NULL,
+                last_timestamp DATETIME(6) NULL,
+                updated_at DATETIME(6) NOT NULL,
+                PRIMARY KEY (server_id, file_path)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            _ensure_column(cursor, 'log_file_checkpoints', 'decompressed_offset', 'BIGINT NULL AFTER byte_offset')
+            
+            # 创建按小时预聚合的活动统计表 (写入活动记录时同步累加)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS activity_rollup_hourly (
+                server_id INT NOT NULL,
+                `hour` DATETIME NOT NULL,
+                user_id INT NOT NULL DEFAULT 0,
+                user_name VARCHAR(100) NOT NULL DEFAULT '',
+                operation_type VARCHAR(50) NOT NULL DEFAULT '',
+                risk_level ENUM('Low','Medium','High') NOT NULL DEFAULT 'Low',
+                `count` BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (server_id, `hour`, user_id, user_name, operation_type, risk_level),
+                INDEX idx_hour(`hour`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            # 预聚合表按用户 ID 汇总 (user_id 为 0 时按用户名，即旧版本写入的行和没有取到 ID 的用户名)
+            _ensure_column(cursor, 'activity_rollup_hourly', 'user_id', "INT NOT NULL DEFAULT 0 AFTER `hour`")
+            _ensure_primary_key(cursor, 'activity_rollup_hourly', ROLLUP_KEY_COLUMNS)
+            # 创建线程会话表 (扫描结束时保存各服务器仍在连接中的线程与用户的对应关系，下次扫描时恢复)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS thread_sessions (
+                server_id INT NOT NULL,
+                thread_id BIGINT NOT NULL,
+                user_name VARCHAR(100),
+                client_host VARCHAR(255),
+                db_name VARCHAR(100),
+                last_seen DATETIME(6) NOT NULL,
+                PRIMARY KEY (server_id, thread_id)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            # 创建 SQL 指纹汇总表 (存储方式为 aggregate 的风险等级只按指纹、用户、小时汇总，不写入明细)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS sql_digest_summary (
+                server_id INT NOT NULL,
+                `hour` DATETIME NOT NULL,
+                user_id INT NOT NULL DEFAULT 0,
+                user_name VARCHAR(100) NOT NULL DEFAULT '',
+                digest CHAR(32) NOT NULL,
+                operation_type VARCHAR(50),
+                risk_level ENUM('Low','Medium','High') DEFAULT 'Low',
+                sample_text TEXT,
+                `count` BIGINT NOT NULL DEFAULT 0,
+                first_seen DATETIME(6) NOT NULL,
+                last_seen DATETIME(6) NOT NULL,
+                PRIMARY KEY (server_id, `hour`, user_id, user_name, digest),
+                INDEX idx_hour(`hour`)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            _ensure_column(cursor, 'sql_digest_summary', 'user_id', "INT NOT NULL DEFAULT 0 AFTER `hour`")
+            _ensure_primary_key(cursor, 'sql_digest_summary', DIGEST_KEY_COLUMNS)
+            # 创建报表快照表 (已结束周期的日报、周报、月报，period_end 不包含在周期内)
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS report_snapshots (
+                report_type VARCHAR(10) NOT NULL,
+                period_start DATETIME NOT NULL,
+                period_end DATETIME NOT NULL,
+                data MEDIUMTEXT NOT NULL,
+                created_at DATETIME NOT NULL,
+                PRIMARY KEY (report_type, period_start),
+                INDEX idx_period(period_start, period_end)
+            ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+            ''')
+            # 预聚合表为空而已有活动记录时 (升级后首次启动)，从现有记录回填
+            cursor.execute("SELECT EXISTS(SELECT 1 FROM activity_rollup_hourly) AS has_rollup, EXISTS(SELECT 1 FROM user_activities) AS has_activities")
+            rollup_state = cursor.fetchone()
+            if rollup_state and not rollup_state['has_rollup'] and rollup_state['has_activities']:
+                logger.info("正在根据现有活动记录回填 activity_rollup_hourly ...")
+                cursor.execute('''
+                INSERT INTO activity_rollup_hourly (server_id, `hour`, user_id, user_name, operation_type, risk_level, `count`)
+                SELECT server_id, DATE_FORMAT(`timestamp`, '%Y-%m-%d %H:00:00'), IFNULL(user_id, 0), IFNULL(user_name, ''),
+                       IFNULL(operation_type, ''), IFNULL(risk_level, 'Low'), COUNT(*)
+                FROM user_activities
+                GROUP BY 1, 2, 3, 4, 5, 6
+                ''')
+                logger.info(f"activity_rollup_hourly 回填完成，共 {cursor.rowcount} 行。")
+            
             # 创建服务器配置表
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS server_configs (
@@ -138,9 +484,11 @@ def init_db():
                 general_log_path VARCHAR(255),
                 binlog_path VARCHAR(255),
                 enable_general_log TINYINT(1) DEFAULT 1,
-                enable_binlog TINYINT(1) DEFAULT 0
+                enable_binlog TINYINT(1) DEFAULT 0,
+                ssh_compression TINYINT(1) DEFAULT 0
             ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
             ''')
+            _ensure_column(cursor, 'server_configs', 'ssh_compression', 'TINYINT(1) DEFAULT 0')
             
             # 创建系统设置表
             cursor.execute('''
@@ -241,31 +589,144 @@ def init_system_settings():
         if conn:
             conn.close()
 
-# --- 数据操作函数 ---
+# --- 分区维护 ---
+def get_activity_retention_days() -> Optional[int]:
+    """操作记录保留天数: 系统设置 ACTIVITY_RETENTION_DAYS 优先，其次为 APP_CONFIG 默认值；None 或 0 表示不删除"""
+    days = get_system_setting('ACTIVITY_RETENTION_DAYS')
+    if days is None:
+        days = APP_CONFIG.get('ACTIVITY_RETENTION_DAYS')
+    try:
+        return int(days) if days else None
+    except (TypeError, ValueError):
+        logger.warning(f"无效的保留天数 ACTIVITY_RETENTION_DAYS={days}，不删除过期记录")
+        return None
 
-def add_user_activity(activity_data: dict):
-    """将单条用户活动记录添加到数据库 (调用批量版本)"""
-    add_user_activities_batch([activity_data])
+def get_activity_partitions() -> List[Dict[str, Any]]:
+    """user_activities 的分区列表 (分区名、上界、估算行数)，未分区时返回空列表。数据库出错时抛出异常。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("无法连接数据库")
+    try:
+        with conn.cursor() as cursor:
+            return [{'name': name, 'upper_bound': upper.isoformat() if upper else None, 'rows_estimate': rows}
+                    for name, upper, rows in _get_activity_partitions(cursor)]
+    finally:
+        conn.close()
 
-def add_user_activities_batch(activities: List[Dict[str, Any]]):
-    """将一批用户活动记录批量添加到数据库"""
-    if not activities:
-        return
+# 删除分区后随之清理的汇总数据: (表, 时间列)，早于已删除分区上界的行被删除
+_RETENTION_TABLES = (('activity_rollup_hourly', '`hour`'), ('sql_digest_summary', '`hour`'), ('report_snapshots', 'period_start'))
+_PURGE_CHUNK_ROWS = 10000
 
-    sql = """
-    INSERT INTO user_activities
-    (server_id, `timestamp`, user_name, client_host, db_name, thread_id, command_type, operation_type, argument, risk_level)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+def _delete_before(conn, cursor, table: str, column: str, before: datetime) -> int:
+    """分批删除 table 中 column 早于 before 的行 (每批单独提交，避免大事务)，返回删除的行数"""
+    deleted = 0
+    while True:
+        cursor.execute(f"DELETE FROM {table} WHERE {column} < %s LIMIT {_PURGE_CHUNK_ROWS}", (before,))
+        deleted += cursor.rowcount
+        conn.commit()
+        if cursor.rowcount < _PURGE_CHUNK_ROWS:
+            return deleted
+
+def _delete_unreferenced_sql_texts(conn, cursor) -> int:
+    """
+    按主键顺序分批检查 sql_texts，删除已没有明细记录引用的语句，返回删除的行数。
+    调用方在清理前后使进程内的语句缓存失效；清理期间按缓存引用了语句的批次提交后会补写这些语句 (见 add_user_activities_batch)。
+    """
+    deleted, last_hash = 0, ''
+    while True:
+        cursor.execute("SELECT text_hash FROM sql_texts WHERE text_hash > %s ORDER BY text_hash LIMIT 1000", (last_hash,))
+        hashes = [row['text_hash'] for row in cursor.fetchall()]
+        if not hashes:
+            return deleted
+        last_hash = hashes[-1]
+        cursor.execute(
+            f"DELETE FROM sql_texts WHERE text_hash IN ({', '.join(['%s'] * len(hashes))}) "
+            "AND NOT EXISTS (SELECT 1 FROM user_activities ua WHERE ua.argument_hash = sql_texts.text_hash)", hashes)
+        deleted += cursor.rowcount
+        conn.commit()
+
+def maintain_activity_partitions(now: Optional[datetime] = None) -> Dict[str, Any]:
     """
+    维护 user_activities 的分区: 按 ACTIVITY_PARTITION_INTERVAL 预建到当前分区之后 ACTIVITY_PARTITION_AHEAD 个分区，
+    并删除上界不晚于保留期起点 (now - ACTIVITY_RETENTION_DAYS) 的分区。删除分区只修改表结构，耗时与其中的记录数无关。
+    删除分区后，activity_rollup_hourly、sql_digest_summary 中早于已删除分区上界的小时和在此之前开始的报表快照随之删除，
+    不再被引用的 sql_texts 也被清理，统计和报表与保留的明细一致。
+    未分区的表不做处理。多个进程同时执行时通过 GET_LOCK 保证只有一个进程修改表结构。
+    返回 {'partitioned', 'created', 'dropped', 'purged'}，purged 为各表删除的行数；数据库出错时抛出异常。
+    """
+    interval = APP_CONFIG.get('ACTIVITY_PARTITION_INTERVAL')
+    retention_days = get_activity_retention_days()
+    now = (now or datetime.now(timezone.utc)).replace(tzinfo=None)
+    result = {'partitioned': False, 'created': [], 'dropped': [], 'purged': {}}
     conn = get_db_connection()
     if not conn:
-        logger.error("批量添加用户活动失败：无法连接数据库。")
-        return
+        raise RuntimeError("无法连接数据库")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK('mysql_log.partition_maintenance', 0) AS locked")
+            if not cursor.fetchone()['locked']:
+                logger.info("其他进程正在维护 user_activities 分区，跳过本次维护")
+                return result
+            try:
+                partitions = _get_activity_partitions(cursor)
+                if not partitions:
+                    return result
+                result['partitioned'] = True
+                bounds = [(name, upper) for name, upper, _ in partitions if upper is not None]
+                # 从 pmax 中拆分出未来的分区 (pmax 正常情况下为空，拆分几乎不移动数据)
+                if interval in ACTIVITY_PARTITION_INTERVALS and partitions[-1][0] == 'pmax':
+                    lower = bounds[-1][1] if bounds else _partition_floor(now, interval)
+                    ranges = _partition_ranges(lower, _partition_horizon(now, interval), interval)
+                    if ranges:
+                        definitions = [_partition_sql(name, upper) for name, upper in ranges] + [_PMAX_SQL]
+                        cursor.execute(f"ALTER TABLE user_activities REORGANIZE PARTITION pmax INTO ({', '.join(definitions)})")
+                        result['created'] = [name for name, _ in ranges]
+                # 删除整个分区都早于保留期的分区 (至少保留一个分区)
+                if retention_days and retention_days > 0:
+                    cutoff = now - timedelta(days=retention_days)
+                    expired = [(name, upper) for name, upper in bounds if upper <= cutoff][:len(partitions) - 1]
+                    if expired:
+                        cursor.execute(f"ALTER TABLE user_activities DROP PARTITION {', '.join(name for name, _ in expired)}")
+                        result['dropped'] = [name for name, _ in expired]
+                        # 剩余明细中最早的记录不早于最后一个被删除分区的上界
+                        purged_before = expired[-1][1]
+                        for table, column in _RETENTION_TABLES:
+                            result['purged'][table] = _delete_before(conn, cursor, table, column, purged_before)
+                        _sql_text_cache.invalidate()  # 递增 generation，清理期间按缓存引用语句的批次会补写
+                        result['purged']['sql_texts'] = _delete_unreferenced_sql_texts(conn, cursor)
+            finally:
+                cursor.execute("DO RELEASE_LOCK('mysql_log.partition_maintenance')")
+        if result['dropped']:
+            _activity_count_cache.invalidate()
+            _breakdown_cache.invalidate()
+            _sql_text_cache.invalidate()
+        if result['created'] or result['dropped']:
+            logger.info(f"user_activities 分区维护完成: 新建 {result['created']}，删除 {result['dropped']}，清理 {result['purged']}")
+        return result
+    finally:
+        conn.close()
 
-    data_to_insert = []
+# --- 数据操作函数 ---
+
+def add_user_activity(activity_data: dict):
+    """将单条用户活动记录添加到数据库 (调用批量版本)"""
+    add_user_activities_batch([activity_data])
+
+# 写入 user_activities 的列 (顺序与行元组一致)
+ACTIVITY_COLUMNS = ('server_id', 'timestamp', 'user_name', 'client_host', 'db_name', 'thread_id',
+                    'command_type', 'operation_type', 'argument', 'risk_level', 'argument_hash', 'user_id', 'host_id', 'db_id')
+# 批量写入方式: executemany (默认)、multi_values (按包大小拼接多行 INSERT)、load_data (LOAD DATA LOCAL INFILE)
+WRITER_MODES = ('executemany', 'multi_values', 'load_data')
+_ACTIVITY_COLUMNS_SQL = ', '.join(f'`{column}`' for column in ACTIVITY_COLUMNS)
+# LOAD DATA 文本格式中需要转义的字符
+_LOAD_DATA_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+def _activity_rows(activities: List[Dict[str, Any]]) -> List[tuple]:
+    """将活动记录字典转换为按 ACTIVITY_COLUMNS 排列的行元组，跳过无效数据"""
+    rows = []
     for activity_data in activities:
         if isinstance(activity_data, dict):
-            data_to_insert.append((
+            rows.append((
                 activity_data.get('server_id'),
                 activity_data.get('timestamp'),
                 activity_data.get('user_name'),
@@ -275,24 +736,345 @@ def add_user_activities_batch(activities: List[Dict[str, Any]]):
                 activity_data.get('command_type'),
                 activity_data.get('operation_type'),
                 activity_data.get('argument'),
-                activity_data.get('risk_level', 'Low')
+                activity_data.get('risk_level', 'Low'),
+                activity_data.get('argument_hash'),
+                None, None, None
             ))
         else:
             logger.warning(f"批量插入时发现无效的活动数据 (非字典): {activity_data}")
+    return rows
+
+# --- 维度表 ---
+# 维度名 -> (维度表, user_activities 中的名称列, ID 列, 维度表 name 列的长度)
+DIMENSIONS = {
+    'user': ('dim_users', 'user_name', 'user_id', 100),
+    'host': ('dim_hosts', 'client_host', 'host_id', 255),
+    'db': ('dim_databases', 'db_name', 'db_id', 100),
+}
+# 进程内的名称 <-> ID 字典。维度表中的名称和 ID 写入后不再变化，缓存不会过期；条目数超过 DIMENSION_CACHE_SIZE 时清空重建
+# 名称 -> ID 字典的键是日志中的原始名称，值为 None 表示该名称无法写入维度表 (记录保留名称列)，之后的批次不再查询
+_dimension_ids = {dimension: {} for dimension in DIMENSIONS}
+_dimension_names = {dimension: {} for dimension in DIMENSIONS}
+_dimension_lock = threading.Lock()
+
+def _cache_dimension(dimension: str, pairs: List[tuple], aliases: Dict[str, Optional[int]] = None):
+    """pairs 为维度表中的 (名称, ID)；aliases 为日志中的原始名称 -> ID (可能与维度表中的名称不同)"""
+    aliases = aliases or {}
+    with _dimension_lock:
+        ids, names = _dimension_ids[dimension], _dimension_names[dimension]
+        if len(ids) + len(pairs) + len(aliases) > APP_CONFIG.get('DIMENSION_CACHE_SIZE', 100000):
+            ids.clear(); names.clear()
+        for name, dim_id in pairs:
+            ids[name] = dim_id
+            names[dim_id] = name
+        ids.update(aliases)
+
+def _dimension_key(name: str, name_length: int) -> str:
+    """
+    按 MySQL 的方式比较维度名称: 超出列长度的部分在写入时被截断，utf8mb4_bin 排序规则 (PAD SPACE) 比较时忽略末尾空格。
+    键相同的名称在维度表中是同一行。
+    """
+    return name[:name_length].rstrip(' ')
+
+def _get_dimension_ids(conn, dimension: str, names, create: bool = True) -> Dict[str, Optional[int]]:
+    """
+    名称 -> ID。缓存中没有的名称查询维度表；create 为 True 时先用 INSERT IGNORE 写入不存在的名称并立即提交，
+    之后调用方的事务回滚也不影响已缓存的 ID。
+    超长或带末尾空格的名称按 _dimension_key 与维度表中的名称对应；仍然没有取到 ID 的名称 (值为 None) 也会缓存，
+    避免之后每个批次都重复写入、查询和提交。
+    """
+    table, _, _, name_length = DIMENSIONS[dimension]
+    cached = _dimension_ids[dimension]
+    result, missing = {}, {}
+    for name in set(names):
+        if name in cached: result[name] = cached[name]
+        else: missing.setdefault(_dimension_key(name, name_length), []).append(name)
+    if not missing:
+        return result
+    keys = sorted(missing)  # 按唯一键顺序写入，减少并发写入之间的锁等待
+    found = []
+    with conn.cursor() as cursor:
+        if create:
+            cursor.executemany(f"INSERT IGNORE INTO {table} (name) VALUES (%s)",
+                               [(min(missing[key])[:name_length],) for key in keys])
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            cursor.execute(f"SELECT id, name FROM {table} WHERE name IN ({', '.join(['%s'] * len(chunk))})", chunk)
+            found.extend((row['name'], row['id']) for row in cursor.fetchall())
+    if create:
+        conn.commit()
+    found_ids = {_dimension_key(name, name_length): dim_id for name, dim_id in found}
+    aliases = {name: found_ids.get(key) for key, group in missing.items() for name in group}
+    unresolved = [name for name, dim_id in aliases.items() if dim_id is None]
+    if unresolved and create:
+        logger.warning(f"{len(unresolved)} 个名称未能写入维度表 {table}，这些记录将保留名称列: {unresolved[:5]}")
+    elif not create:
+        # 只查询不写入时没有找到的名称可能稍后才写入，不缓存
+        aliases = {name: dim_id for name, dim_id in aliases.items() if dim_id is not None}
+    _cache_dimension(dimension, found, aliases)
+    result.update(aliases)
+    return result
+
+def _get_dimension_names(conn, dimension: str, ids) -> Dict[int, str]:
+    """ID -> 名称，缓存中没有的 ID 查询维度表"""
+    cached = _dimension_names[dimension]
+    result, missing = {}, []
+    for dim_id in set(ids):
+        name = cached.get(dim_id)
+        if name is None: missing.append(dim_id)
+        else: result[dim_id] = name
+    if missing:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT id, name FROM {DIMENSIONS[dimension][0]} WHERE id IN ({', '.join(['%s'] * len(missing))})", missing)
+            found = [(row['name'], row['id']) for row in cursor.fetchall()]
+        _cache_dimension(dimension, found)
+        result.update((dim_id, name) for name, dim_id in found)
+    return result
+
+def _apply_dimension_ids(conn, rows: List[tuple], dimensions=tuple(DIMENSIONS)) -> List[tuple]:
+    """将行中 dimensions 对应的名称 (默认为用户名、客户端主机、数据库名) 替换为维度表 ID (名称列置为 NULL)；没有取到 ID 的名称保持原样"""
+    positions = [(dimension, ACTIVITY_COLUMNS.index(DIMENSIONS[dimension][1]), ACTIVITY_COLUMNS.index(DIMENSIONS[dimension][2]))
+                 for dimension in dimensions]
+    ids = {dimension: _get_dimension_ids(conn, dimension, {row[name_pos] for row in rows if row[name_pos]})
+           for dimension, name_pos, _ in positions}
+    result = []
+    for row in rows:
+        values = list(row)
+        for dimension, name_pos, id_pos in positions:
+            dim_id = ids[dimension].get(row[name_pos]) if row[name_pos] else None
+            if dim_id is not None:
+                values[name_pos], values[id_pos] = None, dim_id
+        result.append(tuple(values))
+    return result
+
+def _insert_executemany(conn, rows: List[tuple]):
+    """使用 executemany 写入 (pymysql 会将其改写为多行 INSERT，语句长度上限为 1MB)"""
+    sql = f"INSERT INTO user_activities ({_ACTIVITY_COLUMNS_SQL}) VALUES ({', '.join(['%s'] * len(ACTIVITY_COLUMNS))})"
+    with conn.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+_max_allowed_packet = None
+
+def _max_statement_length(conn) -> int:
+    """根据服务器的 max_allowed_packet (首次查询后缓存) 确定单条语句的最大长度，留出余量"""
+    global _max_allowed_packet
+    if _max_allowed_packet is None:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT @@max_allowed_packet AS packet")
+            _max_allowed_packet = int(cursor.fetchone()['packet'])
+    return max(64 * 1024, min(_max_allowed_packet, APP_CONFIG.get('MULTI_VALUES_MAX_BYTES', 16 * 1024 * 1024)) - 1024)
+
+def _insert_multi_values(conn, rows: List[tuple]):
+    """拼接多行 INSERT ... VALUES (...),(...)，每条语句不超过 max_allowed_packet"""
+    prefix = f"INSERT INTO user_activities ({_ACTIVITY_COLUMNS_SQL}) VALUES "
+    max_length = _max_statement_length(conn) - len(prefix)
+    with conn.cursor() as cursor:
+        values, length = [], 0
+        for row in rows:
+            value = '(' + ','.join(conn.escape(item) for item in row) + ')'
+            if values and length + len(value) + 1 > max_length:
+                cursor.execute(prefix + ','.join(values))
+                values, length = [], 0
+            values.append(value); length += len(value) + 1
+        if values:
+            cursor.execute(prefix + ','.join(values))
+
+def _load_data_field(value) -> str:
+    """将字段值转换为 LOAD DATA 默认文本格式 (制表符分隔，\\N 表示 NULL)"""
+    if value is None: return '\\N'
+    if isinstance(value, datetime): return value.strftime('%Y-%m-%d %H:%M:%S.%f')
+    return str(value).translate(_LOAD_DATA_ESCAPES)
+
+def _insert_load_data(conn, rows: List[tuple]):
+    """将批次写入临时文件后通过 LOAD DATA LOCAL INFILE 导入 (需要客户端和服务器均开启 local_infile)"""
+    if not APP_CONFIG.get('DB_LOCAL_INFILE', False):
+        raise RuntimeError("未开启 DB_LOCAL_INFILE，无法使用 load_data 写入方式")
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='\n', suffix='.tsv', delete=False) as tmp:
+        for row in rows:
+            tmp.write('\t'.join(_load_data_field(value) for value in row)); tmp.write('\n')
+        tmp_path = tmp.name
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "LOAD DATA LOCAL INFILE %s INTO TABLE user_activities CHARACTER SET utf8mb4 "
+                "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                f"({_ACTIVITY_COLUMNS_SQL})", (tmp_path,))
+    finally:
+        os.remove(tmp_path)
+
+_WRITERS = {'executemany': _insert_executemany, 'multi_values': _insert_multi_values, 'load_data': _insert_load_data}
+
+# 预聚合表、指纹汇总表的主键。用户按维度表 ID 汇总，user_name 只在 user_id 为 0 (没有取到 ID) 时保存用户名，读取时按 ID 补全名称
+ROLLUP_KEY_COLUMNS = ['server_id', 'hour', 'user_id', 'user_name', 'operation_type', 'risk_level']
+DIGEST_KEY_COLUMNS = ['server_id', 'hour', 'user_id', 'user_name', 'digest']
+
+def _update_activity_rollup(conn, rows: List[tuple]):
+    """将一批行按 (服务器, 小时, 用户, 操作类型, 风险等级) 汇总后累加到 activity_rollup_hourly (与明细写入同一事务)"""
+    counts = {}
+    for row in rows:
+        timestamp = row[1]
+        if timestamp is None: continue
+        key = (row[0], timestamp.replace(minute=0, second=0, microsecond=0, tzinfo=None), row[11] or 0, row[2] or '', row[7] or '', row[9] or 'Low')
+        counts[key] = counts.get(key, 0) + 1
+    if not counts: return
+    # 按主键顺序写入，减少并发扫描之间的锁等待
+    values = [key + (count,) for key, count in sorted(counts.items())]
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO activity_rollup_hourly (server_id, `hour`, user_id, user_name, operation_type, risk_level, `count`) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE `count` = `count` + VALUES(`count`)", values)
+
+def _delete_report_snapshots(conn, rows: List[tuple]):
+    """删除时间范围覆盖这批记录的报表快照 (与明细写入同一事务；回填历史数据后快照在下次请求时重新生成)"""
+    timestamps = [row[1].replace(tzinfo=None) for row in rows if row[1] is not None]
+    if not timestamps: return
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM report_snapshots WHERE period_start <= %s AND period_end > %s", (max(timestamps), min(timestamps)))
 
+# 各风险等级的存储方式: full (逐条写入 user_activities)、aggregate (只按 SQL 指纹汇总到 sql_digest_summary)
+STORAGE_MODES = ('full', 'aggregate')
+
+def get_risk_level_storage() -> Dict[str, str]:
+    """各风险等级的存储方式：系统设置 RISK_LEVEL_STORAGE 优先，其次为 APP_CONFIG 默认值，均未配置的等级为 full"""
+    storage = {level: 'full' for level in ('High', 'Medium', 'Low')}
+    storage.update(APP_CONFIG.get('RISK_LEVEL_STORAGE', {}))
+    stored = get_system_setting('RISK_LEVEL_STORAGE')
+    if isinstance(stored, dict):
+        storage.update({level.capitalize(): mode for level, mode in stored.items() if mode in STORAGE_MODES})
+    return storage
+
+def _update_digest_summary(conn, rows: List[tuple]):
+    """将一批行按 (服务器, 小时, 用户, SQL 指纹) 汇总后累加到 sql_digest_summary，样例语句保留首次写入的那条"""
+    summary = {}
+    for row in rows:
+        timestamp = row[1]
+        if timestamp is None: continue
+        timestamp = timestamp.replace(tzinfo=None)
+        argument = row[8] or ''
+        key = (row[0], timestamp.replace(minute=0, second=0, microsecond=0), row[11] or 0, row[2] or '', sql_digest(argument))
+        entry = summary.get(key)
+        if entry is None:
+            summary[key] = [row[7], row[9] or 'Low', argument, 1, timestamp, timestamp]
+        else:
+            entry[3] += 1
+            if timestamp < entry[4]: entry[4] = timestamp
+            if timestamp > entry[5]: entry[5] = timestamp
+    if not summary: return
+    values = [key + tuple(entry) for key, entry in sorted(summary.items())]
+    with conn.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO sql_digest_summary (server_id, `hour`, user_id, user_name, digest, operation_type, risk_level, sample_text, `count`, first_seen, last_seen) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE `count` = `count` + VALUES(`count`), "
+            "first_seen = LEAST(first_seen, VALUES(first_seen)), last_seen = GREATEST(last_seen, VALUES(last_seen))", values)
+
+# 最近写入过 sql_texts 的语句哈希 (LRU)，命中时直接引用，不查询也不写入。
+# 保留期清理 (maintain_activity_partitions) 会使本进程的缓存失效；其他进程中的条目在 SQL_TEXT_CACHE_TTL 秒后过期
+_sql_text_cache = TTLCache(maxsize=APP_CONFIG.get('SQL_TEXT_CACHE_SIZE', 100000), ttl=APP_CONFIG.get('SQL_TEXT_CACHE_TTL', 3600))
+
+def _dedupe_sql_texts(conn, rows: List[tuple]):
+    """
+    将长度不小于 SQL_TEXT_DEDUP_MIN_LENGTH 的语句替换为 sql_texts 中的引用 (argument 为 NULL，argument_hash 为语句哈希)，
+    缓存中没有的语句用 INSERT IGNORE 写入 sql_texts，缓存命中的语句直接引用，不访问数据库。
+    返回 (替换后的行, 本批写入的 {哈希: 字节数}, 按缓存引用的 {哈希: (语句, 字节数)}, 以引用代替的语句字节数)。
+    """
+    min_length = APP_CONFIG.get('SQL_TEXT_DEDUP_MIN_LENGTH', 64)
+    new_texts, cached_texts = {}, {}
+    referenced_bytes = 0
+    result = []
+    for row in rows:
+        argument = row[8]
+        if argument is None or len(argument) < min_length:
+            result.append(row)
+            continue
+        data = argument.encode('utf-8')
+        text_hash = hashlib.blake2b(data, digest_size=16).hexdigest()
+        if text_hash not in new_texts and text_hash not in cached_texts:
+            (new_texts if _sql_text_cache.get(text_hash) is MISSING else cached_texts)[text_hash] = (argument, len(data))
+        referenced_bytes += len(data)
+        result.append(row[:8] + (None, row[9], text_hash) + row[11:])
+    if new_texts:
+        _insert_sql_texts(conn, new_texts)
+    return result, {text_hash: length for text_hash, (_, length) in new_texts.items()}, cached_texts, referenced_bytes
+
+def _insert_sql_texts(conn, texts: Dict[str, tuple]):
+    """按哈希顺序用 INSERT IGNORE 写入 {哈希: (语句, 字节数)}"""
+    with conn.cursor() as cursor:
+        cursor.executemany("INSERT IGNORE INTO sql_texts (text_hash, sql_text, text_length) VALUES (%s, %s, %s)",
+                           [(text_hash, text, length) for text_hash, (text, length) in sorted(texts.items())])
+
+def add_user_activities_batch(activities: List[Dict[str, Any]], writer_mode: Optional[str] = None,
+                              storage_modes: Optional[Dict[str, str]] = None) -> bool:
+    """
+    将一批用户活动记录批量添加到数据库，返回是否成功 (没有需要写入的数据也视为成功)。
+    writer_mode 为写入方式 (见 WRITER_MODES)，未指定时使用 APP_CONFIG['WRITER_MODE']。
+    storage_modes 为各风险等级的存储方式 (见 STORAGE_MODES)，未指定时使用 get_risk_level_storage()；
+    存储方式为 aggregate 的记录不写入明细表和 activity_rollup_hourly，只汇总到 sql_digest_summary (统计时按小时计入，见 get_activity_breakdown)。
+    SQL_TEXT_DEDUP_ENABLED 开启时，明细中较长的语句去重存储到 sql_texts (见 _dedupe_sql_texts)；
+    DIMENSION_KEYS_ENABLED 开启时，明细中的用户名、客户端主机、数据库名以维度表 ID 保存 (见 _apply_dimension_ids)。
+    """
+    if not activities:
+        return True
+    writer_mode = writer_mode or APP_CONFIG.get('WRITER_MODE', 'executemany')
+    writer = _WRITERS.get(writer_mode)
+    if writer is None:
+        logger.error(f"批量添加用户活动失败：未知的写入方式 {writer_mode}")
+        return False
+
+    data_to_insert = _activity_rows(activities)
     if not data_to_insert:
         logger.warning("批量插入调用时没有有效的活动数据。")
-        if conn: conn.close() # 关闭连接如果无数据插入
-        return
+        return True
+
+    storage_modes = storage_modes if storage_modes is not None else get_risk_level_storage()
+    detail_rows, aggregate_rows = data_to_insert, []
+    if 'aggregate' in storage_modes.values():
+        detail_rows = []
+        for row in data_to_insert:
+            (aggregate_rows if storage_modes.get(row[9] or 'Low', 'full') == 'aggregate' else detail_rows).append(row)
+
+    conn = get_db_connection()
+    if not conn:
+        logger.error("批量添加用户活动失败：无法连接数据库。")
+        return False
 
+    started = time.perf_counter()
+    BATCH_INSERT_ROWS.observe(len(data_to_insert), writer_mode=writer_mode)
+    new_texts, cached_texts, referenced_bytes = {}, {}, 0
+    text_generation = _sql_text_cache.generation
     try:
-        with conn.cursor() as cursor:
-            cursor.executemany(sql, data_to_insert)
-            conn.commit()
-            logger.info(f"成功批量插入 {len(data_to_insert)} 条活动记录。")
+        if APP_CONFIG.get('DIMENSION_KEYS_ENABLED', True):
+            if detail_rows: detail_rows = _apply_dimension_ids(conn, detail_rows)
+            # 只汇总到 sql_digest_summary 的行同样按用户 ID 汇总
+            if aggregate_rows: aggregate_rows = _apply_dimension_ids(conn, aggregate_rows, ('user',))
+        rollup_rows = detail_rows  # 去重 SQL 语句之前的行
+        if detail_rows and APP_CONFIG.get('SQL_TEXT_DEDUP_ENABLED', True):
+            detail_rows, new_texts, cached_texts, referenced_bytes = _dedupe_sql_texts(conn, detail_rows)
+        if detail_rows: writer(conn, detail_rows)
+        if aggregate_rows: _update_digest_summary(conn, aggregate_rows)
+        _update_activity_rollup(conn, rollup_rows)
+        _delete_report_snapshots(conn, data_to_insert)
+        conn.commit()
+        _invalidate_stats_cache(rollup_rows, aggregate_rows)
+        # 提交成功后才记入缓存，回滚的批次不会留下缓存中有、数据库中没有的语句
+        for text_hash in new_texts: _sql_text_cache.set(text_hash, True)
+        if cached_texts and _sql_text_cache.generation != text_generation:
+            # 本批写入期间执行过保留期清理，按缓存引用的语句可能已被删除；明细已提交 (之后的清理不会再删除)，补写即可。
+            # 明细已经提交，补写失败不影响本批的结果
+            try:
+                _insert_sql_texts(conn, cached_texts)
+                conn.commit()
+            except Exception as e:
+                logger.error(f"补写保留期清理期间引用的 {len(cached_texts)} 条 SQL 语句失败: {e}")
+        if referenced_bytes: SQL_TEXT_BYTES.inc(referenced_bytes, kind='referenced')
+        if new_texts: SQL_TEXT_BYTES.inc(sum(new_texts.values()), kind='stored')
+        BATCH_INSERT_SECONDS.observe(time.perf_counter() - started, writer_mode=writer_mode, status='success')
+        logger.info(f"成功批量插入 {len(detail_rows)} 条活动记录 ({writer_mode})" + (f"，{len(aggregate_rows)} 条按 SQL 指纹汇总。" if aggregate_rows else "。"))
+        return True
     except Exception as e:
-        logger.error(f"批量插入活动记录到数据库时出错: {e}")
+        BATCH_INSERT_SECONDS.observe(time.perf_counter() - started, writer_mode=writer_mode, status='failed')
+        logger.error(f"批量插入活动记录到数据库时出错 ({writer_mode}): {e}")
         conn.rollback()
+        return False
     finally:
         if conn:
             conn.close()
@@ -355,122 +1137,663 @@ def update_last_scan_time(server_id: int, scan_time: datetime):
         if conn:
             conn.close()
 
-def get_user_activities(server_id=None, start_date=None, end_date=None, operation_type=None, risk_level=None, user_name=None, limit=1000, offset=0):
-    """根据筛选条件获取用户活动记录列表"""
+def get_file_checkpoints(server_id: int) -> Dict[str, Dict[str, Any]]:
+    """获取指定服务器所有日志文件的读取检查点，返回 {file_path: checkpoint}"""
+    if server_id is None:
+        return {}
+    sql = """
+    SELECT file_path, inode, file_size, byte_offset, decompressed_offset, last_timestamp
+    FROM log_file_checkpoints WHERE server_id = %s
+    """
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    checkpoints = {}
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, (server_id,))
+            for row in cursor.fetchall():
+                last_ts = row['last_timestamp']
+                checkpoints[row['file_path']] = {
+                    'inode': row['inode'],
+                    'file_size': row['file_size'],
+                    'byte_offset': row['byte_offset'],
+                    'decompressed_offset': row['decompressed_offset'],
+                    'last_timestamp': last_ts.replace(tzinfo=timezone.utc) if last_ts else None
+                }
+        logger.debug(f"获取到服务器 {server_id} 的 {len(checkpoints)} 个文件检查点。")
+    except Exception as e:
+        logger.error(f"获取服务器 {server_id} 文件检查点时出错: {e}")
+    finally:
+        if conn:
+            conn.close()
+    return checkpoints
+
+def update_file_checkpoint(server_id: int, file_path: str, inode: Optional[int], file_size: int, byte_offset: int, last_timestamp: Optional[datetime] = None,
+                           decompressed_offset: Optional[int] = None):
+    """
+    更新或插入指定服务器某个日志文件的读取检查点 (时间均按 UTC 存储)。
+    decompressed_offset 仅用于压缩日志，记录解压后数据流中已处理的位置 (见 compressed_logs)。
+    """
+    if server_id is None or not file_path:
+        return
+    if last_timestamp is not None and last_timestamp.tzinfo is not None:
+        last_timestamp = last_timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    sql = """
+    INSERT INTO log_file_checkpoints (server_id, file_path, inode, file_size, byte_offset, decompressed_offset, last_timestamp, updated_at)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE inode = VALUES(inode), file_size = VALUES(file_size), byte_offset = VALUES(byte_offset),
+        decompressed_offset = VALUES(decompressed_offset),
+        last_timestamp = COALESCE(VALUES(last_timestamp), last_timestamp), updated_at = VALUES(updated_at)
+    """
+    conn = get_db_connection()
+    if not conn:
+        logger.error(f"更新服务器 {server_id} 文件检查点失败：无法连接数据库。")
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(sql, (server_id, file_path, inode, file_size, byte_offset, decompressed_offset, last_timestamp, now))
+        conn.commit()
+        logger.info(f"服务器 {server_id} 文件 {file_path} 检查点已更新: offset={byte_offset}, size={file_size}, inode={inode}")
+    except Exception as e:
+        logger.error(f"更新服务器 {server_id} 文件 {file_path} 检查点时出错: {e}")
+        conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+def delete_stale_file_checkpoints(server_id: int, existing_paths: List[str]):
+    """删除目录中已不存在的日志文件的检查点"""
+    if server_id is None:
+        return
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        with conn.cursor() as cursor:
+            if existing_paths:
+                placeholders = ", ".join(["%s"] * len(existing_paths))
+                cursor.execute(
+                    f"DELETE FROM log_file_checkpoints WHERE server_id = %s AND file_path NOT IN ({placeholders})",
+                    [server_id] + list(existing_paths)
+                )
+            else:
+                cursor.execute('DELETE FROM log_file_checkpoints WHERE server_id = %s', (server_id,))
+            removed = cursor.rowcount
+        conn.commit()
+        if removed:
+            logger.info(f"已删除服务器 {server_id} 的 {removed} 个过期文件检查点。")
+    except Exception as e:
+        logger.error(f"删除服务器 {server_id} 过期文件检查点时出错: {e}")
+        conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+
+def _session_cutoff(ttl_seconds: Optional[float]) -> Optional[datetime]:
+    """会话过期时间点 (UTC naive)，ttl_seconds 为空或非正数时不过期"""
+    if not ttl_seconds or ttl_seconds <= 0:
+        return None
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=ttl_seconds)
+
+def get_thread_sessions(server_id: int, ttl_seconds: Optional[float] = None) -> Dict[int, Dict[str, Any]]:
+    """
+    读取上次扫描结束时保存的线程会话，返回 {thread_id: {'user', 'host', 'db', 'last_seen'}}，
+    last_seen 为日志时间戳格式的字符串。超过 ttl_seconds 未出现的会话视为已断开 (未记录 Quit)，不再返回并从表中删除。
+    """
+    if server_id is None:
+        return {}
+    conn = get_db_connection()
+    if not conn:
+        return {}
+    sessions = {}
+    try:
+        cutoff = _session_cutoff(ttl_seconds)
+        with conn.cursor() as cursor:
+            if cutoff is not None:
+                cursor.execute('DELETE FROM thread_sessions WHERE server_id = %s AND last_seen < %s', (server_id, cutoff))
+                if cursor.rowcount:
+                    logger.info(f"服务器 {server_id} 有 {cursor.rowcount} 个线程会话已过期。")
+            cursor.execute('SELECT thread_id, user_name, client_host, db_name, last_seen FROM thread_sessions WHERE server_id = %s', (server_id,))
+            for row in cursor.fetchall():
+                sessions[row['thread_id']] = {
+                    'user': row['user_name'] or 'unknown',
+                    'host': row['client_host'] or 'unknown',
+                    'db': row['db_name'],
+                    'last_seen': row['last_seen'].strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                }
+        conn.commit()
+        logger.debug(f"恢复服务器 {server_id} 的 {len(sessions)} 个线程会话。")
+    except Exception as e:
+        logger.error(f"读取服务器 {server_id} 线程会话时出错: {e}")
+        conn.rollback()
+    finally:
+        if conn:
+            conn.close()
+    return sessions
+
+def save_thread_sessions(server_id: int, sessions: Dict[int, Dict[str, Any]], ttl_seconds: Optional[float] = None) -> bool:
+    """用当前的线程会话整体替换服务器已保存的会话 (超过 ttl_seconds 未出现的会话不保存)"""
+    if server_id is None:
+        return False
+    cutoff = _session_cutoff(ttl_seconds)
+    rows = []
+    for thread_id, session in sessions.items():
+        last_seen_str = session.get('last_seen')
+        try:
+            last_seen = datetime.strptime(last_seen_str, '%Y-%m-%dT%H:%M:%S.%fZ') if last_seen_str else None
+        except ValueError:
+            last_seen = None
+        if last_seen is None or (cutoff is not None and last_seen < cutoff):
+            continue
+        rows.append((server_id, thread_id, session.get('user'), session.get('host'), session.get('db'), last_seen))
+    conn = get_db_connection()
+    if not conn:
+        logger.error(f"保存服务器 {server_id} 线程会话失败：无法连接数据库。")
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute('DELETE FROM thread_sessions WHERE server_id = %s', (server_id,))
+            if rows:
+                cursor.executemany(
+                    'INSERT INTO thread_sessions (server_id, thread_id, user_name, client_host, db_name, last_seen) VALUES (%s, %s, %s, %s, %s, %s)',
+                    rows)
+        conn.commit()
+        logger.info(f"已保存服务器 {server_id} 的 {len(rows)} 个线程会话。")
+        return True
+    except Exception as e:
+        logger.error(f"保存服务器 {server_id} 线程会话时出错: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn:
+            conn.close()
+
+# 读取明细时关联维度表和 sql_texts，取回名称和语句原文 (旧记录直接使用名称列)
+_ACTIVITY_NAME_COLUMNS_SQL = ("COALESCE(ua.user_name, du.name) AS user_name, COALESCE(ua.client_host, dh.name) AS client_host, "
+                              "COALESCE(ua.db_name, dd.name) AS db_name")
+_ACTIVITY_JOINS_SQL = ("LEFT JOIN dim_users du ON du.id = ua.user_id LEFT JOIN dim_hosts dh ON dh.id = ua.host_id "
+                       "LEFT JOIN dim_databases dd ON dd.id = ua.db_id LEFT JOIN sql_texts st ON st.text_hash = ua.argument_hash")
+
+# 记录总数缓存：相同筛选条件下翻页不再重复 COUNT(*)
+_activity_count_cache = TTLCache(maxsize=256, ttl=APP_CONFIG.get('ACTIVITY_COUNT_CACHE_TTL', 60))
+# 记录总数的计算方式: exact (精确，按筛选条件缓存)、approx (根据 EXPLAIN 估算)、none (不计算)
+COUNT_MODES = ('exact', 'approx', 'none')
+
+def encode_activity_cursor(activity_time: datetime, activity_id: int) -> str:
+    """将 (timestamp, id) 编码为不透明的分页游标"""
+    raw = f"{activity_time.strftime('%Y-%m-%d %H:%M:%S.%f')}|{activity_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_activity_cursor(cursor: str):
+    """解析分页游标，返回 (timestamp, id)；格式无效时抛出 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8')
+        time_str, id_str = raw.rsplit('|', 1)
+        return datetime.strptime(time_str, '%Y-%m-%d %H:%M:%S.%f'), int(id_str)
+    except Exception as e:
+        raise ValueError(f"无效的分页游标: {cursor}") from e
+
+def _count_activities(cursor, where_sql: str, params: List[Any], count_mode: str):
+    """按 count_mode 计算记录总数，返回 (total, 是否为估算值)"""
+    if count_mode == 'none':
+        return None, False
+    if count_mode == 'approx':
+        # 使用优化器的行数估算，不扫描数据。只取 ua 的计划行 (用户名筛选的子查询会带出 dim_users 的行)，
+        # rows 为按索引访问的行数，再乘以其余条件的过滤比例 filtered
+        cursor.execute(f"EXPLAIN SELECT ua.id FROM user_activities ua WHERE {where_sql}", params)
+        row = next((row for row in cursor.fetchall() if row.get('table') == 'ua'), None)
+        if row is None:
+            return 0, True
+        estimate = float(row.get('rows') or 0)
+        if row.get('filtered') is not None:
+            estimate *= float(row['filtered']) / 100
+        return int(round(estimate)), True
+    cache_key = (where_sql, tuple(params))
+    total = _activity_count_cache.get(cache_key)
+    if total is MISSING:
+        cursor.execute(f"SELECT COUNT(*) as total FROM user_activities ua WHERE {where_sql}", params)
+        count_result = cursor.fetchone()
+        total = count_result['total'] if count_result else 0
+        _activity_count_cache.set(cache_key, total)
+    return total, False
+
+def get_user_activities(server_id=None, start_date=None, end_date=None, operation_type=None, risk_level=None, user_name=None,
+                        limit=50, cursor=None, direction='next', count_mode='exact') -> Dict[str, Any]:
+    """
+    根据筛选条件分页获取用户活动记录，按 (timestamp, id) 倒序排列，使用游标 (keyset) 分页而不是 OFFSET，翻到深页也不会变慢。
+    cursor 为上一次返回的 next_cursor / prev_cursor，direction 为 'next' (更早的记录) 或 'prev' (更新的记录)。
+    返回 {'activities', 'total', 'total_approximate', 'next_cursor', 'prev_cursor'}，没有下一页/上一页时对应游标为 None。
+    """
+    page = {'activities': [], 'total': 0, 'total_approximate': False, 'next_cursor': None, 'prev_cursor': None}
     conn = get_db_connection()
     if not conn:
         logger.error("获取用户活动失败：无法连接数据库。")
-        return [], 0
+        return page
     try:
         where_clauses = []
         params = []
         if server_id:
-            where_clauses.append("server_id = %s")
+            where_clauses.append("ua.server_id = %s")
             params.append(server_id)
         if start_date:
-            where_clauses.append("`timestamp` >= %s")
+            where_clauses.append("ua.`timestamp` >= %s")
             params.append(start_date)
         if end_date:
-            where_clauses.append("`timestamp` <= %s")
+            where_clauses.append("ua.`timestamp` <= %s")
             params.append(end_date)
         if operation_type:
-            where_clauses.append("operation_type = %s")
+            where_clauses.append("ua.operation_type = %s")
             params.append(operation_type)
         if risk_level:
-            where_clauses.append("risk_level = %s")
+            where_clauses.append("ua.risk_level = %s")
             params.append(risk_level)
         if user_name:
-            where_clauses.append("user_name LIKE %s")
-            params.append(f"%{user_name}%")
-
+            # 旧记录保存用户名，新记录保存维度表 ID (维度表的名称区分大小写，匹配时按不区分大小写比较，与旧记录一致)
+            where_clauses.append("(ua.user_name LIKE %s OR ua.user_id IN (SELECT id FROM dim_users WHERE name LIKE %s COLLATE utf8mb4_general_ci))")
+            params.extend([f"%{user_name}%"] * 2)
         where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-        count_sql = f"SELECT COUNT(*) as total FROM user_activities WHERE {where_sql}"
+
+        # 游标条件: 'next' 取排在游标之后 (更早) 的记录，'prev' 取排在游标之前 (更新) 的记录
+        backward = direction == 'prev' and cursor is not None
+        page_where, page_params = where_sql, list(params)
+        if cursor:
+            cursor_time, cursor_id = decode_activity_cursor(cursor)
+            op = '>' if backward else '<'
+            # 单独的范围条件使分区表只访问游标一侧的分区
+            page_where += f" AND ua.`timestamp` {op}= %s AND (ua.`timestamp` {op} %s OR (ua.`timestamp` = %s AND ua.id {op} %s))"
+            page_params += [cursor_time, cursor_time, cursor_time, cursor_id]
+        order = 'ASC' if backward else 'DESC'
+        # 用户名等从维度表、去重存储的语句从 sql_texts 取回原文
         data_sql = f"""
-        SELECT id, server_id, `timestamp` as activity_time, user_name, client_host, db_name, thread_id, command_type, operation_type, argument, risk_level
-        FROM user_activities WHERE {where_sql} ORDER BY `timestamp` DESC LIMIT %s OFFSET %s
+        SELECT ua.id, ua.server_id, ua.`timestamp` as activity_time, {_ACTIVITY_NAME_COLUMNS_SQL}, ua.thread_id, ua.command_type,
+               ua.operation_type, COALESCE(ua.argument, st.sql_text) AS argument, ua.risk_level
+        FROM user_activities ua {_ACTIVITY_JOINS_SQL}
+        WHERE {page_where} ORDER BY ua.`timestamp` {order}, ua.id {order} LIMIT %s
         """
-        data_params = params + [limit, offset]
-        total = 0
-        results = []
 
-        with conn.cursor() as cursor:
-            cursor.execute(count_sql, params)
-            count_result = cursor.fetchone()
-            if count_result:
-                total = count_result['total']
-            if total > 0:
-                cursor.execute(data_sql, data_params)
-                results = cursor.fetchall()
-                results = list(results) if results else []
-        return results, total
+        with conn.cursor() as db_cursor:
+            page['total'], page['total_approximate'] = _count_activities(db_cursor, where_sql, params, count_mode)
+            db_cursor.execute(data_sql, page_params + [limit + 1])  # 多取一行用于判断是否还有更多记录
+            results = list(db_cursor.fetchall() or [])
+        has_more = len(results) > limit
+        results = results[:limit]
+        if backward:
+            results.reverse()
+        if results:
+            first, last = results[0], results[-1]
+            has_prev = has_more if backward else cursor is not None
+            has_next = True if backward else has_more
+            if has_next: page['next_cursor'] = encode_activity_cursor(last['activity_time'], last['id'])
+            if has_prev: page['prev_cursor'] = encode_activity_cursor(first['activity_time'], first['id'])
+        page['activities'] = results
+        return page
+    except ValueError:
+        raise
     except Exception as e:
         logger.error(f"获取用户活动记录时出错: {e}")
-        return [], 0
+        return page
     finally:
         if conn:
             conn.close()
 
-def get_operation_stats(server_id=None, start_date=None, end_date=None):
-    """获取操作统计信息"""
+def iter_user_activities(start_date=None, end_date=None, risk_levels=None, users=None, operation_types=None, server_id=None,
+                         chunk_size: int = 1000) -> Generator[Dict[str, Any], None, None]:
+    """
+    按时间顺序流式读取符合条件的活动记录 (服务器端游标，每次从网络读取 chunk_size 行)，内存占用与结果集大小无关。
+    生成器未读完就被关闭时，直接关闭数据库连接，不再读取剩余结果。
+    """
+    where_clauses = []
+    params = []
+    if server_id:
+        where_clauses.append("ua.server_id = %s")
+        params.append(server_id)
+    if start_date:
+        where_clauses.append("ua.`timestamp` >= %s")
+        params.append(start_date)
+    if end_date:
+        where_clauses.append("ua.`timestamp` <= %s")
+        params.append(end_date)
+    for column, values in (('ua.risk_level', risk_levels), ('ua.operation_type', operation_types)):
+        if values:
+            where_clauses.append(f"{column} IN ({', '.join(['%s'] * len(values))})")
+            params.extend(values)
+    if users:
+        placeholders = ', '.join(['%s'] * len(users))
+        where_clauses.append(f"(ua.user_name IN ({placeholders}) OR ua.user_id IN (SELECT id FROM dim_users WHERE name IN ({placeholders})))")
+        params.extend(list(users) * 2)
+    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    sql = f"""
+    SELECT ua.id, ua.server_id, COALESCE(ua.user_name, du.name) AS user_name, ua.`timestamp`, COALESCE(ua.client_host, dh.name) AS client_host,
+           COALESCE(ua.db_name, dd.name) AS db_name, ua.operation_type, ua.risk_level, COALESCE(ua.argument, st.sql_text) AS argument, ua.thread_id
+    FROM user_activities ua {_ACTIVITY_JOINS_SQL}
+    WHERE {where_sql} ORDER BY ua.`timestamp`, ua.id
+    """
     conn = get_db_connection()
     if not conn:
-        logger.error("获取统计信息失败：无法连接数据库。")
-        return {}
+        raise RuntimeError("无法连接数据库")
+    finished = False
     try:
-        where_clauses = []
-        params = []
-        if server_id:
-            where_clauses.append("server_id = %s")
-            params.append(server_id)
-        if start_date:
-            where_clauses.append("`timestamp` >= %s")
-            params.append(start_date)
-        if end_date:
-            where_clauses.append("`timestamp` <= %s")
-            params.append(end_date)
-        base_where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
-        stats = {}
+        # 不使用 with: 关闭未读完的 SSCursor 会先读完全部剩余结果
+        cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield from rows
+        cursor.close()
+        finished = True
+    finally:
+        if finished:
+            conn.close()
+        else:
+            conn.discard()
+
+def _split_hour_range(start_date: Optional[datetime], end_date: Optional[datetime]):
+    """
+    将 [start_date, end_date] (end_date 包含在内) 拆分为可由 activity_rollup_hourly 提供的整点小时区间 [hour_start, hour_end)，
+    以及首尾不足一小时、需要查询明细表的区间列表 [(开始, 结束)) 。None 表示不限。
+    """
+    end_exclusive = end_date + timedelta(microseconds=1) if end_date else None  # DATETIME(6) 精度下与 <= end_date 等价
+    hour_start = None
+    if start_date:
+        hour_start = start_date.replace(minute=0, second=0, microsecond=0)
+        if hour_start < start_date: hour_start += timedelta(hours=1)
+    hour_end = end_exclusive.replace(minute=0, second=0, microsecond=0) if end_exclusive else None
+    if hour_start and hour_end and hour_start >= hour_end:
+        return None, [(start_date, end_exclusive)]
+    raw_ranges = []
+    if start_date and start_date < hour_start: raw_ranges.append((start_date, hour_start))
+    if end_exclusive and hour_end < end_exclusive: raw_ranges.append((hour_end, end_exclusive))
+    return (hour_start, hour_end), raw_ranges
 
+def _range_where(column: str, start, end, server_id=None):
+    """生成 server_id 与 [start, end) 时间范围的 WHERE 子句和参数"""
+    where_clauses = []
+    params = []
+    if server_id:
+        where_clauses.append("server_id = %s")
+        params.append(server_id)
+    if start:
+        where_clauses.append(f"{column} >= %s")
+        params.append(start)
+    if end:
+        where_clauses.append(f"{column} < %s")
+        params.append(end)
+    return (" AND ".join(where_clauses) if where_clauses else "1=1"), params
+
+# 统计结果缓存: 键为 (server_id, start_date, end_date)。写入活动记录后按服务器和时间范围失效 (见 _invalidate_stats_cache)；
+# 其他进程的写入不会使本进程的缓存失效，因此条目都有过期时间: 包含今天 (UTC) 的范围按 STATS_CACHE_TTL，
+# 已结束的范围 (之后只有回填等写入才会改变结果) 按较长的 STATS_CACHE_CLOSED_TTL
+_breakdown_cache = RangeCache(maxsize=APP_CONFIG.get('STATS_CACHE_SIZE', 256), ttl=APP_CONFIG.get('STATS_CACHE_TTL', 300))
+
+def _naive(value: Optional[datetime]) -> Optional[datetime]:
+    return value.replace(tzinfo=None) if value is not None else None
+
+def _is_closed_range(end_date: Optional[datetime]) -> bool:
+    """结束时间早于今天 (UTC) 零点的范围视为已结束，之后只有回填等写入才会改变其结果"""
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    return end_date is not None and _naive(end_date) < today
+
+def _invalidate_stats_cache(rows: List[tuple], aggregate_rows: List[tuple] = ()):
+    """
+    按这批记录的服务器和时间范围，删除与之重叠的统计缓存条目。
+    aggregate_rows 在统计中按整个小时计入，按所在小时的范围失效。
+    """
+    ranges = {}
+
+    def extend(server_id, low, high):
+        current = ranges.get(server_id)
+        ranges[server_id] = (min(current[0], low), max(current[1], high)) if current else (low, high)
+
+    for row in rows:
+        if row[1] is None: continue
+        timestamp = _naive(row[1])
+        extend(row[0], timestamp, timestamp)
+    for row in aggregate_rows:
+        if row[1] is None: continue
+        hour = _naive(row[1]).replace(minute=0, second=0, microsecond=0)
+        extend(row[0], hour, hour + timedelta(hours=1) - timedelta(microseconds=1))
+    for server_id, (start, end) in ranges.items():
+        _breakdown_cache.invalidate_range(server_id, start, end)
+
+def clear_stats_cache() -> int:
+    """清空统计缓存 (回填等其他进程写入历史数据后使用)，返回删除的条目数"""
+    return _breakdown_cache.invalidate()
+
+def get_activity_breakdown(server_id=None, start_date=None, end_date=None, refresh: bool = False) -> Dict[tuple, int]:
+    """
+    统计时间范围 (end_date 包含在内) 内的活动数，按 (小时 0-23, 用户名, 操作类型, 风险等级) 分组，空用户名/操作类型为 ''。
+    整点小时部分从 activity_rollup_hourly 读取，首尾不足一小时的部分查询明细表；
+    USE_ACTIVITY_ROLLUP 关闭时全部查询明细表。以 aggregate 方式存储的记录只有按小时的汇总，从 sql_digest_summary 读取，
+    与 get_sql_digest_summary 相同按小时粒度计入 (包含 start_date、end_date 所在的整个小时)，不受 USE_ACTIVITY_ROLLUP 影响。
+    数据库出错时抛出异常。
+    结果按 (server_id, start_date, end_date) 缓存，返回的字典由缓存共享，调用方不应修改。refresh 为 True 时不读缓存，重新查询后写入。
+    """
+    cache_key = (server_id or None, _naive(start_date), _naive(end_date))
+    breakdown = _breakdown_cache.get(cache_key) if not refresh else MISSING
+    if breakdown is not MISSING:
+        return breakdown
+    generation = _breakdown_cache.generation
+    breakdown = _query_activity_breakdown(server_id, start_date, end_date)
+    ttl = APP_CONFIG.get('STATS_CACHE_CLOSED_TTL', 3600) if _is_closed_range(end_date) else MISSING
+    _breakdown_cache.set_if_unchanged(cache_key, breakdown, generation, ttl=ttl)
+    return breakdown
+
+def _query_activity_breakdown(server_id=None, start_date=None, end_date=None) -> Dict[tuple, int]:
+    """get_activity_breakdown 的查询部分 (不经过缓存)"""
+    if APP_CONFIG.get('USE_ACTIVITY_ROLLUP', True):
+        hour_range, raw_ranges = _split_hour_range(start_date, end_date)
+    else:
+        hour_range, raw_ranges = None, [(start_date, end_date + timedelta(microseconds=1) if end_date else None)]
+    breakdown = {}
+
+    def merge(rows):
+        # 各表均按用户 ID 分组，用户名由维度表缓存补全 (user_id 为 NULL 或 0 的行按用户名分组)
+        names = _get_dimension_names(conn, 'user', {row['user_id'] for row in rows if row['user_id']})
+        for row in rows:
+            user_name = names.get(row['user_id'], row['user_name']) if row['user_id'] else row['user_name']
+            key = (row['hour_of_day'], user_name or '', row['operation_type'] or '', row['risk_level'] or 'Low')
+            breakdown[key] = breakdown.get(key, 0) + int(row['count'])
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("无法连接数据库")
+    try:
         with conn.cursor() as cursor:
-            # 1. 总操作数
-            sql_total = f"SELECT COUNT(*) as total FROM user_activities WHERE {base_where_sql}"
-            cursor.execute(sql_total, params)
-            total_result = cursor.fetchone()
-            stats['total_count'] = total_result['total'] if total_result else 0
-
-            # 2. 按操作类型统计
-            sql_ops = f"SELECT operation_type, COUNT(*) as count FROM user_activities WHERE {base_where_sql} GROUP BY operation_type ORDER BY count DESC"
-            cursor.execute(sql_ops, params)
-            op_stats_raw = cursor.fetchall()
-            stats['operation_types'] = [{'operation_type': row.get('operation_type', 'UNKNOWN') or 'UNKNOWN', 'count': row.get('count', 0)} for row in op_stats_raw]
-
-            # 3. 按风险等级统计
-            sql_risk = f"SELECT risk_level, COUNT(*) as count FROM user_activities WHERE {base_where_sql} GROUP BY risk_level ORDER BY FIELD(risk_level, 'High', 'Medium', 'Low')"
-            cursor.execute(sql_risk, params)
-            risk_stats_raw = cursor.fetchall()
-            stats['risk_levels'] = [{'risk_level': row.get('risk_level', 'Low') or 'Low', 'count': row.get('count', 0)} for row in risk_stats_raw]
-
-            # 4. 按小时分布统计 (保持修正后的格式)
-            sql_hourly = f"SELECT HOUR(`timestamp`) as hour, COUNT(*) as count FROM user_activities WHERE {base_where_sql} GROUP BY hour ORDER BY hour ASC"
-            cursor.execute(sql_hourly, params)
-            hourly_stats_raw = cursor.fetchall()
-            hourly_stats = {hour_key: 0 for hour_key in range(24)}
-            for row in hourly_stats_raw:
-                hour = row.get('hour')
-                if hour is not None:
-                    hourly_stats[hour] = row.get('count', 0)
-            stats['hourly_distribution'] = hourly_stats # 赋值在循环外
-
-            # 5. Top N 用户统计
-            sql_users = f"SELECT user_name, COUNT(*) as count FROM user_activities WHERE {base_where_sql} AND user_name IS NOT NULL AND user_name != '' GROUP BY user_name ORDER BY count DESC LIMIT 10"
-            cursor.execute(sql_users, params)
-            user_stats_raw = cursor.fetchall()
-            stats['top_users'] = [{'user_name': row.get('user_name', 'UNKNOWN') or 'UNKNOWN', 'count': row.get('count', 0)} for row in user_stats_raw]
+            if hour_range:
+                where_sql, params = _range_where('`hour`', hour_range[0], hour_range[1], server_id)
+                cursor.execute(f"""
+                SELECT HOUR(`hour`) AS hour_of_day, user_id, user_name, operation_type, risk_level, SUM(`count`) AS count
+                FROM activity_rollup_hourly WHERE {where_sql}
+                GROUP BY hour_of_day, user_id, user_name, operation_type, risk_level
+                """, params)
+                merge(cursor.fetchall())
+            for range_start, range_end in raw_ranges:
+                where_sql, params = _range_where('`timestamp`', range_start, range_end, server_id)
+                cursor.execute(f"""
+                SELECT HOUR(`timestamp`) AS hour_of_day, user_id, user_name, operation_type, risk_level, COUNT(*) AS count
+                FROM user_activities WHERE {where_sql}
+                GROUP BY hour_of_day, user_id, user_name, operation_type, risk_level
+                """, params)
+                merge(cursor.fetchall())
+            where_sql, params = _range_where('`hour`', start_date.replace(minute=0, second=0, microsecond=0) if start_date else None,
+                                             end_date + timedelta(microseconds=1) if end_date else None, server_id)
+            cursor.execute(f"""
+            SELECT HOUR(`hour`) AS hour_of_day, user_id, user_name, operation_type, risk_level, SUM(`count`) AS count
+            FROM sql_digest_summary WHERE {where_sql}
+            GROUP BY hour_of_day, user_id, user_name, operation_type, risk_level
+            """, params)
+            merge(cursor.fetchall())
+        return breakdown
+    finally:
+        conn.close()
 
-        return stats
+def get_operation_stats(server_id=None, start_date=None, end_date=None):
+    """获取操作统计信息 (基于 get_activity_breakdown，整点小时部分由预聚合表提供)"""
+    try:
+        breakdown = get_activity_breakdown(server_id, start_date, end_date)
     except Exception as e:
         logger.error(f"获取操作统计信息时出错: {e}")
         return {}
+
+    op_counts, risk_counts, user_counts = {}, {}, {}
+    hourly_stats = {hour_key: 0 for hour_key in range(24)}
+    for (hour, user_name, operation_type, risk_level), count in breakdown.items():
+        op_counts[operation_type] = op_counts.get(operation_type, 0) + count
+        risk_counts[risk_level] = risk_counts.get(risk_level, 0) + count
+        hourly_stats[hour] = hourly_stats.get(hour, 0) + count
+        if user_name: user_counts[user_name] = user_counts.get(user_name, 0) + count
+
+    stats = {}
+    # 1. 总操作数
+    stats['total_count'] = sum(breakdown.values())
+    # 2. 按操作类型统计
+    stats['operation_types'] = [{'operation_type': op or 'UNKNOWN', 'count': count}
+                                for op, count in sorted(op_counts.items(), key=lambda item: item[1], reverse=True)]
+    # 3. 按风险等级统计
+    stats['risk_levels'] = [{'risk_level': level, 'count': risk_counts[level]} for level in ('High', 'Medium', 'Low') if level in risk_counts]
+    # 4. 按小时分布统计
+    stats['hourly_distribution'] = hourly_stats
+    # 5. Top N 用户统计
+    stats['top_users'] = [{'user_name': user, 'count': count}
+                          for user, count in sorted(user_counts.items(), key=lambda item: item[1], reverse=True)[:10]]
+    return stats
+
+def get_report_snapshot(report_type: str, period_start: datetime) -> Optional[Dict[str, Any]]:
+    """读取报表快照 (按主键查询)，没有快照或只有占位行时返回 None。数据库出错时抛出异常。"""
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("无法连接数据库")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT data FROM report_snapshots WHERE report_type = %s AND period_start = %s AND data <> ''",
+                           (report_type, period_start))
+            row = cursor.fetchone()
+        return json.loads(row['data']) if row else None
+    finally:
+        conn.close()
+
+def reserve_report_snapshot(report_type: str, period_start: datetime, period_end: datetime) -> bool:
+    """
+    计算报表之前写入快照的占位行 (data 为空字符串) 并提交，已有快照或占位行时不做修改。
+    此后提交的、包含该周期记录的写入批次会删除占位行 (见 _delete_report_snapshots)，save_report_snapshot 只填充仍然存在的占位行，
+    计算期间有新数据写入时不会保存过时的结果。
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT IGNORE INTO report_snapshots (report_type, period_start, period_end, data, created_at) VALUES (%s, %s, %s, '', %s)",
+                (report_type, period_start, period_end, datetime.now(timezone.utc).replace(tzinfo=None)))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"写入报表快照占位行失败 ({report_type}, {period_start}): {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def save_report_snapshot(report_type: str, period_start: datetime, data: Dict[str, Any]) -> bool:
+    """
+    将报表内容 (datetime 保存为 ISO 格式字符串) 写入 reserve_report_snapshot 留下的占位行，返回是否保存。
+    占位行已被写入批次删除 (计算期间该周期有新数据) 或已被其他请求填充时不保存。
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        payload = json.dumps(data, ensure_ascii=False, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE report_snapshots SET data = %s, created_at = %s WHERE report_type = %s AND period_start = %s AND data = ''",
+                (payload, datetime.now(timezone.utc).replace(tzinfo=None), report_type, period_start))
+            saved = cursor.rowcount > 0
+        conn.commit()
+        return saved
+    except Exception as e:
+        logger.error(f"保存报表快照失败 ({report_type}, {period_start}): {e}")
+        conn.rollback()
+        return False
+    finally:
+        conn.close()
+
+def get_sql_text_storage_stats() -> Dict[str, Any]:
+    """
+    SQL 语句去重的存储节省: sql_texts 中的语句数和字节数、引用这些语句的记录数及其语句总字节数，
+    saved_bytes = 引用的语句总字节数 - sql_texts 中的字节数 - 每条记录 32 字节的哈希。需要扫描 user_activities，只用于按需查看。
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("无法连接数据库")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) AS texts, IFNULL(SUM(text_length), 0) AS stored_bytes FROM sql_texts")
+            texts = cursor.fetchone()
+            cursor.execute("""
+            SELECT COUNT(*) AS referencing_rows, IFNULL(SUM(st.text_length), 0) AS referenced_bytes
+            FROM user_activities ua JOIN sql_texts st ON st.text_hash = ua.argument_hash
+            """)
+            refs = cursor.fetchone()
+        stats = {'texts': int(texts['texts']), 'stored_bytes': int(texts['stored_bytes']),
+                 'referencing_rows': int(refs['referencing_rows']), 'referenced_bytes': int(refs['referenced_bytes'])}
+        stats['saved_bytes'] = stats['referenced_bytes'] - stats['stored_bytes'] - 32 * stats['referencing_rows']
+        stats['dedup_ratio'] = round(stats['referenced_bytes'] / stats['stored_bytes'], 2) if stats['stored_bytes'] else None
+        return stats
+    finally:
+        conn.close()
+
+def get_sql_digest_summary(server_id=None, start_date=None, end_date=None, user_name=None, risk_level=None, limit=50) -> List[Dict[str, Any]]:
+    """
+    按 SQL 指纹汇总时间范围内 (按小时粒度，包含 start_date、end_date 所在的整个小时) 以 aggregate 方式存储的语句，
+    按执行次数倒序返回 [{'digest', 'operation_type', 'risk_level', 'sample_text', 'count', 'user_count', 'first_seen', 'last_seen'}]。
+    """
+    where_clauses = []
+    params = []
+    if server_id:
+        where_clauses.append("server_id = %s")
+        params.append(server_id)
+    if start_date:
+        where_clauses.append("`hour` >= %s")
+        params.append(start_date.replace(minute=0, second=0, microsecond=0))
+    if end_date:
+        where_clauses.append("`hour` <= %s")
+        params.append(end_date)
+    if user_name:
+        # 新写入的行只保存用户 ID，按维度表中的名称匹配
+        where_clauses.append("(user_name LIKE %s OR user_id IN (SELECT id FROM dim_users WHERE name LIKE %s COLLATE utf8mb4_general_ci))")
+        params.extend([f"%{user_name}%"] * 2)
+    if risk_level:
+        where_clauses.append("risk_level = %s")
+        params.append(risk_level)
+    where_sql = " AND ".join(where_clauses) if where_clauses else "1=1"
+    conn = get_db_connection()
+    if not conn:
+        logger.error("获取 SQL 指纹汇总失败：无法连接数据库。")
+        return []
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+            SELECT digest, MAX(operation_type) AS operation_type, MAX(risk_level) AS risk_level, MAX(sample_text) AS sample_text,
+                   SUM(`count`) AS count, COUNT(DISTINCT user_id, user_name) AS user_count, MIN(first_seen) AS first_seen, MAX(last_seen) AS last_seen
+            FROM sql_digest_summary WHERE {where_sql}
+            GROUP BY digest ORDER BY count DESC LIMIT %s
+            """, params + [limit])
+            results = list(cursor.fetchall() or [])
+        for row in results:
+            row['count'] = int(row['count'])
+            for column in ('first_seen', 'last_seen'):
+                if isinstance(row[column], datetime): row[column] = row[column].strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+        return results
+    except Exception as e:
+        logger.error(f"获取 SQL 指纹汇总时出错: {e}")
+        return []
     finally:
         if conn:
             conn.close()
@@ -490,7 +1813,7 @@ def get_all_servers():
             SELECT server_id, name, host, port, user, 
                    CASE WHEN password IS NOT NULL AND password != '' THEN 1 ELSE 0 END as has_password,
                    CASE WHEN ssh_key_path IS NOT NULL AND ssh_key_path != '' THEN 1 ELSE 0 END as has_ssh_key,
-                   enable_general_log, enable_binlog
+                   enable_general_log, enable_binlog, ssh_compression
             FROM server_configs
             ORDER BY server_id
             ''')
@@ -506,7 +1829,8 @@ def get_all_servers():
                     'has_password': bool(row['has_password']),
                     'has_ssh_key': bool(row['has_ssh_key']),
                     'enable_general_log': bool(row['enable_general_log']),
-                    'enable_binlog': bool(row['enable_binlog'])
+                    'enable_binlog': bool(row['enable_binlog']),
+                    'ssh_compression': bool(row['ssh_compression'])
                 })
         
         return servers
@@ -530,7 +1854,7 @@ def get_server_by_id(server_id):
             SELECT server_id, name, host, port, user, 
                    CASE WHEN password IS NOT NULL AND password != '' THEN 1 ELSE 0 END as has_password,
                    CASE WHEN ssh_key_path IS NOT NULL AND ssh_key_path != '' THEN 1 ELSE 0 END as has_ssh_key,
-                   general_log_path, binlog_path, enable_general_log, enable_binlog
+                   general_log_path, binlog_path, enable_general_log, enable_binlog, ssh_compression
             FROM server_configs WHERE server_id = %s
             ''', (server_id,))
             result = cursor.fetchone()
@@ -547,7 +1871,8 @@ def get_server_by_id(server_id):
                     'general_log_path': result['general_log_path'],
                     'binlog_path': result['binlog_path'],
                     'enable_general_log': bool(result['enable_general_log']),
-                    'enable_binlog': bool(result['enable_binlog'])
+                    'enable_binlog': bool(result['enable_binlog']),
+                    'ssh_compression': bool(result['ssh_compression'])
                 }
             return None
     except Exception as e:
@@ -581,7 +1906,8 @@ def get_server_full_config(server_id):
                     'general_log_path': result['general_log_path'],
                     'binlog_path': result['binlog_path'],
                     'enable_general_log': bool(result['enable_general_log']),
-                    'enable_binlog': bool(result['enable_binlog'])
+                    'enable_binlog': bool(result['enable_binlog']),
+                    'ssh_compression': bool(result['ssh_compression'])
                 }
             return None
     except Exception as e:
@@ -617,8 +1943,8 @@ def add_server(server_data):
             cursor.execute('''
             INSERT INTO server_configs (
                 server_id, name, host, port, user, password, ssh_key_path,
-                general_log_path, binlog_path, enable_general_log, enable_binlog
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                general_log_path, binlog_path, enable_general_log, enable_binlog, ssh_compression
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             ''', (
                 server_id,
                 server_data.get('name'),
@@ -630,7 +1956,8 @@ def add_server(server_data):
                 server_data.get('general_log_path', ''),
                 server_data.get('binlog_path', ''),
                 1 if server_data.get('enable_general_log', True) else 0,
-                1 if server_data.get('enable_binlog', False) else 0
+                1 if server_data.get('enable_binlog', False) else 0,
+                1 if server_data.get('ssh_compression', False) else 0
             ))
         
         conn.commit()
@@ -672,7 +1999,8 @@ def update_server(server_id, server_data):
                 general_log_path = %s,
                 binlog_path = %s,
                 enable_general_log = %s,
-                enable_binlog = %s
+                enable_binlog = %s,
+                ssh_compression = %s
             WHERE server_id = %s
             ''', (
                 server_data.get('name'),
@@ -687,6 +2015,7 @@ def update_server(server_id, server_data):
                 server_data.get('binlog_path', ''),
                 1 if server_data.get('enable_general_log', True) else 0,
                 1 if server_data.get('enable_binlog', False) else 0,
+                1 if server_data.get('ssh_compression', False) else 0,
                 server_id
             ))
         
@@ -720,8 +2049,9 @@ def delete_server(server_id):
             # 删除配置
             cursor.execute('DELETE FROM server_configs WHERE server_id = %s', (server_id,))
             
-            # 同时删除相关的扫描记录
+            # 同时删除相关的扫描记录和文件检查点
             cursor.execute('DELETE FROM server_scan_records WHERE server_id = %s', (server_id,))
+            cursor.execute('DELETE FROM log_file_checkpoints WHERE server_id = %s', (server_id,))
         
         conn.commit()
         logger.info(f"已删除服务器配置 ID:{server_id}")
@@ -33,6 +33,7 @@ CREATE TABLE `server_configs`  (
   `binlog_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL,
   `enable_general_log` tinyint(1) NULL DEFAULT 1,
   `enable_binlog` tinyint(1) NULL DEFAULT 0,
+  `ssh_compression` tinyint(1) NULL DEFAULT 0 COMMENT '是否启用 SSH 传输压缩',
   PRIMARY KEY (`server_id`) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
@@ -46,6 +47,125 @@ CREATE TABLE `server_scan_records`  (
   PRIMARY KEY (`server_id`) USING BTREE
 ) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci ROW_FORMAT = Dynamic;
 
+-- ----------------------------
+-- Table structure for log_file_checkpoints
+-- ----------------------------
+DROP TABLE IF EXISTS `log_file_checkpoints`;
+CREATE TABLE `log_file_checkpoints`  (
+  `server_id` int(11) NOT NULL COMMENT '服务器ID',
+  `file_path` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '日志文件完整路径',
+  `inode` bigint(20) NULL DEFAULT NULL COMMENT '上次读取时文件的 inode，用于识别轮转',
+  `file_size` bigint(20) NOT NULL DEFAULT 0 COMMENT '上次读取时文件的大小',
+  `byte_offset` bigint(20) NOT NULL DEFAULT 0 COMMENT '已完整读取的字节偏移',
+  `decompressed_offset` bigint(20) NULL DEFAULT NULL COMMENT '压缩日志解压后已处理的字节偏移',
+  `last_timestamp` datetime(6) NULL DEFAULT NULL COMMENT '已读取的最后一条日志时间 (UTC)',
+  `updated_at` datetime(6) NOT NULL COMMENT '检查点更新时间 (UTC)',
+  PRIMARY KEY (`server_id`, `file_path`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '日志文件读取检查点' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for activity_rollup_hourly
+-- ----------------------------
+DROP TABLE IF EXISTS `activity_rollup_hourly`;
+CREATE TABLE `activity_rollup_hourly`  (
+  `server_id` int(11) NOT NULL COMMENT '服务器ID',
+  `hour` datetime NOT NULL COMMENT '所在小时 (整点)',
+  `user_id` int(11) NOT NULL DEFAULT 0 COMMENT '用户名 (dim_users.id，0 表示按 user_name)',
+  `user_name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL DEFAULT '' COMMENT '没有用户 ID 时的用户名',
+  `operation_type` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL DEFAULT '' COMMENT '操作类型',
+  `risk_level` enum('Low','Medium','High') CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL DEFAULT 'Low' COMMENT '风险等级',
+  `count` bigint(20) NOT NULL DEFAULT 0 COMMENT '操作次数',
+  PRIMARY KEY (`server_id`, `hour`, `user_id`, `user_name`, `operation_type`, `risk_level`) USING BTREE,
+  INDEX `idx_hour`(`hour`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '按小时预聚合的活动统计' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for dim_users / dim_hosts / dim_databases
+-- ----------------------------
+DROP TABLE IF EXISTS `dim_users`;
+CREATE TABLE `dim_users`  (
+  `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '用户ID',
+  `name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL COMMENT '数据库用户名',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_name`(`name`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '用户名维度表' ROW_FORMAT = Dynamic;
+
+DROP TABLE IF EXISTS `dim_hosts`;
+CREATE TABLE `dim_hosts`  (
+  `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '主机ID',
+  `name` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL COMMENT '客户端主机或IP',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_name`(`name`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '客户端主机维度表' ROW_FORMAT = Dynamic;
+
+DROP TABLE IF EXISTS `dim_databases`;
+CREATE TABLE `dim_databases`  (
+  `id` int(11) NOT NULL AUTO_INCREMENT COMMENT '数据库ID',
+  `name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL COMMENT '数据库名',
+  PRIMARY KEY (`id`) USING BTREE,
+  UNIQUE INDEX `uk_name`(`name`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '数据库名维度表' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for report_snapshots
+-- ----------------------------
+DROP TABLE IF EXISTS `report_snapshots`;
+CREATE TABLE `report_snapshots`  (
+  `report_type` varchar(10) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '报表类型 (daily / weekly / monthly)',
+  `period_start` datetime NOT NULL COMMENT '周期开始时间',
+  `period_end` datetime NOT NULL COMMENT '周期结束时间 (不包含)',
+  `data` mediumtext CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '报表内容 (JSON)，空字符串为生成中的占位行',
+  `created_at` datetime NOT NULL COMMENT '生成时间 (UTC)',
+  PRIMARY KEY (`report_type`, `period_start`) USING BTREE,
+  INDEX `idx_period`(`period_start`, `period_end`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '已结束周期的报表快照' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for sql_texts
+-- ----------------------------
+DROP TABLE IF EXISTS `sql_texts`;
+CREATE TABLE `sql_texts`  (
+  `text_hash` char(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '语句哈希 (BLAKE2b 128 位)',
+  `sql_text` mediumtext CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT '语句原文',
+  `text_length` int(11) NOT NULL COMMENT '语句字节数',
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '首次写入时间',
+  PRIMARY KEY (`text_hash`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '去重存储的 SQL 语句' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for sql_digest_summary
+-- ----------------------------
+DROP TABLE IF EXISTS `sql_digest_summary`;
+CREATE TABLE `sql_digest_summary`  (
+  `server_id` int(11) NOT NULL COMMENT '服务器ID',
+  `hour` datetime NOT NULL COMMENT '所在小时 (整点)',
+  `user_id` int(11) NOT NULL DEFAULT 0 COMMENT '用户名 (dim_users.id，0 表示按 user_name)',
+  `user_name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL DEFAULT '' COMMENT '没有用户 ID 时的用户名',
+  `digest` char(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NOT NULL COMMENT 'SQL 指纹',
+  `operation_type` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '操作类型',
+  `risk_level` enum('Low','Medium','High') CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT 'Low' COMMENT '风险等级',
+  `sample_text` text CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL COMMENT '样例语句',
+  `count` bigint(20) NOT NULL DEFAULT 0 COMMENT '执行次数',
+  `first_seen` datetime(6) NOT NULL COMMENT '首次出现时间 (UTC)',
+  `last_seen` datetime(6) NOT NULL COMMENT '最后出现时间 (UTC)',
+  PRIMARY KEY (`server_id`, `hour`, `user_id`, `user_name`, `digest`) USING BTREE,
+  INDEX `idx_hour`(`hour`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '按 SQL 指纹汇总的语句 (存储方式为 aggregate 的风险等级)' ROW_FORMAT = Dynamic;
+
+-- ----------------------------
+-- Table structure for thread_sessions
+-- ----------------------------
+DROP TABLE IF EXISTS `thread_sessions`;
+CREATE TABLE `thread_sessions`  (
+  `server_id` int(11) NOT NULL COMMENT '服务器ID',
+  `thread_id` bigint(20) NOT NULL COMMENT 'MySQL 线程ID',
+  `user_name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '用户名',
+  `client_host` varchar(255) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '客户端主机',
+  `db_name` varchar(100) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '当前数据库',
+  `last_seen` datetime(6) NOT NULL COMMENT '该线程最后一次出现的日志时间 (UTC)',
+  PRIMARY KEY (`server_id`, `thread_id`) USING BTREE
+) ENGINE = InnoDB CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '扫描结束时仍在连接中的线程会话' ROW_FORMAT = Dynamic;
+
 -- ----------------------------
 -- Table structure for server_scan_status
 -- ----------------------------
@@ -82,11 +202,17 @@ CREATE TABLE `user_activities`  (
   `command_type` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '原始命令类型',
   `operation_type` varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '解析后的操作类型',
   `argument` text CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL COMMENT '命令参数或SQL语句',
+  `argument_hash` char(32) CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT NULL COMMENT '去重存储的语句哈希 (sql_texts.text_hash)',
   `risk_level` enum('Low','Medium','High') CHARACTER SET utf8mb4 COLLATE utf8mb4_general_ci NULL DEFAULT 'Low' COMMENT '风险等级',
   `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP COMMENT '记录创建时间',
+  `user_id` int(11) NULL DEFAULT NULL COMMENT '用户名 (dim_users.id)',
+  `host_id` int(11) NULL DEFAULT NULL COMMENT '客户端主机 (dim_hosts.id)',
+  `db_id` int(11) NULL DEFAULT NULL COMMENT '数据库名 (dim_databases.id)',
   PRIMARY KEY (`id`) USING BTREE,
   INDEX `idx_server_time`(`server_id`, `timestamp`) USING BTREE,
-  INDEX `idx_user_time`(`user_name`, `timestamp`) USING BTREE,
+  INDEX `idx_user_id_time`(`user_id`, `timestamp`) USING BTREE,
+  INDEX `idx_time`(`timestamp`) USING BTREE,
+  INDEX `idx_argument_hash`(`argument_hash`) USING BTREE,
   CONSTRAINT `user_activities_ibfk_1` FOREIGN KEY (`server_id`) REFERENCES `mysql_servers_old` (`id`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE = InnoDB AUTO_INCREMENT = 1182 CHARACTER SET = utf8mb4 COLLATE = utf8mb4_general_ci COMMENT = '用户数据库活动记录' ROW_FORMAT = Dynamic;
 
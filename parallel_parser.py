@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+本地日志文件的多进程并行解析
+将本地文件按行边界切分为多个字节区间 (压缩文件无法切分，整个文件作为一个区间)，
+由进程池并行解析 (与 parse_general_log_stream 的解析和分类逻辑相同)，主进程按顺序依次合并各区间的结果。
+
+线程会话 (线程 -> 用户) 的处理：
+每个区间从空的会话表开始解析。区间内遇到此前未出现过的线程时使用占位会话，其活动记录的用户标记为 PENDING，
+Init DB 对占位会话的修改照常记录。主进程按顺序处理区间：用前面所有区间合并后的会话表补全 PENDING 记录，
+再将本区间结束时的会话变化 (Connect/Change user 新建、Quit 删除、占位会话的 db 和 last_seen 更新) 合并到会话表，
+结果与顺序解析整个文件完全一致。
+"""
+import logging
+import multiprocessing
+import os
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+from block_reader import iter_blocks, iter_lines
+from compressed_logs import open_decompressed
+from log_parser import parse_general_log_stream
+from risk_rules import set_risk_rules, get_risk_rules
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 区间内无法确定、需由主进程补全的字段值
+PENDING = '\x00pending'
+
+# 默认每个区间的大小
+DEFAULT_RANGE_SIZE = 64 * 1024 * 1024
+
+
+def split_line_ranges(path: str, range_size: int = DEFAULT_RANGE_SIZE, start: int = 0, end: Optional[int] = None) -> List[Tuple[int, int]]:
+    """将文件 [start, end) 切分为约 range_size 字节的区间，每个区间的边界都在行首"""
+    end = os.path.getsize(path) if end is None else end
+    ranges = []
+    with open(path, 'rb') as f:
+        position = start
+        while position < end:
+            boundary = position + max(1, range_size)
+            if boundary >= end:
+                ranges.append((position, end))
+                break
+            f.seek(boundary - 1)
+            f.readline()  # 移动到 boundary - 1 所在行的下一行行首
+            boundary = min(f.tell(), end)
+            ranges.append((position, boundary))
+            position = boundary
+    return ranges
+
+
+class _RangeSessionMap(dict):
+    """
+    区间解析使用的会话表：对区间内尚未出现过的线程返回占位会话 (用户等字段为 PENDING)，
+    并记录区间内被 Quit 删除的线程。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.closed = set()
+
+    def get(self, thread_id, default=None):
+        session = super().get(thread_id)
+        if session is None and thread_id not in self.closed:
+            session = {'user': PENDING, 'host': PENDING, 'db': PENDING, 'last_seen': None}
+            super().__setitem__(thread_id, session)
+        return session if session is not None else default
+
+    def __getitem__(self, thread_id):
+        session = self.get(thread_id)
+        if session is None: raise KeyError(thread_id)
+        return session
+
+    def __contains__(self, thread_id):
+        # 区间开始时的会话未知，未被 Quit 的线程都可能存在 (Quit 需要据此删除之前区间建立的会话)
+        return thread_id not in self.closed
+
+    def __setitem__(self, thread_id, session):
+        self.closed.discard(thread_id)
+        super().__setitem__(thread_id, session)
+
+    def __delitem__(self, thread_id):
+        super().pop(thread_id, None)
+        self.closed.add(thread_id)
+
+
+def _init_worker(risk_operations):
+    """工作进程初始化：使用与主进程相同的风险规则"""
+    set_risk_rules(risk_operations)
+
+
+def _parse_range(segment: Tuple[str, int, Optional[int], Optional[str]], server_id: int, allowed_levels, min_timestamp: Optional[datetime]) -> Dict[str, Any]:
+    """在工作进程中解析一个区间 (path, start, end, compression)，返回活动记录、读取状态和区间结束时的会话变化"""
+    path, start, end, compression = segment
+    sessions = _RangeSessionMap()
+    read_state = {'offset': start, 'last_timestamp': None}
+    activities = []
+    with open(path, 'rb') as f:
+        # 压缩文件的 offset 为解压后的位置
+        lines = open_decompressed(f, compression) if compression else iter_lines(iter_blocks(f, start, end))
+        for activity in parse_general_log_stream(lines, server_id, read_state, min_timestamp=min_timestamp, thread_user_map=sessions):
+            if allowed_levels is None or activity.get('risk_level', 'Low').capitalize() in allowed_levels:
+                activities.append(activity)
+    return {'activities': activities, 'offset': read_state['offset'], 'last_timestamp': read_state['last_timestamp'],
+            'lines': read_state.get('lines', 0), 'sessions': dict(sessions), 'closed': sessions.closed}
+
+
+def _resolve_pending(activities: List[Dict[str, Any]], thread_user_map: Dict[int, Dict[str, Any]]):
+    """用区间开始时的会话表补全 PENDING 字段 (与顺序解析时的取值规则一致)"""
+    for activity in activities:
+        if activity['user_name'] != PENDING:
+            continue
+        session = thread_user_map.get(activity['thread_id'])
+        if session:
+            activity['user_name'] = session.get('user', 'unknown'); activity['client_host'] = session.get('host', 'unknown')
+            if activity['db_name'] == PENDING: activity['db_name'] = session.get('db')
+        else:
+            # 线程不在会话表中：顺序解析时不会记录 Init DB 对会话的修改，只有 Init DB 本身带有数据库名
+            activity['user_name'] = 'unknown'; activity['client_host'] = 'unknown'
+            activity['db_name'] = activity['argument'] if activity['command_type'] == 'Init DB' else None
+
+
+def _merge_sessions(thread_user_map: Dict[int, Dict[str, Any]], sessions: Dict[int, Dict[str, Any]], closed):
+    """将区间结束时的会话变化合并到会话表"""
+    for thread_id in closed:
+        thread_user_map.pop(thread_id, None)
+    for thread_id, session in sessions.items():
+        if session['user'] != PENDING:
+            thread_user_map[thread_id] = session
+            continue
+        existing = thread_user_map.get(thread_id)
+        if existing is None:
+            continue  # 区间开始时不存在的线程，顺序解析不会为其建立会话
+        if session['db'] != PENDING: existing['db'] = session['db']
+        if session['last_seen']: existing['last_seen'] = session['last_seen']
+
+
+def build_segments(path: str, compression: Optional[str] = None, range_size: int = DEFAULT_RANGE_SIZE, start_offset: int = 0) -> List[Tuple[str, int, Optional[int], Optional[str]]]:
+    """生成一个文件的解析区间列表 [(path, start, end, compression)]；压缩文件整个作为一个区间"""
+    if compression:
+        return [(path, 0, None, compression)]
+    return [(path, start, end, None) for start, end in split_line_ranges(path, range_size, start_offset)]
+
+
+def parse_segments_parallel(segments: List[Tuple[str, int, Optional[int], Optional[str]]], server_id: int, workers: Optional[int] = None,
+                            thread_user_map: Optional[Dict[int, Dict[str, Any]]] = None, allowed_levels=None,
+                            min_timestamp: Optional[datetime] = None) -> Iterator[Tuple[Tuple, List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    并行解析一组按顺序排列的区间 (可来自多个文件)，按顺序逐个产出 (区间, 活动记录列表, 区间状态)。
+    区间状态包含 offset (区间结束位置，可作为检查点)、last_timestamp 和 lines。
+    allowed_levels 不为 None 时只保留这些风险等级的记录；thread_user_map 为初始会话表，解析过程中原地更新。
+    同时进行中的区间数不超过 workers * 2，内存占用有上限。
+    """
+    if thread_user_map is None: thread_user_map = {}
+    allowed_levels = {level.capitalize() for level in allowed_levels} if allowed_levels is not None else None
+    workers = workers or os.cpu_count() or 1
+    with multiprocessing.get_context().Pool(workers, initializer=_init_worker, initargs=(get_risk_rules(),)) as pool:
+        pending = deque()
+        next_segment = 0
+        while next_segment < len(segments) or pending:
+            while next_segment < len(segments) and len(pending) < workers * 2:
+                segment = segments[next_segment]
+                pending.append((segment, pool.apply_async(_parse_range, (segment, server_id, allowed_levels, min_timestamp))))
+                next_segment += 1
+            segment, async_result = pending.popleft()
+            result = async_result.get()
+            _resolve_pending(result['activities'], thread_user_map)
+            _merge_sessions(thread_user_map, result['sessions'], result['closed'])
+            yield segment, result['activities'], {'offset': result['offset'], 'last_timestamp': result['last_timestamp'], 'lines': result['lines']}
+
+
+def parse_file_parallel(path: str, server_id: int, workers: Optional[int] = None, range_size: int = DEFAULT_RANGE_SIZE,
+                        start_offset: int = 0, thread_user_map: Optional[Dict[int, Dict[str, Any]]] = None,
+                        allowed_levels=None, min_timestamp: Optional[datetime] = None) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """并行解析本地未压缩的日志文件，按文件顺序逐个区间产出 (活动记录列表, 区间状态)，参数含义见 parse_segments_parallel"""
+    segments = build_segments(path, None, range_size, start_offset)
+    logger.info(f"文件 {path} 切分为 {len(segments)} 个区间，使用 {workers or os.cpu_count() or 1} 个进程解析。")
+    for _, activities, stats in parse_segments_parallel(segments, server_id, workers, thread_user_map, allowed_levels, min_timestamp):
+        yield activities, stats
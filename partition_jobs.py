@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+user_activities 分区的后台维护
+Web 进程启动后在守护线程中每 ACTIVITY_PARTITION_CHECK_INTERVAL 秒执行一次 maintain_activity_partitions:
+预建未来的分区，删除超过保留期的分区。未分区的表不做处理。
+"""
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+from config import APP_CONFIG
+from models import maintain_activity_partitions
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+
+class PartitionMaintainer:
+    """定期维护分区的守护线程，并保留最近一次执行的结果供查询"""
+
+    def __init__(self, interval_seconds: float = 3600):
+        self.interval_seconds = max(60, interval_seconds)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.last_run_at: Optional[datetime] = None
+        self.last_result: Optional[Dict[str, Any]] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """启动后台线程 (已启动时不重复启动)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='partition-maintenance', daemon=True)
+            self._thread.start()
+        logger.info(f"分区维护任务已启动，间隔 {self.interval_seconds} 秒")
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> Optional[Dict[str, Any]]:
+        """立即执行一次维护，出错时记录错误并返回 None"""
+        try:
+            result = maintain_activity_partitions()
+            self.last_result, self.last_error = result, None
+            return result
+        except Exception as e:
+            logger.error(f"维护 user_activities 分区失败: {e}")
+            self.last_error = str(e)
+            return None
+        finally:
+            self.last_run_at = datetime.now(timezone.utc)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval_seconds': self.interval_seconds,
+            'last_run_at': self.last_run_at.isoformat() if self.last_run_at else None,
+            'last_result': self.last_result,
+            'last_error': self.last_error
+        }
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.run_once()
+            self._stop.wait(self.interval_seconds)
+
+
+# 全局分区维护任务
+partition_maintainer = PartitionMaintainer(APP_CONFIG.get('ACTIVITY_PARTITION_CHECK_INTERVAL', 3600))
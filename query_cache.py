@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+查询结果缓存
+进程内、线程安全的缓存，条目按 TTL 过期，超过容量时淘汰最久未使用的条目。
+RangeCache 用于按服务器和时间范围缓存的统计结果，写入数据后只使重叠的条目失效。
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+# 表示未命中的哨兵值 (缓存的值本身可能为 None)
+MISSING = object()
+
+
+class TTLCache:
+    """
+    带过期时间和容量上限 (LRU 淘汰) 的缓存；ttl 为 None 表示条目不过期。
+    generation 在每次 invalidate 时递增，调用方可据此判断两个时刻之间缓存是否被失效过。
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: Optional[float] = 60.0):
+        self.maxsize = max(1, maxsize)
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (value, 过期时间或 None)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = MISSING):
+        """写入条目；ttl 未指定时使用缓存的默认值，传入 None 表示不过期"""
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def _store(self, key: Hashable, value: Any, ttl: Optional[float]):
+        """写入条目并按容量淘汰 (调用方持有锁)"""
+        ttl = self.ttl if ttl is MISSING else ttl
+        self._data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """删除满足 predicate(key) 的条目 (未指定时清空)，返回删除的条目数"""
+        with self._lock:
+            self.generation += 1
+            if predicate is None:
+                count = len(self._data)
+                self._data.clear()
+                return count
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                del self._data[key]
+            return len(keys)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+
+class RangeCache(TTLCache):
+    """
+    时间范围查询结果的缓存，键的前三项为 (server_id, 开始时间, 结束时间)，None 表示不限。
+    写入某台服务器某段时间的数据后调用 invalidate_range，只删除时间范围与之重叠的条目。
+    查询前记下 generation，查询结束后用 set_if_unchanged 写入，查询期间有写入时不缓存旧结果。
+    """
+
+    def set_if_unchanged(self, key: Hashable, value: Any, generation: int, ttl: Optional[float] = MISSING) -> bool:
+        """generation 与当前值相同 (期间没有失效) 时写入条目，返回是否写入"""
+        with self._lock:
+            if self.generation != generation:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def invalidate_range(self, server_id, start, end) -> int:
+        """删除与 [start, end] 重叠、且服务器相同或不限服务器的条目，返回删除的条目数"""
+        def overlaps(key) -> bool:
+            key_server, key_start, key_end = key[:3]
+            return ((key_server is None or server_id is None or key_server == server_id)
+                    and (key_start is None or end is None or key_start <= end)
+                    and (key_end is None or start is None or key_end >= start))
+        return self.invalidate(overlaps)
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+"""
+远程预过滤
+在日志所在主机上通过 exec_command 运行 awk，只传输可能被写入数据库的行，减少网络传输量。
+过滤条件由当前风险规则和写入风险等级推导，只会多保留、不会漏掉需要写入的行：
+  - 非 Query 命令 (Connect、Quit、Change user、Init DB 等) 全部保留，保证线程与用户的对应关系正确
+  - Query 行只保留可能命中允许写入等级中某条规则的语句 (按操作类型前缀和关键字判断)
+  - 不符合日志行格式的行 (多行 SQL 的后续行等) 解析器本身就会忽略，直接丢弃
+被丢弃的字节数以 "\\x01<字节数>" 标记行输出，读取端将其转换为整数，解析器据此保持与原文件一致的字节偏移。
+无法推导出有效过滤条件 (例如允许写入 Low 等级) 时不使用远程过滤。
+"""
+import logging
+import shlex
+from typing import Dict, Any, List, Optional, Iterator, Union
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 与 log_parser.pattern_new 对应的 awk 正则 (解析器会跳过行首空白；不使用 {n} 区间表达式以兼容 mawk)
+_TS = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]T[0-9][0-9]:[0-9][0-9]:[0-9][0-9][.][0-9]+Z'
+_HEADER_RE = f'^[ \\t\\r\\v\\f]*{_TS}\\t *[0-9]+[ \\t\\r\\v\\f]+(Query|Connect|Init DB|Quit|Prepare|Execute|Close stmt|Change user|Field List)\\t'
+_QUERY_RE = f'^[ \\t\\r\\v\\f]*{_TS}\\t *[0-9]+[ \\t\\r\\v\\f]+Query\\t'
+
+# 丢弃字节数标记行的前缀
+SKIP_MARKER = b'\x01'
+
+
+def _awk_string(value: str) -> Optional[str]:
+    """转换为 awk 字符串字面量；包含非 ASCII 或控制字符时返回 None (awk 在 C locale 下无法正确转换大小写)"""
+    if any(ord(char) < 0x20 or ord(char) > 0x7e for char in value):
+        return None
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def build_filter_program(risk_operations: Dict[str, List[Dict[str, Any]]], allowed_levels) -> Optional[str]:
+    """
+    根据风险规则和允许写入的风险等级生成 awk 过滤程序，无法安全过滤时返回 None。
+    """
+    # 延迟导入，log_parser 在模块级导入本模块
+    from log_parser import OPERATION_TYPE_PREFIXES
+    prefixes_by_type = dict(OPERATION_TYPE_PREFIXES)
+    allowed_levels = {level.capitalize() for level in allowed_levels or []}
+    if not allowed_levels or 'Low' in allowed_levels:
+        return None  # 未命中任何规则的语句默认为 Low，无法在远程排除
+    prefixes = set()
+    keywords = set()
+    match_other = False
+    for level in allowed_levels:
+        for rule in (risk_operations or {}).get(level, []) or []:
+            if not isinstance(rule, dict):
+                continue
+            rule_type = (rule.get('type') or '').strip().upper()
+            rule_keyword = (rule.get('keyword') or '').lower()
+            if rule_type and rule_type != 'OTHER' and rule_type not in prefixes_by_type:
+                continue  # 该规则只可能命中非 Query 命令，而非 Query 行全部保留
+            if rule_keyword:
+                keywords.add(rule_keyword)  # 忽略类型限制，只按关键字保留 (保留范围更大，结果不变)
+            elif rule_type == 'OTHER':
+                match_other = True
+            elif rule_type:
+                prefixes.update(prefixes_by_type[rule_type])
+            else:
+                return None  # 既无类型也无关键字的规则命中所有语句
+    conditions = []
+    for prefix in sorted(prefixes):
+        literal = _awk_string(prefix)
+        conditions.append(f'index(u, {literal}) == 1')
+    if match_other:
+        all_prefixes = [_awk_string(p) for _, group in OPERATION_TYPE_PREFIXES for p in group]
+        conditions.append('(' + ' && '.join(f'index(u, {literal}) != 1' for literal in all_prefixes) + ')')
+    for keyword in sorted(keywords):
+        literal = _awk_string(keyword)
+        if literal is None:
+            return None
+        conditions.append(f'index(l, {literal}) > 0')
+    keep_query = ' || '.join(conditions) if conditions else '0'
+    return f'''
+function keep_query(arg,   u, l) {{
+    u = toupper(arg); sub(/^[ \\t\\r\\n\\v\\f]+/, "", u); l = tolower(arg)
+    return ({keep_query})
+}}
+function flush_skip() {{ if (skip > 0) {{ printf "\\001%d\\n", skip; skip = 0 }} }}
+function handle(line) {{
+    if (line ~ /{_HEADER_RE}/) {{
+        if (!(line ~ /{_QUERY_RE}/) || (match(line, /{_QUERY_RE}/) && keep_query(substr(line, RSTART + RLENGTH)))) {{
+            flush_skip(); print line; return
+        }}
+    }}
+    skip += length(line) + 1
+}}
+NR > 1 {{ handle(prev); consumed += length(prev) + 1 }}
+{{ prev = $0 }}
+END {{
+    # 末尾没有换行符的行可能仍在写入，不处理也不计入偏移
+    if (NR > 0 && consumed + length(prev) + 1 <= total) handle(prev)
+    flush_skip()
+}}
+'''
+
+
+def build_remote_command(file_path: str, offset: int, length: int, program: str) -> str:
+    """生成远程命令：读取文件 [offset, offset + length) 区间并用 awk 过滤"""
+    return (f"tail -c +{int(offset) + 1} -- {shlex.quote(file_path)} | head -c {int(length)} | "
+            f"LC_ALL=C awk -v total={int(length)} {shlex.quote(program)}")
+
+
+def remote_filter_available(ssh_client) -> bool:
+    """检查远程主机是否提供 awk、tail、head 命令"""
+    try:
+        stdin, stdout, stderr = ssh_client.exec_command("command -v awk && command -v tail && command -v head", timeout=30)
+        stdout.read()
+        return stdout.channel.recv_exit_status() == 0
+    except Exception as e:
+        logger.warning(f"检查远程过滤命令失败: {e}")
+        return False
+
+
+class RemoteFilteredSource:
+    """
+    远程过滤命令的输出。迭代时逐行产出保留的行 (bytes)，被丢弃的字节数以 int 产出；
+    命令以非零状态退出时在迭代结束时抛出 RuntimeError。
+    """
+
+    def __init__(self, ssh_client, command: str, timeout: Optional[float] = None, bufsize: int = 256 * 1024):
+        self.channel = ssh_client.get_transport().open_session()
+        if timeout: self.channel.settimeout(timeout)
+        self.channel.exec_command(command)
+        self._stdout = self.channel.makefile('rb', bufsize)
+        self.bytes_transferred = 0
+
+    def __iter__(self) -> Iterator[Union[bytes, int]]:
+        for line in self._stdout:
+            if line.startswith(SKIP_MARKER):
+                yield int(line[1:])
+                continue
+            self.bytes_transferred += len(line)
+            yield line
+        exit_status = self.channel.recv_exit_status()
+        if exit_status != 0:
+            error = self.channel.makefile_stderr('rb').read().decode('utf-8', errors='ignore').strip()
+            raise RuntimeError(f"远程过滤命令退出码 {exit_status}: {error}")
+
+    def close(self):
+        self.channel.close()
@@ -1,143 +1,193 @@
-import pandas as pd
-from datetime import datetime, timedelta
-from models import UserActivity, db
-from sqlalchemy import func, and_
+import csv
+import io
+import json
+from datetime import datetime, timedelta, timezone
+from openpyxl import Workbook
+from config import APP_CONFIG
+from models import get_activity_breakdown, iter_user_activities, get_report_snapshot, reserve_report_snapshot, save_report_snapshot
+
+# 导出的列 (数据库列名 -> 导出列标题)
+EXPORT_COLUMNS = {
+    'id': '操作ID',
+    'server_id': '服务器ID',
+    'user_name': '用户名',
+    'timestamp': '操作时间',
+    'client_host': '客户端主机',
+    'db_name': '数据库',
+    'operation_type': '操作类型',
+    'risk_level': '风险等级',
+    'argument': 'SQL语句',
+    'thread_id': '线程ID'
+}
+# 按自然周期生成的报表类型: daily (自然日)、weekly (周一开始的自然周)、monthly (自然月)
+REPORT_TYPES = ('daily', 'weekly', 'monthly')
+# 流式导出时每次从数据库读取、向客户端发送的行数
+EXPORT_CHUNK_ROWS = APP_CONFIG.get('EXPORT_CHUNK_ROWS', 1000)
+
+
+def report_period(report_type: str, day: datetime):
+    """day 所在的自然日、周或月，返回 (开始, 结束)，结束时间不包含在周期内"""
+    start = day.replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    if report_type == 'daily':
+        return start, start + timedelta(days=1)
+    if report_type == 'weekly':
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(days=7)
+    if report_type == 'monthly':
+        start = start.replace(day=1)
+        return start, (start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1))
+    raise ValueError(f"未知的报表类型: {report_type}")
+
+
+def _json_default(value):
+    """JSON 序列化 datetime 等类型"""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
 
 class ReportGenerator:
     @staticmethod
-    def generate_summary_report(start_date, end_date):
-        """生成指定时间段的汇总报表"""
-        activities = UserActivity.query.filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date
-            )
-        )
-
-        # 按风险等级统计
-        risk_stats = db.session.query(
-            UserActivity.risk_level,
-            func.count(UserActivity.id)
-        ).filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date
-            )
-        ).group_by(UserActivity.risk_level).all()
-
-        # 活跃用户统计
-        active_users = db.session.query(
-            UserActivity.user_name,
-            func.count(UserActivity.id)
-        ).filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date
-            )
-        ).group_by(UserActivity.user_name).all()
-
-        # 按风险等级分类的操作类型统计
-        high_risk_ops = db.session.query(
-            UserActivity.operation_type,
-            func.count(UserActivity.id)
-        ).filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date,
-                UserActivity.risk_level == 'High'
-            )
-        ).group_by(UserActivity.operation_type).all()
-
-        medium_risk_ops = db.session.query(
-            UserActivity.operation_type,
-            func.count(UserActivity.id)
-        ).filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date,
-                UserActivity.risk_level == 'Medium'
-            )
-        ).group_by(UserActivity.operation_type).all()
-
-        low_risk_ops = db.session.query(
-            UserActivity.operation_type,
-            func.count(UserActivity.id)
-        ).filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date,
-                UserActivity.risk_level == 'Low'
-            )
-        ).group_by(UserActivity.operation_type).all()
+    def generate_summary_report(start_date, end_date, refresh=False):
+        """
+        生成指定时间段的汇总报表。全部内容由一次 get_activity_breakdown 的结果汇总得出
+        (整点小时部分读取 activity_rollup_hourly，首尾不足一小时的部分查询明细表)。refresh 为 True 时不使用统计缓存。
+        """
+        breakdown = get_activity_breakdown(start_date=start_date, end_date=end_date, refresh=refresh)
+
+        # 一次遍历同时按风险等级、用户、风险等级+操作类型汇总
+        risk_stats = {}
+        active_users = {}
+        risk_ops = {'High': {}, 'Medium': {}, 'Low': {}}
+        for (_, user_name, operation_type, risk_level), count in breakdown.items():
+            risk_stats[risk_level] = risk_stats.get(risk_level, 0) + count
+            active_users[user_name] = active_users.get(user_name, 0) + count
+            ops = risk_ops.setdefault(risk_level, {})
+            ops[operation_type] = ops.get(operation_type, 0) + count
 
         return {
             'period': {
                 'start': start_date,
                 'end': end_date
             },
-            'risk_level_summary': dict(risk_stats),
-            'active_users': dict(active_users),
+            'risk_level_summary': risk_stats,
+            'active_users': active_users,
             'operation_types': {
-                'high_risk': dict(high_risk_ops),
-                'medium_risk': dict(medium_risk_ops),
-                'low_risk': dict(low_risk_ops)
+                'high_risk': risk_ops['High'],
+                'medium_risk': risk_ops['Medium'],
+                'low_risk': risk_ops['Low']
             },
-            'total_operations': activities.count()
+            'total_operations': sum(breakdown.values())
         }
 
     @staticmethod
-    def export_activities(start_date, end_date, risk_levels=None, users=None, operation_types=None):
-        """导出操作记录为DataFrame"""
-        query = UserActivity.query.filter(
-            and_(
-                UserActivity.timestamp >= start_date,
-                UserActivity.timestamp <= end_date
-            )
-        )
-
-        if risk_levels:
-            query = query.filter(UserActivity.risk_level.in_(risk_levels))
-        if users:
-            query = query.filter(UserActivity.user_name.in_(users))
-        if operation_types:
-            query = query.filter(UserActivity.operation_type.in_(operation_types))
-
-        activities = query.all()
-        
-        data = []
-        for activity in activities:
-            data.append({
-                '操作ID': activity.id,
-                '服务器ID': activity.server_id,
-                '用户名': activity.user_name,
-                '操作时间': activity.timestamp,
-                '客户端主机': activity.client_host,
-                '数据库': activity.db_name,
-                '操作类型': activity.operation_type,
-                '风险等级': activity.risk_level,
-                'SQL语句': activity.argument,
-                '线程ID': activity.thread_id
-            })
-        
-        return pd.DataFrame(data)
+    def iter_export_csv(start_date, end_date, risk_levels=None, users=None, operation_types=None):
+        """流式生成 CSV 内容 (UTF-8 BOM，便于 Excel 打开)，每 EXPORT_CHUNK_ROWS 行产出一块"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS.values())
+        yield '\ufeff' + buffer.getvalue()
+        buffer.seek(0); buffer.truncate()
+        rows = iter_user_activities(start_date, end_date, risk_levels=risk_levels, users=users, operation_types=operation_types,
+                                    chunk_size=EXPORT_CHUNK_ROWS)
+        count = 0
+        for row in rows:
+            writer.writerow(row.get(column) for column in EXPORT_COLUMNS)
+            count += 1
+            if count % EXPORT_CHUNK_ROWS == 0:
+                yield buffer.getvalue()
+                buffer.seek(0); buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    @staticmethod
+    def iter_export_jsonl(start_date, end_date, risk_levels=None, users=None, operation_types=None):
+        """流式生成 JSON Lines 内容 (每行一条记录，字段名与数据库列名一致)"""
+        rows = iter_user_activities(start_date, end_date, risk_levels=risk_levels, users=users, operation_types=operation_types,
+                                    chunk_size=EXPORT_CHUNK_ROWS)
+        lines = []
+        for row in rows:
+            lines.append(json.dumps(row, ensure_ascii=False, default=_json_default))
+            if len(lines) >= EXPORT_CHUNK_ROWS:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def export_excel(start_date, end_date, risk_levels=None, users=None, operation_types=None, max_rows=None):
+        """
+        导出为 Excel (openpyxl 只写模式，逐行写入)，最多写入 max_rows 行 (默认 EXPORT_EXCEL_MAX_ROWS)。
+        返回 (BytesIO, 写入行数, 是否被截断)。
+        """
+        max_rows = max_rows or APP_CONFIG.get('EXPORT_EXCEL_MAX_ROWS', 100000)
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('操作记录')
+        sheet.append(list(EXPORT_COLUMNS.values()))
+        rows = iter_user_activities(start_date, end_date, risk_levels=risk_levels, users=users, operation_types=operation_types,
+                                    chunk_size=EXPORT_CHUNK_ROWS)
+        count = 0
+        truncated = False
+        try:
+            for row in rows:
+                if count >= max_rows:
+                    truncated = True
+                    break
+                sheet.append([row.get(column) for column in EXPORT_COLUMNS])
+                count += 1
+        finally:
+            rows.close()
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        buffer.seek(0)
+        return buffer, count, truncated
+
+    @classmethod
+    def generate_period_report(cls, report_type, day):
+        """
+        生成 day 所在自然周期 (见 report_period) 的报表。已结束的周期 (结束时间不晚于今天 UTC 零点) 优先读取快照，
+        没有快照时先写入占位行，再绕过统计缓存 (其中可能有其他进程写入前的结果) 计算，最后填充占位行；
+        计算期间写入该周期记录的批次会删除占位行，此时不保存快照 (见 reserve_report_snapshot)。
+        写入该周期内的记录时快照被删除，下次请求重新生成。
+        """
+        start_date, end_date = report_period(report_type, day)
+        today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+        closed = end_date <= today
+        if closed:
+            snapshot = get_report_snapshot(report_type, start_date)
+            if snapshot is not None:
+                # 快照中的时间保存为 ISO 字符串，恢复为 datetime，与实时生成的报表一致
+                snapshot['period'] = {key: datetime.fromisoformat(value) for key, value in snapshot['period'].items()}
+                return snapshot
+            reserve_report_snapshot(report_type, start_date, end_date)
+        report = cls.generate_summary_report(start_date, end_date - timedelta(microseconds=1), refresh=closed)
+        if closed:
+            save_report_snapshot(report_type, start_date, report)
+        return report
 
     @classmethod
-    def generate_daily_report(cls):
-        """生成日报"""
+    def generate_daily_report(cls, day=None):
+        """生成日报: 指定 day 时为该自然日，否则为最近 24 小时"""
+        if day is not None:
+            return cls.generate_period_report('daily', day)
         end_date = datetime.now()
         start_date = end_date - timedelta(days=1)
         return cls.generate_summary_report(start_date, end_date)
 
     @classmethod
-    def generate_weekly_report(cls):
-        """生成周报"""
+    def generate_weekly_report(cls, day=None):
+        """生成周报: 指定 day 时为其所在的自然周 (周一开始)，否则为最近 7 天"""
+        if day is not None:
+            return cls.generate_period_report('weekly', day)
         end_date = datetime.now()
         start_date = end_date - timedelta(days=7)
         return cls.generate_summary_report(start_date, end_date)
 
     @classmethod
-    def generate_monthly_report(cls):
-        """生成月报"""
+    def generate_monthly_report(cls, day=None):
+        """生成月报: 指定 day 时为其所在的自然月，否则为最近 30 天"""
+        if day is not None:
+            return cls.generate_period_report('monthly', day)
         end_date = datetime.now()
         start_date = end_date - timedelta(days=30)
         return cls.generate_summary_report(start_date, end_date) 
\ No newline at end of file
@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+风险规则编译与匹配
+将结构化的 RISK_OPERATIONS 规则编译为不可变的匹配器：
+按操作类型建立分派表，每个操作类型对应按 High -> Medium -> Low 排列的检查步骤，
+每一步的全部关键字合并为一个基于前缀树生成的正则表达式，一次扫描即可判断是否命中。
+匹配器只在存储的 RISK_OPERATIONS 发生变化时重新编译。
+"""
+import json
+import logging
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+from config import APP_CONFIG
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 风险等级按优先级排列
+RISK_LEVELS = ('High', 'Medium', 'Low')
+DEFAULT_RISK_LEVEL = 'Low'
+
+
+def build_keyword_regex(keywords) -> Optional['re.Pattern']:
+    """
+    将一组关键字 (已转为小写) 合并为单个正则表达式。
+    先构建前缀树再生成正则，共享前缀只比较一次，匹配代价随关键字数量增长很慢。
+    """
+    keywords = sorted({k for k in keywords if k})
+    if not keywords:
+        return None
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = True  # 关键字结束标记
+
+    def to_pattern(node) -> str:
+        # 只需判断是否包含任一关键字：到达某个关键字的结尾即已命中，更长的关键字无需再比较
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + to_pattern(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return re.compile(to_pattern(trie))
+
+
+class CompiledRiskRules:
+    """
+    不可变的风险规则匹配器。
+    规则语义与原先逐条比较相同：规则的 type 和 keyword 同时满足 (未配置的字段视为满足) 才算命中，
+    依次检查 High、Medium、Low，均未命中时返回 Low。
+    """
+    __slots__ = ('_dispatch', '_default_plan', 'rule_count', 'keyword_count')
+
+    def __init__(self, risk_operations: Optional[Dict[str, List[Dict[str, Any]]]]):
+        risk_operations = risk_operations or {}
+        # 每个等级的规则拆分为: 无条件命中、按类型命中、任意类型的关键字、指定类型的关键字
+        levels = []
+        all_types = set()
+        rule_count = 0
+        keywords_seen = set()
+        for level in RISK_LEVELS:
+            match_all = False
+            type_only = set()
+            any_type_keywords = set()
+            typed_keywords = {}
+            for rule in risk_operations.get(level, []) or []:
+                if not isinstance(rule, dict):
+                    continue
+                rule_count += 1
+                rule_type = (rule.get('type') or '').strip().upper()
+                rule_keyword = (rule.get('keyword') or '').lower()
+                if rule_keyword:
+                    keywords_seen.add(rule_keyword)
+                if rule_type:
+                    all_types.add(rule_type)
+                    if rule_keyword:
+                        typed_keywords.setdefault(rule_type, set()).add(rule_keyword)
+                    else:
+                        type_only.add(rule_type)
+                elif rule_keyword:
+                    any_type_keywords.add(rule_keyword)
+                else:
+                    match_all = True
+            levels.append((level, match_all, type_only, any_type_keywords, typed_keywords))
+
+        self._dispatch = {op_type: self._build_plan(levels, op_type) for op_type in all_types}
+        self._default_plan = self._build_plan(levels, None)
+        self.rule_count = rule_count
+        self.keyword_count = len(keywords_seen)
+
+    @staticmethod
+    def _build_plan(levels, op_type: Optional[str]) -> Tuple[Tuple[str, Optional['re.Pattern']], ...]:
+        """为某个操作类型生成检查步骤: ((等级, 关键字正则或 None 表示直接命中), ...)"""
+        plan = []
+        for level, match_all, type_only, any_type_keywords, typed_keywords in levels:
+            if match_all or (op_type is not None and op_type in type_only):
+                plan.append((level, None))
+                break  # 之后的等级不可能再被选中
+            keywords = set(any_type_keywords)
+            if op_type is not None:
+                keywords |= typed_keywords.get(op_type, set())
+            regex = build_keyword_regex(keywords)
+            if regex is not None:
+                plan.append((level, regex))
+        return tuple(plan)
+
+    def classify(self, operation_type: str, argument: str) -> str:
+        """返回操作的风险等级"""
+        plan = self._dispatch.get(operation_type.upper(), self._default_plan) if operation_type else self._default_plan
+        argument_lower = None
+        for level, regex in plan:
+            if regex is None:
+                return level
+            if argument_lower is None:
+                argument_lower = argument.lower()
+            if regex.search(argument_lower):
+                return level
+        return DEFAULT_RISK_LEVEL
+
+
+# --- 当前生效的匹配器 ---
+_matcher_lock = threading.Lock()
+_current_key = None
+_current_matcher = None
+
+
+def _rules_key(risk_operations) -> str:
+    return json.dumps(risk_operations or {}, sort_keys=True, ensure_ascii=False)
+
+
+def set_risk_rules(risk_operations) -> CompiledRiskRules:
+    """使用给定规则作为当前生效规则；规则内容未变化时直接复用已编译的匹配器"""
+    global _current_key, _current_matcher
+    key = _rules_key(risk_operations)
+    with _matcher_lock:
+        if _current_matcher is not None and key == _current_key:
+            return _current_matcher
+        matcher = CompiledRiskRules(risk_operations)
+        _current_key, _current_matcher = key, matcher
+    logger.info(f"风险规则已重新编译: {matcher.rule_count} 条规则, {matcher.keyword_count} 个关键字")
+    return matcher
+
+
+def refresh_risk_rules() -> CompiledRiskRules:
+    """从数据库读取存储的 RISK_OPERATIONS，若有变化则重新编译；读取失败时沿用当前规则或 APP_CONFIG 默认值"""
+    # 延迟导入，避免在子进程等场景中无谓地加载数据库模块
+    from models import get_system_setting
+    stored = get_system_setting('RISK_OPERATIONS')
+    if isinstance(stored, dict) and stored:
+        return set_risk_rules(stored)
+    if _current_matcher is not None:
+        return _current_matcher
+    logger.warning("未能读取存储的风险规则，使用 APP_CONFIG 中的默认规则。")
+    return set_risk_rules(APP_CONFIG.get('RISK_OPERATIONS', {}))
+
+
+def get_risk_rules() -> Dict[str, List[Dict[str, Any]]]:
+    """返回当前生效匹配器对应的规则 (副本)"""
+    get_risk_matcher()
+    return json.loads(_current_key)
+
+
+def get_risk_matcher() -> CompiledRiskRules:
+    """返回当前生效的匹配器，尚未初始化时使用 APP_CONFIG 中的默认规则"""
+    matcher = _current_matcher
+    if matcher is None:
+        matcher = set_risk_rules(APP_CONFIG.get('RISK_OPERATIONS', {}))
+    return matcher
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+后台扫描任务管理
+扫描请求提交后在后台线程中执行，立即返回任务 ID，前端通过任务 ID 轮询进度。
+任务状态只保存在当前 Web 进程的内存中。
+"""
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List
+from config import APP_CONFIG
+from log_parser import scan_logs_for_server, scan_all_servers
+
+# 配置日志记录器
+logger = logging.getLogger(__name__)
+
+# 任务状态
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class ScanProgress:
+    """线程安全的扫描进度计数器，由 log_parser 在扫描过程中更新"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = None
+        self.finished_at = None
+        self.files_queued = 0
+        self.files_done = 0
+        self.bytes_total = 0
+        self.bytes_read = 0
+        self.lines_parsed = 0
+        self.rows_inserted = 0
+
+    def start(self):
+        with self._lock:
+            self.started_at = time.monotonic()
+
+    def finish(self):
+        with self._lock:
+            self.finished_at = time.monotonic()
+
+    def add_files(self, count: int, bytes_total: int):
+        """登记待处理的文件数及其待读取字节数"""
+        with self._lock:
+            self.files_queued += count
+            self.bytes_total += max(0, bytes_total)
+
+    def file_done(self):
+        with self._lock:
+            self.files_done += 1
+
+    def add_bytes(self, count: int):
+        with self._lock:
+            self.bytes_read += count
+
+    def add_lines(self, count: int):
+        with self._lock:
+            self.lines_parsed += count
+
+    def add_rows(self, count: int):
+        with self._lock:
+            self.rows_inserted += count
+
+    def snapshot(self) -> Dict[str, Any]:
+        """返回当前进度，ETA 按已读取字节的平均速率估算"""
+        with self._lock:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at if self.started_at else 0.0
+            eta_seconds = None
+            remaining = self.bytes_total - self.bytes_read
+            if self.finished_at:
+                eta_seconds = 0.0
+            elif self.bytes_read > 0 and elapsed > 0 and remaining > 0:
+                eta_seconds = round(remaining / (self.bytes_read / elapsed), 1)
+            elif self.files_queued and self.files_done >= self.files_queued:
+                eta_seconds = 0.0
+            return {
+                'files_queued': self.files_queued,
+                'files_done': self.files_done,
+                'bytes_total': self.bytes_total,
+                'bytes_read': self.bytes_read,
+                'lines_parsed': self.lines_parsed,
+                'rows_inserted': self.rows_inserted,
+                'elapsed_seconds': round(elapsed, 1),
+                'eta_seconds': eta_seconds
+            }
+
+
+class ScanJob:
+    """一次扫描任务 (单台服务器或全部服务器)"""
+
+    def __init__(self, server_id: Optional[int] = None, server_config: Optional[Dict[str, Any]] = None, writer_mode: Optional[str] = None):
+        self.job_id = uuid.uuid4().hex
+        self.server_id = server_id
+        self.server_config = server_config
+        self.writer_mode = writer_mode
+        self.state = JOB_QUEUED
+        self.progress = ScanProgress()
+        self.result = None
+        self.error = None
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def is_active(self) -> bool:
+        return self.state in (JOB_QUEUED, JOB_RUNNING)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'server_id': self.server_id,
+            'writer_mode': self.writer_mode,
+            'state': self.state,
+            'progress': self.progress.snapshot(),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class ScanJobManager:
+    """在有界线程池中执行扫描任务，并保留最近的任务记录供查询"""
+
+    def __init__(self, max_workers: int = 2, history_size: int = 50):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scan-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._history_size = history_size
+
+    def submit(self, server_id: Optional[int] = None, server_config: Optional[Dict[str, Any]] = None, writer_mode: Optional[str] = None):
+        """
+        提交扫描任务，返回 (job, created)。writer_mode 为本次扫描的批量写入方式，未指定时使用默认配置。
+        如果已有覆盖同一服务器的任务在排队或运行，直接返回该任务，避免重复写入。
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.is_active and (job.server_id is None or server_id is None or job.server_id == server_id):
+                    logger.info(f"已有扫描任务 {job.job_id} (server_id={job.server_id}) 在运行，复用该任务")
+                    return job, False
+            job = ScanJob(server_id, server_config, writer_mode)
+            self._jobs[job.job_id] = job
+            self._trim_history()
+        self._executor.submit(self._run, job)
+        logger.info(f"已提交扫描任务 {job.job_id} (server_id={server_id})")
+        return job, True
+
+    def get(self, job_id: str) -> Optional[ScanJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in reversed(jobs)]
+
+    def _trim_history(self):
+        """只保留最近的任务记录，正在运行的任务不会被清除"""
+        finished = [job_id for job_id, job in self._jobs.items() if not job.is_active]
+        while len(self._jobs) > self._history_size and finished:
+            self._jobs.pop(finished.pop(0), None)
+
+    def _run(self, job: ScanJob):
+        job.state = JOB_RUNNING
+        job.started_at = datetime.now(timezone.utc)
+        job.progress.start()
+        try:
+            if job.server_id is not None:
+                job.result = scan_logs_for_server(job.server_config, progress=job.progress, writer_mode=job.writer_mode)
+                failed = job.result.get('status') == 'failed'
+                job.error = job.result.get('error') if failed else None
+            else:
+                job.result = scan_all_servers(progress=job.progress, writer_mode=job.writer_mode)
+                failed = False
+            job.state = JOB_FAILED if failed else JOB_COMPLETED
+        except Exception as e:
+            logger.exception(f"扫描任务 {job.job_id} 执行失败: {e}")
+            job.error = str(e)
+            job.state = JOB_FAILED
+        finally:
+            job.progress.finish()
+            job.finished_at = datetime.now(timezone.utc)
+            logger.info(f"扫描任务 {job.job_id} 结束，状态: {job.state}")
+
+
+# 全局任务管理器
+scan_job_manager = ScanJobManager(
+    max_workers=APP_CONFIG.get('SCAN_JOB_WORKERS', 2),
+    history_size=APP_CONFIG.get('SCAN_JOB_HISTORY', 50)
+)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+SQL 指纹 (digest)
+将语句规范化后计算摘要，只有字面量不同的语句得到相同的指纹:
+  - 去掉注释，字符串、数字 (含十六进制、小数、科学计数法) 字面量替换为 ?
+  - IN (?, ?, ...) 折叠为 IN (...)，多行 VALUES (...), (...) 折叠为一行
+  - 连续空白合并为一个空格，括号、逗号、比较运算符两侧不留空格，统一为小写，去掉末尾的分号
+"""
+import hashlib
+import re
+
+# 按顺序匹配: 注释、字符串、反引号标识符、数字、空白
+_TOKEN = re.compile(r"""
+    (?P<comment>/\*.*?\*/|--[^\n]*|\#[^\n]*)
+  | (?P<string>'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*")
+  | (?P<ident>`(?:[^`]|``)*`)
+  | (?P<number>\b0x[0-9a-f]+\b|(?<![\w.])\d+(?:\.\d*)?(?:e[+-]?\d+)?\b|(?<![\w.])\.\d+(?:e[+-]?\d+)?\b)
+  | (?P<space>\s+)
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+_PUNCTUATION_SPACE = re.compile(r' ?([(),=<>]) ?')
+_IN_LIST = re.compile(r'\bin\((?:\?,)*\?\)')
+_VALUES_ROWS = re.compile(r'(\((?:\?,)*\?\))(?:,\((?:\?,)*\?\))+')
+
+
+def _replace_token(match) -> str:
+    kind = match.lastgroup
+    if kind == 'ident': return match.group()
+    if kind == 'string' or kind == 'number': return '?'
+    return ' '
+
+
+def normalize_sql(sql: str) -> str:
+    """返回规范化后的语句文本 (见模块说明)"""
+    text = _TOKEN.sub(_replace_token, sql or '').strip().lower()
+    text = _PUNCTUATION_SPACE.sub(r'\1', text)
+    text = _IN_LIST.sub('in(...)', text)
+    text = _VALUES_ROWS.sub(r'\1', text)
+    return text.rstrip('; ')
+
+
+def sql_digest(sql: str) -> str:
+    """返回语句指纹 (规范化文本的 32 位十六进制摘要)"""
+    return hashlib.blake2b(normalize_sql(sql).encode('utf-8'), digest_size=16).hexdigest()
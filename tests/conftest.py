@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+"""
+测试在项目根目录执行: python -m pytest tests
+需要 requirements.txt 中的依赖和 pytest，不需要 MySQL (数据库相关的测试使用 fake_db 中的内存数据库)。
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# 解析相关的测试使用 benchmarks 中的合成日志生成器
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from fake_db import FakeDatabase
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    """将 models 的数据库连接替换为内存数据库，并清空进程内的缓存"""
+    import models
+    db = FakeDatabase()
+    monkeypatch.setattr(models, 'get_db_connection', db.connect)
+    models.clear_stats_cache()
+    models._activity_count_cache.invalidate()
+    models._sql_text_cache.invalidate()
+    for cache in (*models._dimension_ids.values(), *models._dimension_names.values()):
+        cache.clear()
+    return db
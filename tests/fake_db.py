@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+测试用的内存数据库
+只实现 models 中实际执行的语句 (按语句形式匹配)，用于在没有 MySQL 的环境中检查写入和统计的结果。
+名称比较模拟 MySQL 的行为: 维度表的 name 列超出长度时截断，比较时忽略末尾空格 (PAD SPACE)。
+"""
+import re
+
+from models import DIGEST_KEY_COLUMNS, ROLLUP_KEY_COLUMNS
+
+# 维度表 name 列的长度
+DIMENSION_NAME_LENGTHS = {'dim_users': 100, 'dim_hosts': 255, 'dim_databases': 100}
+
+_CONDITION = re.compile(r"^`?([\w.]+)`? (=|>=|<=|<|>) %s$")
+_OPERATORS = {'=': lambda a, b: a == b, '>=': lambda a, b: a >= b, '<=': lambda a, b: a <= b,
+              '<': lambda a, b: a < b, '>': lambda a, b: a > b}
+
+
+def _pad_space(value):
+    return value.rstrip(' ') if isinstance(value, str) else value
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._rows = []
+
+    def execute(self, sql, params=None):
+        sql = ' '.join(sql.split())
+        self.db.statements.append(sql)
+        rows = self.db.execute(sql, list(params or []))
+        self._rows = list(rows) if rows is not None else []
+        self.rowcount = self.db.last_rowcount
+
+    def executemany(self, sql, seq_params):
+        total = 0
+        for params in seq_params:
+            self.execute(sql, params)
+            total += self.rowcount
+        self.rowcount = total
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self, cursor=None):
+        return FakeCursor(self.db)
+
+    def commit(self):
+        self.db.commits += 1
+
+    def rollback(self):
+        self.db.rollbacks += 1
+
+    def close(self):
+        pass
+
+    def discard(self):
+        pass
+
+
+class FakeDatabase:
+    """
+    表为字典列表；partitions 为 user_activities 的分区 [(分区名, 上界)]，为空表示未分区；
+    explain_rows 为 EXPLAIN 语句返回的执行计划行
+    """
+
+    def __init__(self):
+        self.tables = {name: [] for name in ('user_activities', 'activity_rollup_hourly', 'sql_digest_summary', 'sql_texts',
+                                             'report_snapshots', 'system_settings', *DIMENSION_NAME_LENGTHS)}
+        self.partitions = []
+        self.explain_rows = []
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.last_rowcount = 0
+        self._next_id = {}
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def statements_matching(self, pattern):
+        return [sql for sql in self.statements if re.search(pattern, sql)]
+
+    # --- 语句分发 ---
+    def execute(self, sql, params):
+        self.last_rowcount = 0
+        for pattern, handler in self._handlers():
+            match = re.match(pattern, sql)
+            if match:
+                return handler(match, params)
+        raise NotImplementedError(f"FakeDatabase 不支持的语句: {sql}")
+
+    def _handlers(self):
+        return (
+            (r"INSERT INTO user_activities \((.+?)\) VALUES", self._insert_activity),
+            (r"INSERT INTO activity_rollup_hourly", self._upsert_rollup),
+            (r"INSERT INTO sql_digest_summary", self._upsert_digest),
+            (r"INSERT IGNORE INTO (dim_\w+) \(name\) VALUES", self._insert_dimension),
+            (r"SELECT id, name FROM (dim_\w+) WHERE (name|id) IN", self._select_dimension),
+            (r"INSERT IGNORE INTO sql_texts", self._insert_sql_text),
+            (r"DELETE FROM report_snapshots WHERE period_start <= %s AND period_end > %s", self._delete_snapshots),
+            (r"INSERT IGNORE INTO report_snapshots .* VALUES \(%s, %s, %s, '', %s\)", self._reserve_snapshot),
+            (r"UPDATE report_snapshots SET data = %s, created_at = %s WHERE report_type = %s AND period_start = %s AND data = ''$",
+             self._fill_snapshot),
+            (r"SELECT data FROM report_snapshots WHERE report_type = %s AND period_start = %s AND data <> ''$", self._select_snapshot),
+            (r"SELECT value FROM system_settings WHERE `key` = %s", self._select_setting),
+            (r"SELECT partition_name AS name, .* FROM information_schema.partitions", self._select_partitions),
+            (r"SELECT GET_LOCK\(", lambda match, params: [{'locked': 1}]),
+            (r"DO RELEASE_LOCK\(", lambda match, params: None),
+            (r"ALTER TABLE user_activities DROP PARTITION (.+)$", self._drop_partitions),
+            (r"DELETE FROM (\w+) WHERE `?(\w+)`? < %s LIMIT (\d+)$", self._delete_before),
+            (r"SELECT text_hash FROM sql_texts WHERE text_hash > %s ORDER BY text_hash LIMIT (\d+)$", self._page_sql_texts),
+            (r"DELETE FROM sql_texts WHERE text_hash IN \(.*\) AND NOT EXISTS", self._delete_unreferenced_sql_texts),
+            (r"EXPLAIN SELECT ", lambda match, params: [dict(row) for row in self.explain_rows]),
+            (r"SELECT HOUR\(`(hour|timestamp)`\) AS hour_of_day, .* FROM (\w+) WHERE (.+?) GROUP BY", self._select_breakdown),
+        )
+
+    def _where(self, clause, params):
+        """解析由 AND 连接的简单条件 (列 运算符 %s)，返回 (判断函数, 剩余参数)"""
+        conditions = []
+        if clause != '1=1':
+            for part in clause.split(' AND '):
+                match = _CONDITION.match(part.strip())
+                if not match:
+                    raise NotImplementedError(f"FakeDatabase 不支持的条件: {part}")
+                conditions.append((match.group(1).split('.')[-1], _OPERATORS[match.group(2)], params.pop(0)))
+
+        def predicate(row):
+            return all(row.get(column) is not None and op(row[column], value) for column, op, value in conditions)
+        return predicate, params
+
+    def _new_id(self, table):
+        self._next_id[table] = self._next_id.get(table, 0) + 1
+        return self._next_id[table]
+
+    # --- 写入 ---
+    def _insert_activity(self, match, params):
+        columns = [column.strip(' `') for column in match.group(1).split(',')]
+        row = dict(zip(columns, params))
+        row['id'] = self._new_id('user_activities')
+        self.tables['user_activities'].append(row)
+        self.last_rowcount = 1
+
+    def _upsert(self, table, key_columns, row, merge):
+        for existing in self.tables[table]:
+            if all(existing[column] == row[column] for column in key_columns):
+                merge(existing, row)
+                return
+        self.tables[table].append(row)
+
+    def _upsert_rollup(self, match, params):
+        row = dict(zip(ROLLUP_KEY_COLUMNS + ['count'], params))
+        self._upsert('activity_rollup_hourly', ROLLUP_KEY_COLUMNS, row,
+                     lambda existing, new: existing.update(count=existing['count'] + new['count']))
+
+    def _upsert_digest(self, match, params):
+        row = dict(zip(DIGEST_KEY_COLUMNS + ['operation_type', 'risk_level', 'sample_text', 'count', 'first_seen', 'last_seen'], params))
+
+        def merge(existing, new):
+            existing['count'] += new['count']
+            existing['first_seen'] = min(existing['first_seen'], new['first_seen'])
+            existing['last_seen'] = max(existing['last_seen'], new['last_seen'])
+        self._upsert('sql_digest_summary', DIGEST_KEY_COLUMNS, row, merge)
+
+    def _insert_dimension(self, match, params):
+        table = match.group(1)
+        name = params[0][:DIMENSION_NAME_LENGTHS[table]]  # 超出列长度的部分被截断
+        if any(_pad_space(row['name']) == _pad_space(name) for row in self.tables[table]):
+            return
+        self.tables[table].append({'id': self._new_id(table), 'name': name})
+        self.last_rowcount = 1
+
+    def _select_dimension(self, match, params):
+        table, column = match.groups()
+        if column == 'id':
+            return [dict(row) for row in self.tables[table] if row['id'] in params]
+        wanted = {_pad_space(name) for name in params}
+        return [dict(row) for row in self.tables[table] if _pad_space(row['name']) in wanted]
+
+    def _insert_sql_text(self, match, params):
+        text_hash, text, length = params
+        if any(row['text_hash'] == text_hash for row in self.tables['sql_texts']):
+            return
+        self.tables['sql_texts'].append({'text_hash': text_hash, 'sql_text': text, 'text_length': length})
+        self.last_rowcount = 1
+
+    def _delete_snapshots(self, match, params):
+        latest, earliest = params
+        rows = self.tables['report_snapshots']
+        kept = [row for row in rows if not (row['period_start'] <= latest and row['period_end'] > earliest)]
+        self.last_rowcount = len(rows) - len(kept)
+        self.tables['report_snapshots'] = kept
+
+    def _find_snapshot(self, report_type, period_start):
+        for row in self.tables['report_snapshots']:
+            if (row['report_type'], row['period_start']) == (report_type, period_start):
+                return row
+        return None
+
+    def _reserve_snapshot(self, match, params):
+        report_type, period_start, period_end, created_at = params
+        if self._find_snapshot(report_type, period_start) is None:
+            self.tables['report_snapshots'].append({'report_type': report_type, 'period_start': period_start, 'period_end': period_end,
+                                                    'data': '', 'created_at': created_at})
+            self.last_rowcount = 1
+
+    def _fill_snapshot(self, match, params):
+        data, created_at, report_type, period_start = params
+        row = self._find_snapshot(report_type, period_start)
+        if row is not None and row['data'] == '':
+            row.update(data=data, created_at=created_at)
+            self.last_rowcount = 1
+
+    def _drop_partitions(self, match, params):
+        names = {name.strip() for name in match.group(1).split(',')}
+        lower, kept = None, []
+        for name, upper in self.partitions:
+            if name in names:
+                self.tables['user_activities'] = [row for row in self.tables['user_activities']
+                                                  if not ((lower is None or row['timestamp'] >= lower) and (upper is None or row['timestamp'] < upper))]
+            else:
+                kept.append((name, upper))
+            lower = upper
+        self.partitions = kept
+
+    def _delete_before(self, match, params):
+        table, column, limit = match.group(1), match.group(2), int(match.group(3))
+        rows = self.tables[table]
+        doomed = set([index for index, row in enumerate(rows) if row[column] < params[0]][:limit])
+        self.tables[table] = [row for index, row in enumerate(rows) if index not in doomed]
+        self.last_rowcount = len(doomed)
+
+    def _delete_unreferenced_sql_texts(self, match, params):
+        referenced = {row.get('argument_hash') for row in self.tables['user_activities']}
+        rows = self.tables['sql_texts']
+        kept = [row for row in rows if row['text_hash'] not in params or row['text_hash'] in referenced]
+        self.last_rowcount = len(rows) - len(kept)
+        self.tables['sql_texts'] = kept
+
+    # --- 查询 ---
+    def _select_snapshot(self, match, params):
+        row = self._find_snapshot(*params)
+        return [{'data': row['data']}] if row is not None and row['data'] != '' else []
+
+    def _select_partitions(self, match, params):
+        return [{'name': name, 'description': f"'{upper:%Y-%m-%d %H:%M:%S}'" if upper else 'MAXVALUE', 'row_estimate': 0}
+                for name, upper in self.partitions]
+
+    def _page_sql_texts(self, match, params):
+        hashes = sorted(row['text_hash'] for row in self.tables['sql_texts'] if row['text_hash'] > params[0])
+        return [{'text_hash': text_hash} for text_hash in hashes[:int(match.group(1))]]
+
+    def _select_setting(self, match, params):
+        return [{'value': row['value']} for row in self.tables['system_settings'] if row['key'] == params[0]]
+
+    def _select_breakdown(self, match, params):
+        time_column, table, clause = match.groups()
+        predicate, _ = self._where(clause, params)
+        groups = {}
+        for row in filter(predicate, self.tables[table]):
+            key = (row[time_column].hour, row.get('user_id'), row.get('user_name'), row.get('operation_type'), row.get('risk_level'))
+            groups[key] = groups.get(key, 0) + (1 if table == 'user_activities' else row['count'])
+        return [{'hour_of_day': key[0], 'user_id': key[1], 'user_name': key[2], 'operation_type': key[3], 'risk_level': key[4],
+                 'count': count} for key, count in groups.items()]
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""操作记录列表的估算总数 (count_mode='approx')"""
+import models
+
+
+def approx_total(fake_db, plan):
+    fake_db.explain_rows = plan
+    with fake_db.connect().cursor() as cursor:
+        return models._count_activities(cursor, "ua.`timestamp` >= %s", ['2024-05-01'], 'approx')
+
+
+def test_estimate_uses_only_the_activity_table_row(fake_db):
+    plan = [{'id': 1, 'table': '<subquery2>', 'rows': None, 'filtered': 100.0},
+            {'id': 1, 'table': 'ua', 'rows': 1200, 'filtered': 100.0},
+            {'id': 2, 'table': 'dim_users', 'rows': 50000, 'filtered': 10.0}]
+    assert approx_total(fake_db, plan) == (1200, True)
+
+
+def test_estimate_applies_filtered_ratio(fake_db):
+    assert approx_total(fake_db, [{'table': 'ua', 'rows': 80000, 'filtered': 2.5}]) == (2000, True)
+    # 旧版本的 EXPLAIN 没有 filtered 列
+    assert approx_total(fake_db, [{'table': 'ua', 'rows': 80000}]) == (80000, True)
+    assert approx_total(fake_db, []) == (0, True)
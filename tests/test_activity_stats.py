@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""写入活动记录后的统计结果 (预聚合表、明细表和 SQL 指纹汇总的合并)"""
+from datetime import datetime
+
+import models
+from config import APP_CONFIG
+
+AGGREGATE_LOW = {'High': 'full', 'Medium': 'full', 'Low': 'aggregate'}
+
+
+def activity(timestamp, operation_type='SELECT', risk_level='Low', argument='SELECT * FROM orders WHERE id = 1', user_name='app'):
+    return {'server_id': 1, 'timestamp': timestamp, 'user_name': user_name, 'client_host': '10.0.0.5', 'db_name': 'shop',
+            'thread_id': 7, 'command_type': 'Query', 'operation_type': operation_type, 'argument': argument, 'risk_level': risk_level}
+
+
+def total(breakdown):
+    return sum(breakdown.values())
+
+
+def test_aggregate_rows_are_counted_from_digest_summary_not_rollup(fake_db):
+    assert models.add_user_activities_batch([
+        activity(datetime(2024, 5, 1, 10, 45)),
+        activity(datetime(2024, 5, 1, 10, 50), argument='SELECT * FROM orders WHERE id = 2'),
+        activity(datetime(2024, 5, 1, 11, 5), 'UPDATE', 'Medium', 'UPDATE orders SET state = 1 WHERE id = 2'),
+    ], storage_modes=AGGREGATE_LOW)
+
+    assert len(fake_db.tables['user_activities']) == 1
+    assert [row['risk_level'] for row in fake_db.tables['activity_rollup_hourly']] == ['Medium']
+    assert [row['count'] for row in fake_db.tables['sql_digest_summary']] == [2]
+
+
+def test_breakdown_totals_do_not_depend_on_range_alignment_or_rollup(fake_db, monkeypatch):
+    models.add_user_activities_batch([
+        activity(datetime(2024, 5, 1, 10, 45)),
+        activity(datetime(2024, 5, 1, 10, 50)),
+        activity(datetime(2024, 5, 1, 11, 5)),
+        activity(datetime(2024, 5, 1, 10, 40), 'UPDATE', 'Medium', 'UPDATE orders SET state = 1 WHERE id = 2'),
+        activity(datetime(2024, 5, 1, 11, 20), 'UPDATE', 'Medium', 'UPDATE orders SET state = 2 WHERE id = 3'),
+    ], storage_modes=AGGREGATE_LOW)
+    end = datetime(2024, 5, 1, 12, 0)
+
+    on_the_hour = models._query_activity_breakdown(None, datetime(2024, 5, 1, 10, 0), end)
+    mid_hour = models._query_activity_breakdown(None, datetime(2024, 5, 1, 10, 30), end)
+    monkeypatch.setitem(APP_CONFIG, 'USE_ACTIVITY_ROLLUP', False)
+    without_rollup = models._query_activity_breakdown(None, datetime(2024, 5, 1, 10, 30), end)
+
+    assert total(on_the_hour) == total(mid_hour) == total(without_rollup) == 5
+    assert mid_hour == without_rollup
+    assert on_the_hour[(10, 'app', 'SELECT', 'Low')] == 2
+    assert on_the_hour[(11, 'app', 'UPDATE', 'Medium')] == 1
+
+
+def test_aggregate_write_invalidates_cached_ranges_covering_its_hour(fake_db):
+    start, end = datetime(2024, 5, 1, 10, 30), datetime(2024, 5, 1, 12, 0)
+    assert total(models.get_activity_breakdown(None, start, end)) == 0
+
+    # 10:10 在范围之外，但 aggregate 记录按整个 10 点计入该范围
+    models.add_user_activities_batch([activity(datetime(2024, 5, 1, 10, 10))], storage_modes=AGGREGATE_LOW)
+
+    assert total(models.get_activity_breakdown(None, start, end)) == 1
+
+
+def test_all_levels_are_stored_in_full_by_default(fake_db):
+    assert models.get_risk_level_storage() == {'High': 'full', 'Medium': 'full', 'Low': 'full'}
+
+
+def test_refresh_recomputes_a_cached_range(fake_db):
+    start, end = datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 1, 23, 59, 59)
+    assert total(models.get_activity_breakdown(None, start, end)) == 0
+    # 绕过写入路径直接修改数据，缓存不会失效
+    fake_db.tables['activity_rollup_hourly'].append(
+        {'server_id': 1, 'hour': datetime(2024, 5, 1, 9), 'user_name': 'app', 'operation_type': 'SELECT', 'risk_level': 'Low', 'count': 3})
+
+    assert total(models.get_activity_breakdown(None, start, end)) == 0
+    assert total(models.get_activity_breakdown(None, start, end, refresh=True)) == 3
+    assert total(models.get_activity_breakdown(None, start, end)) == 3
+
+
+def test_closed_ranges_expire_so_writes_from_other_processes_show_up(fake_db, monkeypatch):
+    import query_cache
+    start, end = datetime(2024, 5, 1, 0, 0), datetime(2024, 5, 1, 23, 59, 59)
+    assert total(models.get_activity_breakdown(None, start, end)) == 0
+    # 其他进程 (如 backfill.py) 写入的数据不经过本进程的缓存失效
+    fake_db.tables['activity_rollup_hourly'].append(
+        {'server_id': 1, 'hour': datetime(2024, 5, 1, 9), 'user_name': 'app', 'operation_type': 'SELECT', 'risk_level': 'Low', 'count': 3})
+    assert total(models.get_activity_breakdown(None, start, end)) == 0
+
+    now = query_cache.time.monotonic()
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now + APP_CONFIG['STATS_CACHE_CLOSED_TTL'] + 1)
+
+    assert total(models.get_activity_breakdown(None, start, end)) == 3
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""按块读取、字节级分行和原始字节行头匹配"""
+import gzip
+import io
+import re
+
+import pytest
+
+from block_reader import BlockStream, iter_blocks, iter_lines
+from log_parser import pattern_new
+from synthetic_log import generate_log
+
+# 按块读取之前在解码、去除首尾空白后的字符串上匹配的行头
+STR_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+Z)\t *(\d+)\s+(Query|Connect|Init DB|Quit|Prepare|Execute|Close stmt|Change user|Field List)\t(.*)')
+
+DATA = b''.join(generate_log(500, seed=3, threads=10)) + b'2024-01-01T00:00:01.000000Z\t    1 Query\tSELECT 1'
+
+
+class FakeSFTPFile:
+    """只提供 readv 的文件对象 (与 paramiko SFTPFile 的 readv 一样按请求返回数据块)"""
+
+    def __init__(self, data):
+        self.data = data
+        self.requests = []
+
+    def readv(self, chunks):
+        self.requests.extend(chunks)
+        return [self.data[offset:offset + size] for offset, size in chunks]
+
+
+@pytest.mark.parametrize('block_size', [1, 7, 100, 4096, len(DATA) * 2])
+def test_lines_match_readline_for_any_block_size(block_size):
+    expected = io.BytesIO(DATA).readlines()
+    assert list(iter_lines(iter_blocks(io.BytesIO(DATA), block_size=block_size))) == expected
+    assert expected[-1] == b'2024-01-01T00:00:01.000000Z\t    1 Query\tSELECT 1'  # 末尾不完整的行原样产出
+
+
+def test_blocks_cover_exactly_the_requested_range():
+    start, end = 1000, 5000
+    assert b''.join(iter_blocks(io.BytesIO(DATA), start, end, block_size=300)) == DATA[start:end]
+
+    sftp_file = FakeSFTPFile(DATA)
+    assert b''.join(iter_blocks(sftp_file, start, end, block_size=1024)) == DATA[start:end]
+    assert sftp_file.requests == [(1000, 1024), (2024, 1024), (3048, 1024), (4072, 928)]
+
+
+def test_block_stream_feeds_decompression():
+    blocks = iter_blocks(io.BytesIO(gzip.compress(DATA)), block_size=512)
+    assert gzip.GzipFile(fileobj=io.BufferedReader(BlockStream(blocks))).read() == DATA
+
+
+def test_byte_header_pattern_matches_like_decoded_string_pattern():
+    lines = generate_log(2000, seed=11, threads=20, multiline_ratio=0.1, session_commands=0.1)
+    lines += ['  2024-01-01T00:00:00.000001Z\t 42 Query\tSELECT \'中文\'\n'.encode('utf-8'), b'garbage\tQuery\t\n']
+    for line in lines:
+        byte_match = pattern_new.match(line)
+        if line.endswith(b' Quit\t\n'):
+            # 参数为空的 Quit 行: 去除空白后缺少分隔符，原先匹配不到，现在按 Quit 处理
+            assert byte_match is not None and byte_match.group(3) == b'Quit'
+            continue
+        str_match = STR_PATTERN.match(line.decode('utf-8').strip())
+        assert (byte_match is None) == (str_match is None), line
+        if byte_match:
+            decoded = [group.decode('utf-8') for group in byte_match.groups()]
+            assert decoded[:3] == list(str_match.groups()[:3])
+            assert decoded[3].strip() == str_match.group(4).strip()
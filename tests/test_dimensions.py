@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""维度表 ID 的写入和缓存 (名称与维度表 name 列的比较方式一致)"""
+from datetime import datetime
+
+import models
+
+LONG_HOST = 'h' * 300  # 超出 dim_hosts.name 的长度 (255)
+
+
+def activity(user_name, client_host='10.0.0.5', minute=0):
+    return {'server_id': 1, 'timestamp': datetime(2024, 5, 1, 10, minute), 'user_name': user_name, 'client_host': client_host,
+            'db_name': 'shop', 'thread_id': 7, 'command_type': 'Query', 'operation_type': 'SELECT',
+            'argument': 'SELECT 1', 'risk_level': 'Low'}
+
+
+def dimension_statements(fake_db):
+    return fake_db.statements_matching(r"INTO dim_|FROM dim_")
+
+
+def test_names_that_do_not_round_trip_get_ids_and_are_cached(fake_db):
+    batch = [activity('app'), activity('app '), activity('report', LONG_HOST)]
+    assert models.add_user_activities_batch(batch)
+
+    rows = fake_db.tables['user_activities']
+    assert all(row['user_id'] is not None and row['user_name'] is None for row in rows)
+    assert all(row['host_id'] is not None and row['client_host'] is None for row in rows)
+    # PAD SPACE 排序规则下 'app' 与 'app ' 是维度表中的同一行
+    assert rows[0]['user_id'] == rows[1]['user_id']
+    assert [row['name'] for row in fake_db.tables['dim_hosts']] == ['10.0.0.5', LONG_HOST[:255]]
+
+    fake_db.statements.clear()
+    commits = fake_db.commits
+    assert models.add_user_activities_batch([activity('app ', minute=5), activity('report', LONG_HOST, minute=6)])
+
+    # 第二个批次的名称全部来自缓存: 不再写入、查询维度表，也没有额外的提交
+    assert dimension_statements(fake_db) == []
+    assert fake_db.commits == commits + 1
+    assert len(fake_db.tables['dim_users']) == 2
+    assert rows[4]['host_id'] == rows[2]['host_id']
+
+
+def test_unresolved_names_are_cached_as_misses(fake_db, monkeypatch):
+    # 模拟写入维度表失败 (名称无法写入): 查询不到 ID 的名称保留在名称列中
+    monkeypatch.setattr(fake_db, '_insert_dimension', lambda match, params: None)
+    assert models.add_user_activities_batch([activity('app')])
+    assert fake_db.tables['user_activities'][0]['user_name'] == 'app'
+
+    fake_db.statements.clear()
+    assert models.add_user_activities_batch([activity('app', minute=5)])
+
+    assert dimension_statements(fake_db) == []
+    assert fake_db.tables['user_activities'][1]['user_name'] == 'app'
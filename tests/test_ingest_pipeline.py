@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""导入流水线的已提交偏移和出错语义"""
+import pytest
+
+from ingest_pipeline import IngestPipeline, PipelineError
+
+
+def parse(lines, read_state):
+    """每行一个整数，偏移按行的字节数推进"""
+    for line in lines:
+        read_state['offset'] += len(line)
+        read_state['last_timestamp'] = f'ts-{int(line)}'
+        yield {'n': int(line)}
+
+
+def make_lines(count):
+    return [b'%d\n' % n for n in range(count)]
+
+
+def offset_after(lines, count, start_offset=0):
+    return start_offset + sum(len(line) for line in lines[:count])
+
+
+def test_all_records_are_written_in_order_and_offset_reaches_the_end():
+    lines = make_lines(25)
+    written = []
+    pipeline = IngestPipeline(parse, lambda record: record['n'] % 2 == 0, lambda batch: written.append(batch) or True,
+                              batch_size=4, queue_size=1, chunk_lines=3)
+
+    result = pipeline.run(iter(lines), start_offset=100)
+
+    assert [record['n'] for batch in written for record in batch] == list(range(0, 25, 2))
+    assert all(len(batch) <= 4 for batch in written)
+    assert result == {'offset': offset_after(lines, 25, 100), 'last_timestamp': 'ts-24', 'processed': 25, 'added': 13}
+
+
+def test_write_failure_reports_offset_of_last_committed_batch():
+    lines = make_lines(20)
+    calls = []
+
+    def write_batch(batch):
+        calls.append(batch)
+        return len(calls) < 3  # 第三批写入失败
+
+    pipeline = IngestPipeline(parse, lambda record: True, write_batch, batch_size=5, queue_size=1, chunk_lines=2)
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(iter(lines))
+
+    # 已提交的位置停在前两批 (10 行) 之后，之后的批次不再写入
+    assert excinfo.value.added == 10
+    assert excinfo.value.committed_offset == offset_after(lines, 10)
+    assert excinfo.value.committed_timestamp == 'ts-9'
+    assert len(calls) == 3
+
+
+def test_write_exception_is_reported_like_a_failed_write():
+    def write_batch(batch):
+        raise ConnectionError('lost connection')
+
+    pipeline = IngestPipeline(parse, lambda record: True, write_batch, batch_size=5)
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(iter(make_lines(12)), start_offset=7)
+
+    assert 'lost connection' in str(excinfo.value)
+    assert (excinfo.value.added, excinfo.value.committed_offset, excinfo.value.committed_timestamp) == (0, 7, None)
+
+
+def test_read_failure_still_writes_lines_read_before_the_error():
+    lines = make_lines(8)
+
+    def file_obj():
+        yield from lines
+        raise OSError('connection reset')
+
+    written = []
+    pipeline = IngestPipeline(parse, lambda record: True, lambda batch: written.extend(batch) or True,
+                              batch_size=3, chunk_lines=5)
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(file_obj())
+
+    assert [record['n'] for record in written] == list(range(8))
+    assert excinfo.value.added == 8
+    assert excinfo.value.committed_offset == offset_after(lines, 8)
+    assert str(excinfo.value).startswith('读取阶段失败')
+
+
+def test_parse_failure_reports_offset_of_written_batches():
+    lines = make_lines(20)
+    written = []
+
+    def accept(record):
+        if record['n'] == 13: raise ValueError('bad record')
+        return True
+
+    pipeline = IngestPipeline(parse, accept, lambda batch: written.extend(batch) or True, batch_size=5, chunk_lines=4)
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(iter(lines))
+
+    # 出错前已放入队列的两批照常写完，出错的批次不写入
+    assert [record['n'] for record in written] == list(range(10))
+    assert excinfo.value.added == 10
+    assert excinfo.value.committed_offset == offset_after(lines, 10)
+    assert str(excinfo.value).startswith('解析阶段失败')
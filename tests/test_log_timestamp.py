@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""快速时间戳解析与按时间戳字符串跳过旧记录"""
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+import pytz
+
+from log_parser import format_log_timestamp, parse_general_log_stream, parse_log_timestamp_fast
+from synthetic_log import generate_log
+
+
+def strptime(timestamp_str):
+    return datetime.strptime(timestamp_str, '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc)
+
+
+def test_fast_parse_matches_strptime():
+    rng = random.Random(14)
+    base = datetime(2024, 2, 28, 23, 59, 58)
+    samples = []
+    for _ in range(2000):
+        moment = base + timedelta(microseconds=rng.randrange(5 * 10 ** 6))
+        digits = rng.randint(1, 6)
+        samples.append(moment.strftime('%Y-%m-%dT%H:%M:%S.') + f'{moment.microsecond:06d}'[:digits] + 'Z')
+    samples += ['2024-12-31T23:59:59.999999Z', '2025-01-01T00:00:00.000000Z', '2024-02-29T12:00:00.5Z']
+    for timestamp_str in samples:
+        assert parse_log_timestamp_fast(timestamp_str) == strptime(timestamp_str), timestamp_str
+
+
+@pytest.mark.parametrize('timestamp_str', ['2023-02-29T00:00:00.000000Z', '2024-13-01T00:00:00.000000Z',
+                                           '2024-01-01T24:00:00.000000Z', '2024-01-01T00:00:00.Z',
+                                           '2024-01-01T00:00:00.1234567Z'])
+def test_fast_parse_rejects_what_strptime_rejects(timestamp_str):
+    with pytest.raises(ValueError):
+        strptime(timestamp_str)
+    with pytest.raises(ValueError):
+        parse_log_timestamp_fast(timestamp_str)
+    # 失败的解析不影响之后的结果 (秒级前缀缓存)
+    assert parse_log_timestamp_fast('2024-01-01T00:00:00.000001Z') == datetime(2024, 1, 1, 0, 0, 0, 1, tzinfo=timezone.utc)
+
+
+def test_format_round_trips_and_converts_to_utc():
+    moment = pytz.timezone('Asia/Shanghai').localize(datetime(2024, 1, 1, 8, 0, 0, 120))
+    assert format_log_timestamp(moment) == '2024-01-01T00:00:00.000120Z'
+    assert parse_log_timestamp_fast(format_log_timestamp(moment)) == moment
+
+
+def test_min_timestamp_skips_the_same_records_as_comparing_datetimes():
+    lines = generate_log(3000, seed=14, threads=20)
+    everything = list(parse_general_log_stream(lines, 1))
+    min_timestamp = everything[len(everything) // 2]['timestamp'].astimezone(pytz.timezone('Asia/Shanghai'))
+
+    skipped = list(parse_general_log_stream(lines, 1, min_timestamp=min_timestamp))
+
+    assert skipped == [activity for activity in everything if activity['timestamp'] > min_timestamp]
+    assert 0 < len(skipped) < len(everything)
+
+
+def test_parse_errors_are_raised_not_reported_as_end_of_file(monkeypatch):
+    import log_parser
+
+    def broken_entry(*args):
+        raise RuntimeError('rules unavailable')
+
+    monkeypatch.setattr(log_parser, 'create_activity_entry', broken_entry)
+    with pytest.raises(RuntimeError):
+        list(parse_general_log_stream(generate_log(50, seed=14, threads=5), 1, {'offset': 0}))
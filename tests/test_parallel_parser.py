@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""多进程并行解析与顺序解析的结果一致 (活动记录、会话表、偏移)"""
+import copy
+import gzip
+
+import pytest
+
+from log_parser import parse_general_log_stream
+from parallel_parser import build_segments, parse_file_parallel, parse_segments_parallel, split_line_ranges
+from synthetic_log import generate_log
+
+# 初始会话 (上次扫描保存)：文件开头之前已连接的线程
+INITIAL_SESSIONS = {thread_id: {'user': f'resumed{thread_id}', 'host': '10.9.9.9', 'db': 'old', 'last_seen': '2023-12-31T23:59:59.000000Z'}
+                    for thread_id in range(1, 6)}
+
+
+@pytest.fixture(scope='module')
+def log_lines():
+    lines = generate_log(6000, seed=16, threads=30, churn=0.05, multiline_ratio=0.02, session_commands=0.05)
+    # 去掉文件开头前 5 个线程的 Connect 行，这些线程的用户只能来自初始会话或保持 unknown
+    return [line for line in lines[:30] if not any(line.startswith(b'2024-01-01T00:00:00.%03d000Z\t     %d ' % (n - 1, n)) for n in range(1, 6))] + lines[30:]
+
+
+def sequential(lines, thread_user_map, allowed_levels=None):
+    read_state = {'offset': 0}
+    activities = [activity for activity in parse_general_log_stream(lines, 1, read_state, thread_user_map=thread_user_map)
+                  if allowed_levels is None or activity['risk_level'] in allowed_levels]
+    return activities, read_state['offset']
+
+
+def test_line_ranges_start_at_line_boundaries(tmp_path, log_lines):
+    path = tmp_path / 'general.log'
+    path.write_bytes(b''.join(log_lines))
+    starts = {0}
+    for line in log_lines: starts.add(max(starts) + len(line))
+    ranges = split_line_ranges(str(path), range_size=1000)
+    assert ranges[0][0] == 0 and ranges[-1][1] == path.stat().st_size
+    assert all(start in starts for start, _ in ranges)
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+
+
+@pytest.mark.parametrize('initial_sessions', [{}, INITIAL_SESSIONS])
+def test_parallel_parse_matches_sequential_parse(tmp_path, log_lines, initial_sessions):
+    path = tmp_path / 'general.log'
+    path.write_bytes(b''.join(log_lines))
+    expected_sessions = copy.deepcopy(initial_sessions)
+    expected, expected_offset = sequential(log_lines, expected_sessions)
+
+    sessions = copy.deepcopy(initial_sessions)
+    results = list(parse_file_parallel(str(path), 1, workers=2, range_size=20000, thread_user_map=sessions))
+
+    assert len(results) > 5
+    assert [activity for activities, _ in results for activity in activities] == expected
+    assert results[-1][1]['offset'] == expected_offset
+    assert sum(stats['lines'] for _, stats in results) == len(log_lines)
+    assert sessions == expected_sessions
+
+
+def test_parallel_parse_filters_levels_and_resumes_from_offset(tmp_path, log_lines):
+    path = tmp_path / 'general.log'
+    path.write_bytes(b''.join(log_lines))
+    skip = 2000
+    start_offset = sum(len(line) for line in log_lines[:skip])
+    expected_sessions = copy.deepcopy(INITIAL_SESSIONS)
+    expected, expected_offset = sequential(log_lines[skip:], expected_sessions, {'High', 'Medium'})
+
+    sessions = copy.deepcopy(INITIAL_SESSIONS)
+    results = list(parse_file_parallel(str(path), 1, workers=2, range_size=15000, start_offset=start_offset,
+                                       thread_user_map=sessions, allowed_levels=['high', 'medium']))
+
+    assert [activity for activities, _ in results for activity in activities] == expected
+    assert results[-1][1]['offset'] == start_offset + expected_offset
+    assert sessions == expected_sessions
+
+
+def test_compressed_file_is_parsed_as_one_segment(tmp_path, log_lines):
+    path = tmp_path / 'general.log.gz'
+    path.write_bytes(gzip.compress(b''.join(log_lines)))
+    expected, expected_offset = sequential(log_lines, {})
+
+    segments = build_segments(str(path), 'gz')
+    results = list(parse_segments_parallel(segments, 1, workers=2))
+
+    assert len(results) == 1
+    _, activities, stats = results[0]
+    assert activities == expected
+    assert stats['offset'] == expected_offset
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""TTLCache 过期与淘汰、RangeCache 按服务器和时间范围失效"""
+from datetime import datetime
+
+import pytest
+
+import query_cache
+from query_cache import MISSING, RangeCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(query_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def day(n):
+    return datetime(2024, 5, n)
+
+
+def test_entries_expire_after_ttl_and_none_is_a_value(clock):
+    cache = TTLCache(ttl=10)
+    cache.set('a', None)
+    cache.set('b', 1, ttl=None)
+    cache.set('c', 2, ttl=30)
+    assert cache.get('a') is None and cache.get('missing') is MISSING
+
+    clock[0] += 11
+    assert cache.get('a') is MISSING
+    assert (cache.get('b'), cache.get('c')) == (1, 2)
+    clock[0] += 20
+    assert (cache.get('b'), cache.get('c')) == (1, MISSING)
+    assert len(cache) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert (cache.get('a'), cache.get('b'), cache.get('c')) == (1, MISSING, 3)
+
+
+@pytest.mark.parametrize('server_id, start, end, removed', [
+    (1, day(3), day(3), {(1, day(1), day(5)), (None, day(1), day(5)), (1, None, day(4)), (1, day(2), None)}),
+    (2, day(3), day(3), {(None, day(1), day(5))}),
+    (2, day(5), day(6), {(None, day(1), day(5)), (2, day(5), day(9))}),
+    (1, day(6), day(7), {(1, day(2), None)}),
+    (None, day(9), day(9), {(1, day(2), None), (2, day(5), day(9))}),
+])
+def test_invalidate_range_removes_only_overlapping_entries(server_id, start, end, removed):
+    keys = [(1, day(1), day(5)), (None, day(1), day(5)), (1, None, day(4)), (1, day(2), None), (2, day(5), day(9))]
+    cache = RangeCache(ttl=None)
+    for key in keys:
+        cache.set(key, key)
+
+    assert cache.invalidate_range(server_id, start, end) == len(removed)
+    assert {key for key in keys if cache.get(key) is MISSING} == removed
+
+
+def test_results_computed_across_an_invalidation_are_not_cached():
+    cache = RangeCache()
+    key = (1, day(1), day(2))
+    generation = cache.generation
+    cache.invalidate_range(2, day(9), day(9))  # 与 key 不重叠，但发生在查询期间
+    assert not cache.set_if_unchanged(key, 'stale', generation)
+    assert cache.get(key) is MISSING
+
+    assert cache.set_if_unchanged(key, 'fresh', cache.generation)
+    assert cache.get(key) == 'fresh'
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""远程预过滤程序 (在本机用 awk 执行) 不改变解析结果和字节偏移"""
+import shutil
+import subprocess
+
+import pytest
+
+import risk_rules
+from log_parser import parse_general_log_stream
+from remote_filter import SKIP_MARKER, build_filter_program, build_remote_command
+from synthetic_log import generate_log
+
+pytestmark = pytest.mark.skipif(not all(shutil.which(cmd) for cmd in ('awk', 'tail', 'head')), reason='需要 awk、tail、head')
+
+ALLOWED_LEVELS = {'High', 'Medium'}
+RULES = {
+    'High': [{'type': 'DDL'}, {'type': 'DCL'}, {'type': 'DELETE'}, {'keyword': 'into outfile'}],
+    'Medium': [{'type': 'UPDATE'}, {'type': 'OTHER'}],
+    'Low': [{'type': 'SELECT'}, {'type': 'INSERT'}],
+}
+
+
+@pytest.fixture(autouse=True)
+def rules(monkeypatch):
+    monkeypatch.setattr(risk_rules, '_current_key', None)
+    monkeypatch.setattr(risk_rules, '_current_matcher', None)
+    risk_rules.set_risk_rules(RULES)
+
+
+def run_filter(path, offset, length, program):
+    """在本机执行远程过滤命令，按 RemoteFilteredSource 的方式产出保留的行和丢弃的字节数"""
+    output = subprocess.run(['sh', '-c', build_remote_command(str(path), offset, length, program)],
+                            check=True, capture_output=True).stdout
+    for line in output.splitlines(keepends=True):
+        yield int(line[1:]) if line.startswith(SKIP_MARKER) else line
+
+
+def parse(line_source):
+    read_state = {'offset': 0}
+    activities = [activity for activity in parse_general_log_stream(line_source, 1, read_state)
+                  if activity['risk_level'] in ALLOWED_LEVELS]
+    return activities, read_state['offset']
+
+
+@pytest.mark.parametrize('offset_lines', [0, 137])
+def test_filtered_stream_parses_to_the_same_activities_and_offset(tmp_path, offset_lines):
+    lines = generate_log(3000, seed=7, threads=20, multiline_ratio=0.05, session_commands=0.05)
+    # 一条只按关键字 (而非操作类型) 命中 High 的 SELECT
+    outfile = next(i for i in range(1500, len(lines)) if b'Query\tSELECT * FROM orders' in lines[i])
+    lines[outfile] = lines[outfile].rstrip(b'\n') + b" INTO OUTFILE '/tmp/o'\n"
+    # 末尾没有换行符的行可能仍在写入，不处理也不计入偏移
+    data = b''.join(lines) + lines[-1].rstrip(b'\n')
+    path = tmp_path / 'general.log'
+    path.write_bytes(data)
+    offset = sum(len(line) for line in lines[:offset_lines])
+
+    program = build_filter_program(RULES, ALLOWED_LEVELS)
+    filtered = list(run_filter(path, offset, len(data) - offset, program))
+    expected, expected_offset = parse(lines[offset_lines:])
+    actual, actual_offset = parse(filtered)
+
+    assert actual == expected
+    assert actual_offset == expected_offset == len(data) - offset - len(lines[-1]) + 1
+    assert any(activity['argument'].endswith("INTO OUTFILE '/tmp/o'") for activity in actual)
+    kept = sum(len(line) for line in filtered if isinstance(line, bytes))
+    assert 0 < kept < expected_offset // 2  # 默认语句比例下大部分为 SELECT/INSERT，应被丢弃
+
+
+def test_filter_is_disabled_when_it_cannot_be_exact():
+    assert build_filter_program(RULES, {'High', 'Low'}) is None
+    assert build_filter_program({'High': [{}]}, {'High'}) is None  # 无条件命中所有语句
+    assert build_filter_program({'High': [{'keyword': 'drop 表'}]}, {'High'}) is None  # awk 无法转换非 ASCII 的大小写
+    assert build_filter_program(RULES, set()) is None
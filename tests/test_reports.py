@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""已结束周期的报表快照"""
+from datetime import datetime, timedelta
+
+import models
+from reports import ReportGenerator
+
+DAY = datetime(2024, 5, 1)
+
+
+def activity(timestamp):
+    return {'server_id': 1, 'timestamp': timestamp, 'user_name': 'app', 'client_host': '10.0.0.5', 'db_name': 'shop',
+            'thread_id': 7, 'command_type': 'Query', 'operation_type': 'UPDATE', 'argument': 'UPDATE t SET a = 1', 'risk_level': 'Medium'}
+
+
+def breakdown_queries(db):
+    return len(db.statements_matching(r'^SELECT HOUR\('))
+
+
+def test_closed_period_is_computed_once(fake_db):
+    models.add_user_activities_batch([activity(DAY + timedelta(hours=9))], storage_modes={})
+
+    first = ReportGenerator.generate_daily_report(DAY)
+    queries = breakdown_queries(fake_db)
+    second = ReportGenerator.generate_daily_report(DAY + timedelta(hours=12))
+
+    assert first['total_operations'] == second['total_operations'] == 1
+    assert second['period'] == first['period']
+    assert breakdown_queries(fake_db) == queries
+
+
+def test_snapshot_is_not_saved_when_the_period_is_written_during_computation(fake_db, monkeypatch):
+    models.add_user_activities_batch([activity(DAY + timedelta(hours=9))], storage_modes={})
+    compute = ReportGenerator.generate_summary_report
+
+    def compute_then_ingest(start_date, end_date, refresh=False):
+        report = compute(start_date, end_date, refresh)
+        models.add_user_activities_batch([activity(DAY + timedelta(hours=10))], storage_modes={})
+        return report
+
+    monkeypatch.setattr(ReportGenerator, 'generate_summary_report', staticmethod(compute_then_ingest))
+    assert ReportGenerator.generate_daily_report(DAY)['total_operations'] == 1
+    assert models.get_report_snapshot('daily', DAY) is None
+
+    monkeypatch.setattr(ReportGenerator, 'generate_summary_report', staticmethod(compute))
+    assert ReportGenerator.generate_daily_report(DAY)['total_operations'] == 2
+    assert models.get_report_snapshot('daily', DAY)['total_operations'] == 2
+
+
+def test_snapshot_ignores_stale_stats_cache(fake_db):
+    end = DAY + timedelta(days=1) - timedelta(microseconds=1)
+    assert sum(models.get_activity_breakdown(None, DAY, end).values()) == 0
+    # 其他进程写入的数据: 本进程的统计缓存没有失效
+    fake_db.tables['activity_rollup_hourly'].append(
+        {'server_id': 1, 'hour': DAY + timedelta(hours=9), 'user_name': 'app', 'operation_type': 'UPDATE', 'risk_level': 'Medium', 'count': 4})
+
+    assert ReportGenerator.generate_daily_report(DAY)['total_operations'] == 4
+    assert models.get_report_snapshot('daily', DAY)['total_operations'] == 4
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""保留期清理: 删除过期分区后，统计、报表快照和 sql_texts 与保留的明细一致"""
+from datetime import datetime
+
+import pytest
+
+import models
+from config import APP_CONFIG
+
+LONG_SQL = "SELECT o.id, o.state, c.name FROM orders o JOIN customers c ON c.id = o.customer_id WHERE o.created_at > '{day}'"
+
+
+def activity(timestamp, argument):
+    return {'server_id': 1, 'timestamp': timestamp, 'user_name': 'app', 'client_host': '10.0.0.5', 'db_name': 'shop',
+            'thread_id': 7, 'command_type': 'Query', 'operation_type': 'SELECT', 'argument': argument, 'risk_level': 'Low'}
+
+
+@pytest.fixture
+def partitioned_db(fake_db, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'ACTIVITY_RETENTION_DAYS', 2)
+    fake_db.partitions = [('p20240101', datetime(2024, 1, 2)), ('p20240102', datetime(2024, 1, 3)),
+                          ('p20240103', datetime(2024, 1, 4)), ('pmax', None)]
+    for day in (1, 2, 3):
+        timestamp = datetime(2024, 1, day, 10, 15)
+        assert models.add_user_activities_batch([activity(timestamp, LONG_SQL.format(day=day))] * 2, storage_modes={})
+        models.reserve_report_snapshot('daily', datetime(2024, 1, day), datetime(2024, 1, day + 1))
+        assert models.save_report_snapshot('daily', datetime(2024, 1, day), {'total_operations': 2})
+    return fake_db
+
+
+def test_stats_after_purge_only_cover_retained_detail(partitioned_db):
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 3, 23, 59, 59)
+    assert models.get_operation_stats(None, start, end)['total_count'] == 6
+
+    result = models.maintain_activity_partitions(now=datetime(2024, 1, 5, 12, 0))
+
+    assert result['dropped'] == ['p20240101', 'p20240102']
+    assert result['purged'] == {'activity_rollup_hourly': 2, 'sql_digest_summary': 0, 'report_snapshots': 2, 'sql_texts': 2}
+    stats = models.get_operation_stats(None, start, end)
+    assert stats['total_count'] == 6 - 4 == len(partitioned_db.tables['user_activities'])
+    assert stats['hourly_distribution'][10] == 2
+    assert [row['period_start'] for row in partitioned_db.tables['report_snapshots']] == [datetime(2024, 1, 3)]
+    assert {row['argument_hash'] for row in partitioned_db.tables['user_activities']} == \
+        {row['text_hash'] for row in partitioned_db.tables['sql_texts']}
+
+
+def referenced_texts_exist(db):
+    hashes = {row['text_hash'] for row in db.tables['sql_texts']}
+    return all(row['argument_hash'] in hashes for row in db.tables['user_activities'] if row['argument_hash'])
+
+
+def test_purge_clears_the_text_cache_so_purged_texts_are_written_again(partitioned_db):
+    models.maintain_activity_partitions(now=datetime(2024, 1, 5, 12, 0))
+    partitioned_db.statements.clear()
+
+    models.add_user_activities_batch([activity(datetime(2024, 1, 4, 9, 0), LONG_SQL.format(day=1))], storage_modes={})
+
+    assert len(partitioned_db.statements_matching('INSERT IGNORE INTO sql_texts')) == 1
+    assert referenced_texts_exist(partitioned_db)
+
+
+def test_texts_purged_while_a_batch_references_them_are_restored(partitioned_db, monkeypatch):
+    text_hash = models.hashlib.blake2b(LONG_SQL.format(day=3).encode('utf-8'), digest_size=16).hexdigest()
+    update_rollup = models._update_activity_rollup
+
+    def purge_during_batch(conn, rows):
+        # 模拟另一个线程在本批按缓存引用语句之后、提交之前执行清理 (清理时本批的明细尚未提交，不算引用)
+        models._sql_text_cache.invalidate()
+        partitioned_db.tables['sql_texts'] = [row for row in partitioned_db.tables['sql_texts'] if row['text_hash'] != text_hash]
+        update_rollup(conn, rows)
+
+    monkeypatch.setattr(models, '_update_activity_rollup', purge_during_batch)
+    assert models.add_user_activities_batch([activity(datetime(2024, 1, 4, 9, 0), LONG_SQL.format(day=3))], storage_modes={})
+
+    assert referenced_texts_exist(partitioned_db)
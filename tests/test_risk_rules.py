@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""编译后的风险规则与逐条比较的结果一致"""
+import random
+
+import risk_rules
+from risk_rules import CompiledRiskRules, build_keyword_regex
+
+RULES = {
+    'High': [{'type': 'DDL'}, {'type': 'DELETE'}, {'keyword': 'drop table'}, {'type': 'UPDATE', 'keyword': 'password'}],
+    'Medium': [{'type': 'UPDATE'}, {'keyword': 'drop'}, {'type': 'SELECT', 'keyword': 'into outfile'}],
+    'Low': [{'type': 'SELECT'}, {'type': 'INSERT', 'keyword': 'ignore'}],
+}
+
+
+def linear_risk_level(risk_operations, operation_type, argument):
+    """原先的逐条比较 (编译前的实现)，作为对照"""
+    argument_lower = argument.lower()
+    for level in ('High', 'Medium', 'Low'):
+        for rule in risk_operations.get(level, []):
+            rule_type = rule.get('type', '').upper()
+            rule_keyword = rule.get('keyword', '').lower()
+            type_match = (not rule_type or operation_type.upper() == rule_type)
+            keyword_match = (not rule_keyword or rule_keyword in argument_lower)
+            if type_match and keyword_match:
+                return level
+    return 'Low'
+
+
+def test_keyword_regex_matches_any_keyword_including_shared_prefixes():
+    regex = build_keyword_regex(['drop', 'drop table', 'delete', 'del'])
+    assert regex.search('alter table t drop column c')
+    assert regex.search('delimiter ;')
+    assert not regex.search('select 1')
+    assert build_keyword_regex(['', '']) is None
+
+
+def test_compiled_rules_agree_with_linear_matching():
+    matcher = CompiledRiskRules(RULES)
+    cases = [
+        ('UPDATE', "UPDATE users SET PASSWORD = 'x'"),
+        ('UPDATE', 'UPDATE orders SET state = 1'),
+        ('SELECT', "SELECT * FROM t INTO OUTFILE '/tmp/t'"),
+        ('SELECT', 'SELECT 1'),
+        ('OTHER', 'DROP TABLE t'),
+        ('DDL', 'CREATE TABLE t (id INT)'),
+        ('INSERT', 'INSERT IGNORE INTO t VALUES (1)'),
+        ('INSERT', 'INSERT INTO t VALUES (1)'),
+        ('update', 'update t set a = 1'),
+        ('', 'drop view v'),
+    ]
+    for operation_type, argument in cases:
+        assert matcher.classify(operation_type, argument) == linear_risk_level(RULES, operation_type, argument), argument
+
+
+def test_compiled_rules_agree_with_linear_matching_on_random_rules():
+    rng = random.Random(20240501)
+    types = ['SELECT', 'UPDATE', 'DELETE', 'DDL', 'OTHER']
+    words = ['drop', 'dro', 'table', 'grant', 'into', 'outfile', 'password', 'sleep', 'union']
+    for _ in range(200):
+        rules = {level: [] for level in ('High', 'Medium', 'Low')}
+        for _ in range(rng.randint(0, 6)):
+            rule = {}
+            if rng.random() < 0.6: rule['type'] = rng.choice(types)
+            if rng.random() < 0.6: rule['keyword'] = rng.choice(words)
+            rules[rng.choice(list(rules))].append(rule)
+        matcher = CompiledRiskRules(rules)
+        for _ in range(20):
+            operation_type = rng.choice(types)
+            argument = ' '.join(rng.choice(words + ['x', 'T', 'SELECT']) for _ in range(rng.randint(0, 4)))
+            assert matcher.classify(operation_type, argument) == linear_risk_level(rules, operation_type, argument), (rules, operation_type, argument)
+
+
+def test_set_risk_rules_reuses_matcher_until_rules_change(monkeypatch):
+    monkeypatch.setattr(risk_rules, '_current_key', None)
+    monkeypatch.setattr(risk_rules, '_current_matcher', None)
+
+    first = risk_rules.set_risk_rules(RULES)
+    assert risk_rules.set_risk_rules({level: list(rules) for level, rules in RULES.items()}) is first
+    assert risk_rules.get_risk_rules() == RULES
+
+    changed = risk_rules.set_risk_rules({'High': [{'keyword': 'truncate'}]})
+    assert changed is not first
+    assert risk_rules.get_risk_matcher().classify('OTHER', 'TRUNCATE t') == 'High'
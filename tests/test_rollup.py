@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""按小时预聚合表 activity_rollup_hourly 与明细统计的结果一致"""
+import random
+from datetime import datetime, timedelta
+
+import models
+from config import APP_CONFIG
+
+START = datetime(2024, 5, 1, 8, 0)
+
+
+def random_activities(rng, count):
+    activities = []
+    for _ in range(count):
+        operation_type, risk_level = rng.choice([('SELECT', 'Low'), ('UPDATE', 'Medium'), ('DELETE', 'High')])
+        activities.append({'server_id': rng.choice([1, 2]), 'timestamp': START + timedelta(seconds=rng.randrange(6 * 3600)),
+                           'user_name': rng.choice(['app', 'report', 'admin']), 'client_host': '10.0.0.5', 'db_name': 'shop',
+                           'thread_id': 7, 'command_type': 'Query', 'operation_type': operation_type,
+                           'argument': f'{operation_type} ... {rng.randrange(1000)}', 'risk_level': risk_level})
+    return activities
+
+
+def test_rollup_accumulates_across_batches_keyed_by_user_id(fake_db):
+    row = random_activities(random.Random(1), 1)[0]
+    models.add_user_activities_batch([row])
+    models.add_user_activities_batch([dict(row, timestamp=row['timestamp'].replace(minute=59, second=59))])
+
+    rollup = fake_db.tables['activity_rollup_hourly']
+    assert len(rollup) == 1
+    assert rollup[0]['count'] == 2
+    assert (rollup[0]['user_id'], rollup[0]['user_name']) == (fake_db.tables['user_activities'][0]['user_id'], '')
+    assert rollup[0]['hour'] == row['timestamp'].replace(minute=0, second=0)
+
+
+def test_aggregate_rows_are_summarized_by_user_id(fake_db):
+    row = random_activities(random.Random(2), 1)[0]
+    models.add_user_activities_batch([row], storage_modes={row['risk_level']: 'aggregate'})
+
+    summary = fake_db.tables['sql_digest_summary']
+    assert len(summary) == 1
+    assert summary[0]['user_id'] == fake_db.tables['dim_users'][0]['id']
+    assert summary[0]['user_name'] == ''
+
+
+def test_name_keyed_rows_from_older_versions_merge_with_id_keyed_rows(fake_db):
+    row = dict(random_activities(random.Random(3), 1)[0], server_id=1, user_name='app', operation_type='SELECT', risk_level='Low')
+    hour = row['timestamp'].replace(minute=0, second=0)
+    models.add_user_activities_batch([row])
+    # 升级前按用户名写入的行 (user_id 为 0)
+    fake_db.tables['activity_rollup_hourly'].append({'server_id': 1, 'hour': hour, 'user_id': 0, 'user_name': 'app',
+                                                     'operation_type': 'SELECT', 'risk_level': 'Low', 'count': 4})
+
+    breakdown = models._query_activity_breakdown(None, hour, hour + timedelta(hours=1))
+    assert breakdown == {(hour.hour, 'app', 'SELECT', 'Low'): 5}
+
+
+def test_rollup_and_raw_breakdowns_agree_for_any_range(fake_db, monkeypatch):
+    rng = random.Random(20240501)
+    for _ in range(4):
+        models.add_user_activities_batch(random_activities(rng, 50))
+
+    ranges = [(START, START + timedelta(hours=6)),
+              (START + timedelta(minutes=17), START + timedelta(hours=3, minutes=42)),
+              (START + timedelta(hours=2), START + timedelta(hours=2, minutes=30))]
+    for server_id in (None, 1):
+        for start, end in ranges:
+            monkeypatch.setitem(APP_CONFIG, 'USE_ACTIVITY_ROLLUP', True)
+            with_rollup = models._query_activity_breakdown(server_id, start, end)
+            monkeypatch.setitem(APP_CONFIG, 'USE_ACTIVITY_ROLLUP', False)
+            raw = models._query_activity_breakdown(server_id, start, end)
+            assert with_rollup == raw, (server_id, start, end)
+
+    monkeypatch.setitem(APP_CONFIG, 'USE_ACTIVITY_ROLLUP', True)
+    assert sum(models._query_activity_breakdown(None, START, START + timedelta(hours=6)).values()) == 200
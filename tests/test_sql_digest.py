@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""SQL 语句规范化和指纹"""
+import pytest
+
+from sql_digest import normalize_sql, sql_digest
+
+
+@pytest.mark.parametrize('sql, expected', [
+    ('SELECT * FROM orders WHERE id = 42;', 'select * from orders where id=?'),
+    ("select * from t where name = 'O\\'Brien' and x in (1, 2,3)", 'select * from t where name=? and x in(...)'),
+    ("SELECT 'it''s', \"x\", 1.5, .5", 'select ?,?,?,?'),
+    ("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'),(3,'z')", 'insert into t(a,b)values(?,?)'),
+    ('/* ping */ SELECT 1', 'select ?'),
+    ('SELECT `Col1`, a1 FROM t2 WHERE v > 1.5e3 AND h = 0xFF -- tail', 'select `col1`,a1 from t2 where v>? and h=?'),
+    ('select\n  a\n from t # comment', 'select a from t'),
+    ('UPDATE t SET a = -3 WHERE b <> 4', 'update t set a=-? where b<>?'),
+    ('', ''),
+    (None, ''),
+])
+def test_normalize_sql(sql, expected):
+    assert normalize_sql(sql) == expected
+
+
+def test_statements_differing_only_in_literals_share_a_digest():
+    digest = sql_digest("SELECT * FROM orders WHERE id = 1 AND state IN ('a', 'b')")
+    assert len(digest) == 32 and int(digest, 16) >= 0
+    assert sql_digest("select *  from orders\nwhere id=987 and state in ('c') ;") == digest
+    assert sql_digest("SELECT * FROM orders WHERE id = 1 AND state = 'a'") != digest
+    assert sql_digest('SELECT * FROM customers WHERE id = 1') != sql_digest('SELECT * FROM orders WHERE id = 1')
+    # 字母和数字组成的标识符中的数字不是字面量
+    assert sql_digest('SELECT * FROM t1') != sql_digest('SELECT * FROM t2')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""长语句去重存储到 sql_texts"""
+from datetime import datetime
+
+import models
+from config import APP_CONFIG
+
+LONG_SQL = 'SELECT o.id, o.state, c.name FROM orders o JOIN customers c ON c.id = o.customer_id WHERE o.id = 1'
+OTHER_LONG_SQL = LONG_SQL.replace('o.id = 1', 'o.id = 2')
+
+
+def activity(argument, second=0):
+    return {'server_id': 1, 'timestamp': datetime(2024, 5, 1, 10, 0, second), 'user_name': 'app', 'client_host': '10.0.0.5',
+            'db_name': 'shop', 'thread_id': 7, 'command_type': 'Query', 'operation_type': 'SELECT', 'argument': argument,
+            'risk_level': 'High'}
+
+
+def stored_arguments(fake_db):
+    """按 COALESCE(ua.argument, st.sql_text) 还原明细中的语句"""
+    texts = {row['text_hash']: row['sql_text'] for row in fake_db.tables['sql_texts']}
+    return [row['argument'] if row['argument'] is not None else texts[row['argument_hash']] for row in fake_db.tables['user_activities']]
+
+
+def test_long_statements_are_stored_once_and_restored(fake_db):
+    models.add_user_activities_batch([activity(LONG_SQL, 1), activity('SELECT 1', 2), activity(LONG_SQL, 3)])
+    models.add_user_activities_batch([activity(LONG_SQL, 4), activity(OTHER_LONG_SQL, 5)])
+
+    assert stored_arguments(fake_db) == [LONG_SQL, 'SELECT 1', LONG_SQL, LONG_SQL, OTHER_LONG_SQL]
+    assert sorted(row['sql_text'] for row in fake_db.tables['sql_texts']) == sorted([LONG_SQL, OTHER_LONG_SQL])
+    rows = fake_db.tables['user_activities']
+    assert rows[1]['argument'] == 'SELECT 1' and rows[1]['argument_hash'] is None
+    assert {row['argument_hash'] for row in rows if row['argument'] is None} == {row['text_hash'] for row in fake_db.tables['sql_texts']}
+
+
+def test_cached_statements_are_referenced_without_touching_sql_texts(fake_db):
+    models.add_user_activities_batch([activity(LONG_SQL, 1)])
+    fake_db.statements.clear()
+
+    models.add_user_activities_batch([activity(LONG_SQL, 2)])
+
+    assert fake_db.statements_matching(r'sql_texts') == []
+    assert stored_arguments(fake_db) == [LONG_SQL, LONG_SQL]
+
+
+def test_statements_stay_inline_when_dedup_is_disabled(fake_db, monkeypatch):
+    monkeypatch.setitem(APP_CONFIG, 'SQL_TEXT_DEDUP_ENABLED', False)
+    models.add_user_activities_batch([activity(LONG_SQL, 1), activity(LONG_SQL, 2)])
+
+    assert [row['argument'] for row in fake_db.tables['user_activities']] == [LONG_SQL, LONG_SQL]
+    assert fake_db.tables['sql_texts'] == []